@@ -26,10 +26,10 @@
 # maintained libraries.
 
 import argparse
+from datetime import datetime as dt
 import logging
 import store
 import json
-import netapi
 import threading
 import os
 
@@ -41,17 +41,46 @@ def configure_logging():
     logging.getLogger('').addHandler(console)
 
 
+def _selected_command(command):
+    # The options depend on the command (and the mode of analyze), so these are read first
+    parser = argparse.ArgumentParser(add_help=False)
+    if command is None:
+        parser.add_argument("command", nargs="?")
+    parser.add_argument("mode", nargs="?")
+    args = parser.parse_known_args()[0]
+    if command is None:
+        command = args.command
+    return "backfill" if command == "analyze" and args.mode == "backfill" else command
+
+
 def configure_cmdline(command=None):
+    selected = _selected_command(command)
     parser = argparse.ArgumentParser()
     if command is None:
-        parser.add_argument("command", help="Specify one of analyze, observe, init, drop.")
+        parser.add_argument("command", help="Specify one of analyze, observe, init, drop, replay, archive, backfill.")
+        parser.add_argument("paths", nargs="*", help="Recorded controller response logs for replay.")
+    elif command == "analyze":
+        parser.add_argument("mode", nargs="?", choices=["backfill"], help="Recompute reports of past windows.")
     parser.add_argument("-s, --single", dest="single", action="store_true", default=False, help="Whether the process runs only once.")
+    if selected == "archive":
+        parser.add_argument("--until", dest="until", default=None, help="First day (YYYY-MM-DD) that is not archived.")
+        parser.add_argument("--delete", dest="delete", action="store_true", default=False, help="Delete archived samples from the store.")
+    if selected in ("analyze", "backfill"):
+        parser.add_argument("--force", dest="force", action="store_true", default=False, help="Recompute reports even if no new samples arrived.")
+    if selected == "backfill":
+        parser.add_argument("--task", dest="task", default="all", help="Task to backfill, all by default.")
+        parser.add_argument("--from", dest="start", default=None, help="Start (YYYY-MM-DD[THH:MM[:SS]]) of the backfilled range.")
+        parser.add_argument("--to", dest="end", default=None, help="End of the backfilled range, now by default.")
+        parser.add_argument("--step", dest="step", default="1h", help="Distance of the backfilled window ends, e.g. 30m, 1h, 1d.")
+        parser.add_argument("--processes", dest="processes", type=int, default=None, help="Backfill worker processes, one per CPU by default.")
     args = parser.parse_args()
     return args
 
 
-def start_api(command, username, password, port):
-    state = netapi.init(command, username, password)
+def start_api(command, username, password, port, rings=None):
+    # Flask is only imported by the long running processes that serve the API
+    import netapi
+    state = netapi.init(command, username, password, rings)
     t = threading.Thread(target=netapi.run, args=[port])
     t.daemon = True
     t.start()
@@ -62,6 +91,8 @@ def init(command=None):
     args = configure_cmdline(command)
     if command is None:
         command = args.command
+    elif command == "analyze" and args.mode == "backfill":
+        command = "backfill"
     single = args.single
     configure_logging()
     logging.debug("Starting sdnalyzer.")
@@ -88,6 +119,20 @@ def init(command=None):
         if "password" in configuration["api"]:
             api_password = configuration["api"]["password"]
 
+    archive_directory = None
+    archive_keep_days = 7
+    archive_delete = False
+    archive_scheduled = False
+    if "archive" in configuration:
+        archive_directory = configuration["archive"]["path"]
+        archive_keep_days = int(configuration["archive"].get("keepDays", archive_keep_days))
+        archive_delete = bool(configuration["archive"].get("delete", False))
+        archive_scheduled = bool(configuration["archive"].get("scheduled", False))
+
+    ring_directory = None
+    if "ringBuffer" in configuration:
+        ring_directory = configuration["ringBuffer"]["path"]
+
     if command == "observe" or command == "analyze":
         command += "r"
 
@@ -99,12 +144,13 @@ def init(command=None):
         store.init()
         print "Successfully reset the database. All previously gathered data has been discarded."
     elif command == "observer":
-        program_state = start_api(command, api_username, api_password, api_port + 1)
+        program_state = start_api(command, api_username, api_password, api_port + 1, ring_directory)
 
         import observer
         poll_interval = 30
         if "pollInterval" in configuration:
             poll_interval = int(configuration["pollInterval"])
+        poll_intervals = configuration.get("pollIntervals", {})
 
         if "controller" in configuration:
             if "host" in configuration["controller"]:
@@ -113,13 +159,104 @@ def init(command=None):
             if "port" in configuration["controller"]:
                 controller_port = configuration["controller"]["port"]
 
-        program_state.instance = observer.Observer(controller_host, controller_port)
-        program_state.instance.observe(single, poll_interval, program_state)
+        if "controllers" in configuration:
+            controllers = [(c["host"], int(c["port"])) for c in configuration["controllers"]]
+        else:
+            controllers = [(controller_host, controller_port)]
+
+        # Observer processes sharing a store poll every count-th controller, starting at index
+        shard = (0, 1)
+        if "shard" in configuration:
+            shard = (int(configuration["shard"]["index"]), int(configuration["shard"]["count"]))
+            controllers = controllers[shard[0]::shard[1]]
+
+        recorder = None
+        if "recording" in configuration and "path" in configuration["recording"]:
+            from observer.recording import ResponseRecorder
+            recorder = ResponseRecorder(configuration["recording"]["path"])
+
+        dedup = bool(configuration.get("dedup", False))
+
+        pipeline = None
+        if "pipeline" in configuration:
+            from observer.pipeline import IngestionPipeline
+            pipeline = IngestionPipeline(int(configuration["pipeline"].get("queueSize", 32)),
+                                         int(configuration["pipeline"].get("batchSize", 8)))
+
+        chunk_size = None
+        memory_budget = None
+        if "memory" in configuration:
+            if "chunkSize" in configuration["memory"]:
+                chunk_size = int(configuration["memory"]["chunkSize"])
+            if "budgetMB" in configuration["memory"]:
+                memory_budget = int(float(configuration["memory"]["budgetMB"]) * 2 ** 20)
+
+        flow_sample_interval = None
+        if "flowLifecycle" in configuration:
+            flow_sample_interval = int(configuration["flowLifecycle"].get("sampleInterval", 300))
+
+        program_state.instance = observer.Observer(controllers, recorder, dedup, pipeline, shard, chunk_size,
+                                                   memory_budget, flow_sample_interval)
+        if ring_directory is not None:
+            from observer.hotwindow import HotWindowWriter
+            ring_configuration = configuration["ringBuffer"]
+            program_state.instance.add_listener(HotWindowWriter(ring_directory,
+                                                                int(ring_configuration.get("slots", 120)),
+                                                                int(ring_configuration.get("ports", 4096)),
+                                                                int(ring_configuration.get("links", 4096))))
+        if "heavyHitters" in configuration:
+            from observer.heavyhitters import HeavyHitterTracker
+            heavy_hitters = configuration["heavyHitters"]
+            tracker = HeavyHitterTracker(int(heavy_hitters.get("k", 100)), int(heavy_hitters.get("interval", 300)))
+            program_state.instance.add_listener(tracker)
+            program_state.instance.add_post_process(tracker)
+        if "sketches" in configuration:
+            from observer.cardinality import CardinalityTracker
+            sketches = configuration["sketches"]
+            tracker = CardinalityTracker(int(sketches.get("bucket", 3600)), int(sketches.get("precision", 10)),
+                                         int(sketches.get("width", 1024)), int(sketches.get("depth", 4)))
+            program_state.instance.add_listener(tracker)
+            program_state.instance.add_post_process(tracker)
+        if "anomalies" in configuration:
+            from observer.anomalies import LinkAnomalyDetector
+            anomalies = configuration["anomalies"]
+            detector = LinkAnomalyDetector(float(anomalies.get("alpha", 0.1)), float(anomalies.get("threshold", 4.0)),
+                                           int(anomalies.get("warmup", 10)))
+            program_state.instance.add_listener(detector)
+            program_state.instance.add_post_process(detector)
+            program_state.instance.anomaly_detector = detector
+        program_state.instance.observe(single, poll_interval, program_state, poll_intervals)
+    elif command == "replay":
+        import observer
+        from observer.recording import ReplayDriver
+        ReplayDriver(observer.Observer([])).replay(args.paths)
+    elif command == "archive":
+        from archive import Archiver
+        if archive_directory is None:
+            logging.error("No archive path configured in sdnalytics.json.")
+            return
+        until = dt.strptime(args.until, "%Y-%m-%d").date() if args.until is not None else None
+        Archiver(archive_directory, archive_keep_days, archive_delete or args.delete).run(until)
     elif command == "analyzer":
-        program_state = start_api(command, api_username, api_password, api_port + 2)
+        program_state = start_api(command, api_username, api_password, api_port + 2, ring_directory)
         import analyzer
-        program_state.instance = analyzer.Analyzer()
-        program_state.instance.analyze(single, program_state)
+        archiver = None
+        if archive_directory is not None and archive_scheduled:
+            from archive import Archiver
+            archiver = Archiver(archive_directory, archive_keep_days, archive_delete)
+        program_state.instance = analyzer.Analyzer(archive_directory, archiver)
+        program_state.instance.analyze(single, program_state, args.force)
+    elif command == "backfill":
+        from analyzer import TaskRegistry
+        from analyzer.task import AnalysisTask
+        from analyzer.backfill import backfill, parse_time, parse_step
+        if args.start is None:
+            logging.error("Backfilling needs the start of the range (--from).")
+            return
+        AnalysisTask.archive_directory = archive_directory
+        tasks = TaskRegistry().keys() if args.task == "all" else [args.task]
+        end = parse_time(args.end) if args.end is not None else dt.now()
+        backfill(tasks, parse_time(args.start), end, parse_step(args.step), args.processes, args.force)
     elif command == "adhoc":
         import adhoc
 
@@ -25,36 +25,114 @@
 # This license applies to all parts of SDNalytics that are not externally
 # maintained libraries.
 
-from metrics import SimpleLinkStatistics
-from reliability import LinkReliabilityStatistics, LinkImprovementAnalysis
-from services import SimpleServiceUsage, ServiceStatistics
-from topology import SimpleTopologyCentrality
-from transmission import PathSplitRecommendations
+from datetime import date
+import importlib
+import logging
 import time
 
+from task import AnalysisTask
+
+# Tasks are imported when they are first run, so that their dependencies (pandas, scipy, ...) only slow down the runs
+# that need them. Third-party packages register tasks as entry points of the group sdnalyzer.tasks, e.g.
+# entry_points={"sdnalyzer.tasks": ["MyTask = mypackage.tasks:MyTask"]}.
+TASK_ENTRY_POINT_GROUP = "sdnalyzer.tasks"
+BUILTIN_TASKS = {
+    "ServiceStatistics": "sdnalyzer.analyzer.services:ServiceStatistics",
+    "LinkImprovementAnalysis": "sdnalyzer.analyzer.reliability:LinkImprovementAnalysis",
+    "PathSplitRecommendations": "sdnalyzer.analyzer.transmission:PathSplitRecommendations",
+    "LinkReliabilityStatistics": "sdnalyzer.analyzer.reliability:LinkReliabilityStatistics",
+    "ServiceUsage": "sdnalyzer.analyzer.services:SimpleServiceUsage",
+    "LinkStatistics": "sdnalyzer.analyzer.metrics:SimpleLinkStatistics",
+    "TopologyCentrality": "sdnalyzer.analyzer.topology:SimpleTopologyCentrality",
+    "HeavyHitters": "sdnalyzer.analyzer.heavyhitters:HeavyHitters",
+    "DistinctCounts": "sdnalyzer.analyzer.cardinality:DistinctCounts"
+}
+
+
+def _import_task(reference):
+    module, name = reference.split(":")
+    return getattr(importlib.import_module(module), name)
+
+
+class TaskRegistry(object):
+    # Maps task names to task classes, importing a task module on first access
+    def __init__(self, builtins=BUILTIN_TASKS, group=TASK_ENTRY_POINT_GROUP):
+        self.group = group
+        self._references = dict(builtins)
+        self._entry_points = None
+        self._loaded = {}
+
+    def _discover(self):
+        # pkg_resources scans all installed distributions, so this only happens when a task outside the builtins is
+        # requested or all tasks are listed
+        if self._entry_points is None:
+            self._entry_points = {}
+            if self.group is None:
+                return self._entry_points
+            import pkg_resources
+            for entry_point in pkg_resources.iter_entry_points(self.group):
+                if entry_point.name in self._references or entry_point.name in self._entry_points:
+                    logging.warning("Ignoring task {} of {}, the name is already registered.".format(
+                        entry_point.name, entry_point.dist))
+                    continue
+                self._entry_points[entry_point.name] = entry_point
+        return self._entry_points
+
+    def register(self, name, task):
+        # task is a class or a "module:Class" reference
+        if isinstance(task, basestring):
+            self._references[name] = task
+            self._loaded.pop(name, None)
+        else:
+            self._loaded[name] = task
+
+    def keys(self):
+        return sorted(set(self._references.keys()) | set(self._loaded.keys()) | set(self._discover().keys()))
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __contains__(self, name):
+        return name in self._loaded or name in self._references or name in self._discover()
+
+    def __getitem__(self, name):
+        if name not in self._loaded:
+            if name in self._references:
+                self._loaded[name] = _import_task(self._references[name])
+            elif name in self._discover():
+                self._loaded[name] = self._discover()[name].load()
+            else:
+                raise KeyError(name)
+        return self._loaded[name]
+
+    def iteritems(self):
+        for name in self.keys():
+            yield name, self[name]
+
 
 class Analyzer(object):
-    def __init__(self):
+    def __init__(self, archive_directory=None, archiver=None):
         self.program_state = None
-        self.tasks = {
-            "ServiceStatistics": ServiceStatistics,
-            "LinkImprovementAnalysis": LinkImprovementAnalysis,
-            "PathSplitRecommendations": PathSplitRecommendations,
-            "LinkReliabilityStatistics": LinkReliabilityStatistics,
-            "ServiceUsage": SimpleServiceUsage,
-            "LinkStatistics": SimpleLinkStatistics,
-            "TopologyCentrality": SimpleTopologyCentrality
-        }
-
-    def analyze(self, single, program_state):
+        self.archiver = archiver
+        AnalysisTask.archive_directory = archive_directory
+        self.tasks = TaskRegistry()
+
+    def analyze(self, single, program_state, force=False):
         self.program_state = program_state
         if single:
-            self.run()
+            self.run(force=force)
         else:
             while True:
                 time.sleep(1000)
+                self._archive()
+
+    def _archive(self):
+        # Runs the scheduled archive export once a day
+        if self.archiver is not None and (self.archiver.last_run is None or
+                                          self.archiver.last_run.date() < date.today()):
+            self.archiver.run()
 
-    def run(self, task="all"):
+    def run(self, task="all", profile=False, force=False):
         tasks = {}
         if task == "all":
             tasks = self.tasks
@@ -62,4 +140,4 @@ class Analyzer(object):
             tasks[task] = self.tasks[task]
 
         for (key, task) in tasks.iteritems():
-            task().run()
\ No newline at end of file
+            task().run(profile, force)
\ No newline at end of file
@@ -0,0 +1,105 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Saarland University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# Contributor(s): Andreas Schmidt (Saarland University)
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# 
+# This license applies to all parts of SDNalytics that are not externally
+# maintained libraries.
+
+import logging
+import time
+from datetime import datetime as dt, timedelta
+from multiprocessing import Pool
+
+import sdnalyzer.store as store
+from task import AnalysisTask
+
+# Recomputes the reports of tasks for past windows, e.g. after fixing a task or adding a new one. The range is split
+# into windows ending every step, and each (task, window end) runs as its own job in a pool of worker processes. Every
+# window analyzes the observation window of its task before its end, like a run at that time would have.
+
+STEP_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_step(value):
+    # "30m", "1h", "1d" or seconds
+    if value[-1] in STEP_UNITS:
+        return timedelta(seconds=float(value[:-1]) * STEP_UNITS[value[-1]])
+    return timedelta(seconds=float(value))
+
+
+def parse_time(value):
+    for fmt in ("%Y-%m-%dT%H:%M:%S", "%Y-%m-%dT%H:%M", "%Y-%m-%d"):
+        try:
+            return dt.strptime(value, fmt)
+        except ValueError:
+            pass
+    raise ValueError("{} is not a time in ISO format.".format(value))
+
+
+def window_ends(start, end, step):
+    ends = []
+    current = start + step
+    while current <= end:
+        ends.append(current)
+        current += step
+    return ends
+
+
+def _initialize(connection_string, archive_directory):
+    store.start(connection_string)
+    AnalysisTask.archive_directory = archive_directory
+
+
+def _run(job):
+    from sdnalyzer.analyzer import TaskRegistry
+    name, window_end, force = job
+    try:
+        task = TaskRegistry()[name]()
+        task.window_end = window_end
+        task.run(force=force)
+        return name, window_end, None
+    except Exception as e:
+        logging.exception("Backfilling {} until {:%Y-%m-%d %H:%M:%S} failed.".format(name, window_end))
+        return name, window_end, str(e)
+
+
+def backfill(tasks, start, end, step, processes=None, force=False):
+    # tasks is a list of task names; processes defaults to the number of CPUs
+    jobs = [(name, window_end, force) for window_end in window_ends(start, end, step) for name in tasks]
+    print "Backfilling {} reports of {} between {:%Y-%m-%d %H:%M:%S} and {:%Y-%m-%d %H:%M:%S}.".format(
+        len(jobs), ", ".join(tasks), start, end)
+
+    started = time.time()
+    failed = []
+    pool = Pool(processes, _initialize, (store.connection_string, AnalysisTask.archive_directory))
+    try:
+        for name, window_end, error in pool.imap_unordered(_run, jobs):
+            if error is not None:
+                failed.append((name, window_end, error))
+    finally:
+        pool.close()
+        pool.join()
+
+    print "Backfilled {} reports in {:.1f} seconds, {} failed.".format(len(jobs) - len(failed), time.time() - started,
+                                                                      len(failed))
+    return failed
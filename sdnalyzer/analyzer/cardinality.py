@@ -0,0 +1,77 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Saarland University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# Contributor(s): Andreas Schmidt (Saarland University)
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# 
+# This license applies to all parts of SDNalytics that are not externally
+# maintained libraries.
+
+import json
+import math
+from datetime import timedelta
+from task import AnalysisTask
+from sdnalyzer.sketches import SKETCH_TYPES, HyperLogLog
+from sdnalyzer.store import Sketch, SampleTimestamp
+
+
+def merged_sketches(session, name, start, end=None, subject=False):
+    # {subject: sketch} merging the buckets of the observer ending in (start, end]; subject restricts the subject
+    query = session.query(Sketch.subject, Sketch.data).filter(Sketch.name == name, Sketch.bucket_end > start)
+    if end is not None:
+        query = query.filter(Sketch.bucket_end <= end)
+    if subject is not False:
+        query = query.filter(Sketch.subject == subject)
+
+    merged = {}
+    for row_subject, data in query:
+        sketch = SKETCH_TYPES[name].from_bytes(data)
+        merged[row_subject] = merged[row_subject].merge(sketch) if row_subject in merged else sketch
+    return merged
+
+
+def estimate(sketch, key=None):
+    # (estimate, error bound): the standard error of a distinct count or the maximal overestimation of a frequency
+    if isinstance(sketch, HyperLogLog):
+        value = sketch.count()
+        return value, value * 1.04 / math.sqrt(sketch.size)
+    return sketch.estimate(key), math.e / sketch.width * sketch.total
+
+
+class DistinctCounts(AnalysisTask):
+    def __init__(self):
+        super(DistinctCounts, self).__init__()
+        self.type = "DistinctCounts"
+        self.observation_window = timedelta(days=1)
+        self.inputs = [Sketch.bucket_end]
+        self.content = {}
+
+    def _analyze(self, session):
+        interval_start, interval_end = self._interval()
+        self.samples = set(map(lambda x: x[0], session.query(SampleTimestamp.timestamp).filter(
+            SampleTimestamp.timestamp > interval_start, SampleTimestamp.timestamp <= interval_end).all()))
+
+        for name in ["peers", "clients", "flows"]:
+            merged = merged_sketches(session, name, interval_start, interval_end)
+            self.content[name] = dict((subject, int(round(sketch.count()))) for subject, sketch in merged.iteritems())
+
+    def _write_report(self, report):
+        report.content = json.dumps(self.content, sort_keys=True)
@@ -0,0 +1,101 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Saarland University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# Contributor(s): Andreas Schmidt (Saarland University)
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# 
+# This license applies to all parts of SDNalytics that are not externally
+# maintained libraries.
+
+import json
+from datetime import timedelta
+from task import AnalysisTask
+from sdnalyzer.sketches import SpaceSaving
+from sdnalyzer.store import Node, Flow, HeavyHitterSummary, SampleTimestamp
+
+
+def merged_summaries(session, start, end=None, node_id=False):
+    # {node id (None for the fabric): SpaceSaving} over the summaries of the observer ending in (start, end]; the
+    # cost depends on k and the number of intervals, not on the number of flows. node_id restricts the switch.
+    query = session.query(HeavyHitterSummary).filter(HeavyHitterSummary.interval_end > start)
+    if end is not None:
+        query = query.filter(HeavyHitterSummary.interval_end <= end)
+    if node_id is not False:
+        query = query.filter(HeavyHitterSummary.node_id == node_id)
+
+    merged = {}
+    for row in query:
+        summary = SpaceSaving.from_json(row.content)
+        merged[row.node_id] = merged[row.node_id].merge(summary) if row.node_id in merged else summary
+    return merged
+
+
+def describe(session, summary, n):
+    # Top n flows of a summary with their match fields
+    top = summary.top(n)
+    flows = {}
+    if len(top) > 0:
+        flows = dict((f.id, f) for f in session.query(Flow).filter(Flow.id.in_([key for key, _, _ in top])))
+    result = []
+    for flow_id, count, error in top:
+        flow = flows.get(flow_id)
+        result.append({
+            "flow": flow_id,
+            "bytes": count,
+            "error": error,
+            "share": float(count) / summary.total if summary.total > 0 else None,
+            "networkSource": flow.network_source if flow is not None else None,
+            "networkDestination": flow.network_destination if flow is not None else None,
+            "networkProtocol": flow.network_protocol if flow is not None else None,
+            "transportSource": int(flow.transport_source) if flow is not None else None,
+            "transportDestination": int(flow.transport_destination) if flow is not None else None
+        })
+    return result
+
+
+class HeavyHitters(AnalysisTask):
+    def __init__(self):
+        super(HeavyHitters, self).__init__()
+        self.type = "HeavyHitters"
+        self.observation_window = timedelta(hours=1)
+        self.inputs = [HeavyHitterSummary.interval_end]
+        self.count = 10
+        self.content = {}
+
+    def _analyze(self, session):
+        interval_start, interval_end = self._interval()
+        self.samples = set(map(lambda x: x[0], session.query(SampleTimestamp.timestamp).filter(
+            SampleTimestamp.timestamp > interval_start, SampleTimestamp.timestamp <= interval_end).all()))
+
+        merged = merged_summaries(session, interval_start, interval_end)
+        devices = {}
+        if len(merged) > 0:
+            devices = dict(session.query(Node.id, Node.device_id).filter(
+                Node.id.in_([node_id for node_id in merged.keys() if node_id is not None])).all())
+
+        self.content = {
+            "fabric": describe(session, merged[None], self.count) if None in merged else [],
+            "switches": dict((devices.get(node_id, str(node_id)), describe(session, summary, self.count))
+                             for node_id, summary in merged.iteritems() if node_id is not None)
+        }
+
+    def _write_report(self, report):
+        report.content = json.dumps(self.content, sort_keys=True)
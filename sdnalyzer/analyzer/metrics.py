@@ -27,7 +27,6 @@
 
 import json
 from task import AnalysisTask
-from datetime import datetime as dt, timedelta
 from sdnalyzer.store import Link, LinkSample, Port, PortSample, SampleTimestamp
 from sqlalchemy import desc
 
@@ -36,6 +35,7 @@ class SimpleLinkStatistics(AnalysisTask):
     def __init__(self):
         super(SimpleLinkStatistics, self).__init__()
         self.type = "LinkStatistics"
+        self.inputs = [LinkSample.sampled]
         self.links = {}
 
     @staticmethod
@@ -52,12 +52,14 @@ class SimpleLinkStatistics(AnalysisTask):
 
     def _analyze(self, session):
         links = session.query(Link).all()
+        interval_start, interval_end = self._interval()
 
         for link in links:
             link_statistic = dict()
 
             samples = session.query(LinkSample).filter(LinkSample.link_id == link.id,
-                                                       LinkSample.sampled > dt.now() - timedelta(days=1)).order_by(
+                                                       LinkSample.sampled > interval_start,
+                                                       LinkSample.sampled <= interval_end).order_by(
                 desc(LinkSample.sampled)).all()
 
             if len(samples) > 0:
@@ -27,7 +27,6 @@
 
 import json
 import numpy as np
-from datetime import datetime as dt, timedelta
 from task import AnalysisTask
 from sdnalyzer.store import Node, NodeSample, Link, LinkSample, SampleTimestamp
 import itertools
@@ -53,11 +52,19 @@ class ReliabilityTask(AnalysisTask):
 
         return 1. - loss
 
+    def _link_name(self, links, sample):
+        if sample.link_id in links:
+            return self.generate_link_id(links[sample.link_id])
+        # Archived samples can belong to links removed since; their rows carry the name, unless the link was already
+        # gone when they were archived
+        return getattr(sample, "link_name", None) or None
+
 
 class LinkImprovementAnalysis(ReliabilityTask):
     def __init__(self):
         super(LinkImprovementAnalysis, self).__init__()
         self.type = "LinkImprovementAnalysis"
+        self.inputs = [LinkSample.sampled]
         self.result = {}
 
     @staticmethod
@@ -67,17 +74,22 @@ class LinkImprovementAnalysis(ReliabilityTask):
     def _analyze(self, session):
         links = {d.id: d for d in session.query(Link).all()}
         max_centrality = 0
+        interval_start, interval_end = self._interval()
 
-        self.samples = map(lambda x: x[0], session.query(SampleTimestamp.timestamp).filter(SampleTimestamp.timestamp > dt.now() - timedelta(days=1)).order_by(SampleTimestamp.timestamp).all())
+        self.samples = map(lambda x: x[0], session.query(SampleTimestamp.timestamp).filter(
+            SampleTimestamp.timestamp > interval_start, SampleTimestamp.timestamp <= interval_end).order_by(
+            SampleTimestamp.timestamp).all())
         timestamps = [a.isoformat() for a in self.samples]
 
-        link_samples = session.query(LinkSample) \
-            .filter(LinkSample.sampled > dt.now() - timedelta(days=1), LinkSample.link_id is not None) \
-            .order_by(LinkSample.link_id).all()
+        link_samples = self._loader(session).samples(LinkSample, interval_start, interval_end)
+        link_samples.sort(key=lambda d: d.link_id)
 
         link_series = []
         for link_id, value in itertools.groupby(link_samples, key=lambda d: d.link_id):
             v = list(value)
+            name = self._link_name(links, v[0])
+            if name is None:
+                continue
             reliability_samples = {x.sampled.isoformat(): self._get_reliability(x) for x in v}
             centrality_samples = {x.sampled.isoformat(): x.betweenness if x.betweenness is not None else 0.0 for x in v}
             reliability = map(self._convert_reliability(reliability_samples), timestamps)
@@ -87,7 +99,7 @@ class LinkImprovementAnalysis(ReliabilityTask):
 
             link_series.append({
                 "id": link_id,
-                "link_id": self.generate_link_id(links[link_id]),
+                "link_id": name,
                 "reliability": reliability,
                 "centrality": centrality
             })
@@ -106,31 +118,38 @@ class LinkReliabilityStatistics(ReliabilityTask):
     def __init__(self):
         super(LinkReliabilityStatistics, self).__init__()
         self.type = "LinkReliabilityStatistics"
+        self.inputs = [LinkSample.sampled]
         self.result = {}
 
     def _analyze(self, session):
         links = {d.id: d for d in session.query(Link).all()}
+        node_types = dict(session.query(Node.device_id, Node.type).all())
 
-        self.samples = map(lambda x: x[0], session.query(LinkSample.sampled).filter(
-            LinkSample.sampled > dt.now() - timedelta(days=1)).distinct(LinkSample.sampled).order_by(
-            LinkSample.sampled).all())
-        timestamps = [a.isoformat() for a in self.samples]
+        link_samples = self._loader(session).samples(LinkSample, *self._interval())
+        link_samples.sort(key=lambda d: d.link_id)
 
-        link_samples = session.query(LinkSample) \
-            .filter(LinkSample.sampled > dt.now() - timedelta(days=1), LinkSample.link_id is not None) \
-            .order_by(LinkSample.link_id).all()
+        self.samples = sorted(set(x.sampled for x in link_samples))
+        timestamps = [a.isoformat() for a in self.samples]
 
         link_series = []
         for link_id, value in itertools.groupby(link_samples, key=lambda d: d.link_id):
+            value = list(value)
+            name = self._link_name(links, value[0])
+            if name is None:
+                continue
+            if link_id in links:
+                ends = [links[link_id].src.type, links[link_id].dst.type]
+            else:
+                ends = [node_types.get(value[0].src_device_id), node_types.get(value[0].dst_device_id)]
             reliability_samples = {x.sampled.isoformat(): self._get_reliability(x) for x in value}
 
             samples = map(self._convert_reliability(reliability_samples), timestamps)
             link_series.append({
                 "id": link_id,
-                "link_id": self.generate_link_id(links[link_id]),
+                "link_id": name,
                 "data": samples,
                 "ratio": np.average(samples),
-                "last_mile": links[link_id].src.type == "host" or links[link_id].dst.type == "host"
+                "last_mile": "host" in ends
             })
         link_series.sort(key=lambda d: d["ratio"])
 
@@ -25,14 +25,15 @@
 # This license applies to all parts of SDNalytics that are not externally
 # maintained libraries.
 
-from datetime import datetime as dt, timedelta
+from datetime import timedelta
 import json
 from sqlalchemy import func
 from task import AnalysisTask
 import pandas as pd
 from sdnalyzer.store import Node, FlowSample, Flow, Link, SampleTimestamp
-from sqlalchemy import or_
+from sqlalchemy import and_, or_
 import itertools
+from bisect import bisect_left, bisect_right
 
 
 class NoDataException(Exception):
@@ -46,14 +47,20 @@ class ServiceStatistics(AnalysisTask):
         self.content = []
         self.bits_per_byte = 8
         self.observation_window = timedelta(hours=1)
+        self.inputs = [FlowSample.sampled, Flow.last_sampled]
 
     def _calculate_statistics(self, flow_entries, ap):
         local_flow_entries = filter(lambda x: x.node_id == ap.id, flow_entries)
+        _, interval_end = self._interval()
         statistics_samples = []
         for flow in local_flow_entries:
+            # samples after a past window end are ignored when backfilling
+            samples = filter(lambda x: x.sampled <= interval_end, flow.samples)
             statistics_samples.extend(
-                map(lambda x: (x.sampled, x.byte_count, x.duration_seconds),
-                    sorted(flow.samples, key=lambda x: x.sampled)))
+                map(lambda (t, x): (t, x.byte_count, x.duration_seconds),
+                    self._carry_forward(samples, self.samples, min(flow.last_sampled, interval_end)
+                                        if flow.last_sampled is not None else None)))
+        statistics_samples.sort(key=lambda x: x[0])
 
         # TODO: use pandas for the complete calculation (grouping and accumulation)
         stamp_groups = itertools.groupby(statistics_samples, key=lambda x: x[0])
@@ -131,11 +138,15 @@ class ServiceStatistics(AnalysisTask):
                     self.content.append(d)
 
     def _analyze(self, session):
-        interval_start = dt.now() - self.observation_window
+        interval_start, interval_end = self._interval()
         self.samples = set(map(lambda x: x[0], session.query(SampleTimestamp.timestamp).filter(
-            SampleTimestamp.timestamp > interval_start).all()))
-        recent_entry_query = session.query(FlowSample).filter(FlowSample.sampled > interval_start)
-        flows = list(session.query(Flow).filter(recent_entry_query.exists().where(FlowSample.flow_id == Flow.id)).all())
+            SampleTimestamp.timestamp > interval_start, SampleTimestamp.timestamp <= interval_end).all()))
+        recent_entry_query = session.query(FlowSample).filter(FlowSample.sampled > interval_start,
+                                                              FlowSample.sampled <= interval_end)
+        # Flows created after a past window end are ignored when backfilling, even though they were sampled in it
+        flows = list(session.query(Flow).filter(or_(recent_entry_query.exists().where(FlowSample.flow_id == Flow.id),
+                                                    and_(Flow.last_sampled > interval_start,
+                                                         Flow.created <= interval_end))).all())
 
         # Find where providers (host := (mac, ip), service := port) are located
         known_ports = [21, 22, 23, 25, 53, 80, 110, 143, 161, 443, 554]
@@ -171,6 +182,7 @@ class SimpleServiceUsage(AnalysisTask):
         self.udp_ports = {554: "RTSP"}
         self.devices = {}
         self.observation_window = timedelta(hours=1)
+        self.inputs = [FlowSample.sampled, Flow.last_sampled]
 
     def _add_count(self, count, device_id, port, protocol_key, consume_or_provide):
         if consume_or_provide not in self.devices[device_id]:
@@ -210,18 +222,35 @@ class SimpleServiceUsage(AnalysisTask):
         tcp_keys = self.tcp_ports.keys()
         udp_keys = self.udp_ports.keys()
 
+        interval_start, interval_end = self._interval()
         self.samples = map(lambda x: x[0], session.query(SampleTimestamp.timestamp).filter(
-            SampleTimestamp.timestamp > dt.now() - self.observation_window).all())
+            SampleTimestamp.timestamp > interval_start, SampleTimestamp.timestamp <= interval_end).all())
+        timestamps = sorted(self.samples)
 
-        for fs in session.query(FlowSample.flow_id, func.count(FlowSample.flow_id)).filter(
-                        FlowSample.sampled > dt.now() - self.observation_window).group_by(FlowSample.flow_id).all():
+        counted = set()
+        for fs in session.query(FlowSample.flow_id, func.count(FlowSample.flow_id), func.min(FlowSample.sampled)).filter(
+                        FlowSample.sampled > interval_start, FlowSample.sampled <= interval_end).group_by(
+                FlowSample.flow_id).all():
             flow = session.query(Flow).filter(Flow.id == fs[0]).first()
+            counted.add(flow.id)
 
-            count = int(fs[1] // 2)
+            sample_count = fs[1]
+            if flow.last_sampled is not None:
+                # unchanged samples are not stored in dedup mode
+                sample_count = max(sample_count, bisect_right(timestamps, min(flow.last_sampled, interval_end)) -
+                                   bisect_left(timestamps, fs[2]))
+            count = int(sample_count // 2)
 
             self._accumulate_for_protocol(count, flow, tcp_keys, "tcp", 6)
             self._accumulate_for_protocol(count, flow, udp_keys, "udp", 17)
 
+        # flows that were idle during the whole window in dedup mode
+        for flow in session.query(Flow).filter(Flow.last_sampled > interval_start, Flow.created <= interval_end).all():
+            if flow.id not in counted:
+                count = int(bisect_right(timestamps, min(flow.last_sampled, interval_end)) // 2)
+                self._accumulate_for_protocol(count, flow, tcp_keys, "tcp", 6)
+                self._accumulate_for_protocol(count, flow, udp_keys, "udp", 17)
+
         devices = {}
 
         for key in self.devices:
@@ -25,14 +25,32 @@
 # This license applies to all parts of SDNalytics that are not externally
 # maintained libraries.
 
-from datetime import datetime as dt
+import hashlib
+from datetime import datetime as dt, timedelta
+from sqlalchemy import func
+import sdnalyzer.monitoring as monitoring
+from sdnalyzer.profiling import TaskProfiler
 import sdnalyzer.store as store
 
+_cached_runs = monitoring.registry.counter("sdnalytics_analyzer_cached_runs_total",
+                                           "Task runs that reused the previous report as no new samples arrived.",
+                                           ["task"])
+
 
 class AnalysisTask(object):
+    # Directory of the sample archive, see Analyzer
+    archive_directory = None
+
     def __init__(self):
         self.type = None
         self.samples = set()
+        # Samples of this time span before window_end are analyzed; None if only the newest samples are
+        self.observation_window = timedelta(days=1)
+        # End of the analyzed window, None for the time of the run; set to recompute past windows, see backfill
+        self.window_end = None
+        # Time columns of the rows the task reads, e.g. PortSample.sampled or Flow.last_sampled. Samples arrive at the
+        # cadence of their query, so changes of these rows in the window invalidate the previous report as well.
+        self.inputs = []
 
     def _create_report(self, session):
         sorted_unique_samples = sorted(self.samples)
@@ -47,28 +65,95 @@ class AnalysisTask(object):
                             sample_stop=sorted_unique_samples[-1] if samples_present else None,
                             sample_interval=str(intervals[0]) if len(intervals) == 1 else "nan")
 
-    def run(self):
+    def _interval(self):
+        # (start, end) of the analyzed window; start is None if only the newest samples are analyzed
+        end = self.window_end if self.window_end is not None else dt.now()
+        return end - self.observation_window if self.observation_window is not None else None, end
+
+    @staticmethod
+    def _format_time(value):
+        return value.isoformat() if value is not None else None
+
+    def _input_key(self, session):
+        # Identifies the sample timestamps a run would analyze by their range and count, and the input rows in the
+        # window by their count, newest id and newest time
+        query = session.query(func.count(store.SampleTimestamp.id), func.min(store.SampleTimestamp.timestamp),
+                              func.max(store.SampleTimestamp.timestamp))
+        start, end = self._interval()
+        if start is None:
+            newest = session.query(func.max(store.SampleTimestamp.timestamp)).filter(
+                store.SampleTimestamp.timestamp <= end).scalar()
+            query = query.filter(store.SampleTimestamp.timestamp == newest)
+        else:
+            query = query.filter(store.SampleTimestamp.timestamp > start, store.SampleTimestamp.timestamp <= end)
+        count, first, last = query.one()
+        window = self.observation_window.total_seconds() if self.observation_window is not None else None
+        key = [self.type, window, count, self._format_time(first), self._format_time(last)]
+
+        for column in self.inputs:
+            model = column.class_
+            rows = session.query(func.count(model.id), func.max(model.id), func.max(column)).filter(column <= end)
+            if start is not None:
+                rows = rows.filter(column > start)
+            count, newest_id, newest = rows.one()
+            key.extend([count, newest_id, self._format_time(newest)])
+        # Hashed, as the key of a task with several inputs does not fit into Report.input_key
+        return "{}/{}".format(self.type, hashlib.sha1("/".join(str(value) for value in key)).hexdigest())
+
+    def _cached_report(self, session, input_key):
+        return session.query(store.Report).filter(store.Report.type == self.type, store.Report.input_key == input_key) \
+            .order_by(store.Report.id.desc()).first()
+
+    def run(self, profile=False, force=False):
+        # Unless forced, the previous report of the task is returned if the samples it analyzed did not change.
+        # Profiled runs are always executed.
         start = dt.now()
-        print "Started with {} at {:%H:%M:%S}.".format(self.type, start)
         session = store.get_session()
-        self._analyze(session)
-        session.rollback()
+        input_key = self._input_key(session) if self.type is not None else None
+        cached = self._cached_report(session, input_key) if input_key is not None and not force and not profile \
+            else None
+        session.close()
+        if cached is not None:
+            _cached_runs.inc(task=self.type)
+            print "Reused report {} of {} created at {:%H:%M:%S}, no new samples.".format(cached.id, self.type,
+                                                                                         cached.created)
+            return cached
+
+        print "Started with {} at {:%H:%M:%S}.".format(self.type, start)
+        profiler = TaskProfiler(enabled=profile)
+        with profiler:
+            session = store.get_session()
+            self._analyze(session)
+            session.rollback()
 
-        if self.type is None:
-            raise NotImplementedError("The concrete AnalysisTask implementation needs a type information.")
+            if self.type is None:
+                raise NotImplementedError("The concrete AnalysisTask implementation needs a type information.")
 
-        report = self._create_report(session)
+            report = self._create_report(session)
 
-        self._write_report(report)
+            self._write_report(report)
         stop = dt.now()
         seconds = (stop - start).total_seconds()
 
         report.execution_duration = seconds
+        report.input_key = input_key
         session = store.get_session()
         session.add(report)
+        if profile:
+            session.add(store.Profile(created=stop, report=report, statistics=profiler.dump_stats(),
+                                      statements=profiler.statements.to_json()))
         session.commit()
 
         print "Completed {} at {:%H:%M:%S}. Took {} seconds.".format(self.type, stop, seconds)
+        if profile:
+            print "Profiled {} SQL statements taking {:.3f} seconds.".format(profiler.statements.count,
+                                                                            profiler.statements.total)
+        return report
+
+    def _loader(self, session):
+        # The archive depends on numpy, which tasks without archived samples do not need
+        from sdnalyzer.archive import SampleLoader
+        return SampleLoader(session, self.archive_directory)
 
     def _analyze(self, session):
         raise NotImplementedError('The concrete AnalysisTask implementation needs a _analyze method.')
@@ -78,4 +163,24 @@ class AnalysisTask(object):
 
     @staticmethod
     def generate_link_id(link):
-        return "{}-{}.{}-{}".format(link.src.device_id, link.src_port, link.dst.device_id, link.dst_port)
\ No newline at end of file
+        return store.link_name(link.src.device_id, link.src_port, link.dst.device_id, link.dst_port)
+
+    @staticmethod
+    def _carry_forward(samples, timestamps, until):
+        # In dedup mode the observer does not store samples with unchanged counters, in flow lifecycle mode it samples
+        # flows at a reduced rate. The newest stored sample is repeated at each timestamp up to the time the counters
+        # were last reported.
+        samples = sorted(samples, key=lambda x: x.sampled)
+        result = [(x.sampled, x) for x in samples]
+        if len(samples) == 0 or until is None:
+            return result
+
+        stored = set(x.sampled for x in samples)
+        i = 0
+        for t in sorted(timestamps):
+            if t < samples[0].sampled or t > until or t in stored:
+                continue
+            while i + 1 < len(samples) and samples[i + 1].sampled <= t:
+                i += 1
+            result.append((t, samples[i]))
+        return sorted(result, key=lambda x: x[0])
\ No newline at end of file
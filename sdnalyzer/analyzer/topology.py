@@ -35,11 +35,16 @@ class SimpleTopologyCentrality(AnalysisTask):
     def __init__(self):
         super(SimpleTopologyCentrality, self).__init__()
         self.type = "TopologyCentrality"
+        self.observation_window = None
+        self.inputs = [NodeSample.sampled, LinkSample.sampled]
 
     def _analyze(self, session):
-        newest_timestamp = session.execute(func.max(NodeSample.sampled)).scalar()
+        _, interval_end = self._interval()
+        newest_timestamp = session.query(func.max(NodeSample.sampled)).filter(
+            NodeSample.sampled <= interval_end).scalar()
         self.nodes = session.query(NodeSample).filter(NodeSample.sampled == newest_timestamp).all()
-        newest_timestamp = session.execute(func.max(LinkSample.sampled)).scalar()
+        newest_timestamp = session.query(func.max(LinkSample.sampled)).filter(
+            LinkSample.sampled <= interval_end).scalar()
         self.links = session.query(LinkSample).filter(LinkSample.sampled == newest_timestamp).all()
 
         self.samples.add(newest_timestamp)
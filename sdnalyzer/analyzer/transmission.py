@@ -25,11 +25,12 @@
 # This license applies to all parts of SDNalytics that are not externally
 # maintained libraries.
 
-from datetime import datetime as dt, timedelta
+from datetime import timedelta
 import json
 import numpy as np
 import scipy.spatial.distance as sp
 from task import AnalysisTask
+from sdnalyzer.paths import shared_service
 from sdnalyzer.store import Node, Link, LinkSample, Port, PortSample
 from sqlalchemy import or_
 
@@ -41,7 +42,8 @@ class PathSplitRecommendations(AnalysisTask):
         self.type = "PathSplitRecommendations"
         self.splits = []
         self.nodes = {}
-        self.timedelta = timedelta(days=1)
+        self.observation_window = timedelta(days=1)
+        self.inputs = [LinkSample.sampled]
 
         self._minimal_delay = 1
         self._minimal_loss = 10 ** -3
@@ -61,7 +63,15 @@ class PathSplitRecommendations(AnalysisTask):
         return [max(self._minimal_loss, x.dst_packet_loss) if x.dst_packet_loss is not None else self._minimal_loss,
                 max(self._minimal_delay, x.dst_delay) if x.dst_delay is not None else self._minimal_delay]
 
+    @staticmethod
+    def _disjoint_destinations(paths, node, left, right):
+        # Device ids of the switches reached by link-disjoint paths that leave through the left and the right link
+        return sorted(paths.device_ids[d] for d in paths.disjoint_destinations(node.id, left.id, right.id))
+
     def _analyze(self, session):
+        interval_start, interval_end = self._interval()
+        paths = shared_service()
+        paths.refresh(session, interval_end)
         for node in session.query(Node).filter(Node.type == "switch").all():
             links = session.query(Link) \
                 .filter(or_(Link.src_id == node.id, Link.dst_id == node.id)) \
@@ -81,7 +91,8 @@ class PathSplitRecommendations(AnalysisTask):
 
                 most_recent_samples = list(session.query(LinkSample) \
                                            .filter(LinkSample.link_id == link.id,
-                                                   LinkSample.sampled > dt.now() - self.timedelta) \
+                                                   LinkSample.sampled > interval_start,
+                                                   LinkSample.sampled <= interval_end) \
                                            .order_by(LinkSample.sampled.desc()).all())
 
                 self.samples.update((x.sampled for x in most_recent_samples))
@@ -120,7 +131,8 @@ class PathSplitRecommendations(AnalysisTask):
                     splits.append({
                         "left": port1,
                         "right": port2,
-                        "distance": dist
+                        "distance": dist,
+                        "disjoint_destinations": self._disjoint_destinations(paths, node, links[i], links[j])
                     })
 
             if link_count > 1:
@@ -0,0 +1,271 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Saarland University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# Contributor(s): Andreas Schmidt (Saarland University)
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# 
+# This license applies to all parts of SDNalytics that are not externally
+# maintained libraries.
+
+import logging
+import os
+from datetime import datetime as dt, date, timedelta
+from decimal import Decimal
+
+import numpy as np
+from sqlalchemy import func, Float, Numeric
+from sqlalchemy.orm import aliased
+
+import sdnalyzer.store as store
+from sdnalyzer.store import Node, NodeSample, Link, LinkSample, Port, PortSample, Flow, FlowSample
+
+# Samples are archived to one compressed numpy file per table and day with one array per column. Foreign keys are kept
+# and complemented by readable identifiers that stay valid when the store is reset.
+
+ARCHIVED_MODELS = [NodeSample, LinkSample, PortSample, FlowSample]
+
+# Maximum number of values in an IN clause
+IN_CLAUSE_SIZE = 1000
+
+
+class ArchivedSample(object):
+    # Sample read from the archive with the attributes of the columns of its table
+    def __init__(self, **columns):
+        self.__dict__.update(columns)
+
+
+def _query(session, model):
+    columns = list(model.__table__.columns)
+    if model is NodeSample:
+        return session.query(*columns + [Node.device_id]).outerjoin(Node, NodeSample.node_id == Node.id)
+    elif model is PortSample:
+        return session.query(*columns + [Node.device_id, Port.port_number]) \
+            .outerjoin(Port, PortSample.port_id == Port.id).outerjoin(Node, Port.node_id == Node.id)
+    elif model is FlowSample:
+        return session.query(*columns + [Node.device_id, Flow.cookie, Flow.network_source, Flow.network_destination,
+                                         Flow.network_protocol, Flow.transport_source, Flow.transport_destination]) \
+            .outerjoin(Flow, FlowSample.flow_id == Flow.id).outerjoin(Node, Flow.node_id == Node.id)
+    elif model is LinkSample:
+        src = aliased(Node)
+        dst = aliased(Node)
+        return session.query(*columns + [src.device_id.label("src_device_id"), Link.src_port,
+                                         dst.device_id.label("dst_device_id"), Link.dst_port]) \
+            .outerjoin(Link, LinkSample.link_id == Link.id) \
+            .outerjoin(src, Link.src_id == src.id).outerjoin(dst, Link.dst_id == dst.id)
+    raise Exception("Samples of {} cannot be archived.".format(model.__tablename__))
+
+
+def _load_rows(session, model, start, end):
+    query = _query(session, model).filter(model.sampled >= start, model.sampled < end)
+    rows = [dict(zip(row.keys(), row)) for row in query]
+    if model is LinkSample:
+        for row in rows:
+            row["link_name"] = None if row["src_device_id"] is None else store.link_name(
+                row["src_device_id"], row["src_port"], row["dst_device_id"], row["dst_port"])
+    return rows
+
+
+def _to_array(values):
+    present = [v for v in values if v is not None]
+    if len(present) == 0:
+        return np.array([np.nan] * len(values))
+    if isinstance(present[0], dt):
+        return np.array([v if v is not None else np.datetime64("NaT") for v in values], dtype="datetime64[us]")
+    if isinstance(present[0], basestring):
+        return np.array([v if v is not None else "" for v in values])
+    if isinstance(present[0], (int, long)) and len(present) == len(values):
+        return np.array(values, dtype=np.int64)
+    return np.array([float(v) if v is not None else np.nan for v in values], dtype=np.float64)
+
+
+def _to_columns(rows):
+    names = sorted(set(name for row in rows for name in row.keys()))
+    return dict((name, _to_array([row.get(name) for row in rows])) for name in names)
+
+
+def _to_rows(columns):
+    values = {}
+    for name, array in columns.iteritems():
+        values[name] = [None if isinstance(v, float) and np.isnan(v) else v for v in array.tolist()]
+    count = len(values["id"]) if "id" in values else 0
+    return [dict((name, values[name][i]) for name in values) for i in range(count)]
+
+
+def day_path(directory, table, day):
+    return os.path.join(directory, table, "{}-{:%Y-%m-%d}.npz".format(table, day))
+
+
+def archived_days(directory, table):
+    days = []
+    prefix = table + "-"
+    path = os.path.join(directory, table)
+    for name in os.listdir(path) if os.path.isdir(path) else []:
+        if name.startswith(prefix) and name.endswith(".npz") and not name.endswith(".tmp.npz"):
+            try:
+                days.append(dt.strptime(name[len(prefix):-len(".npz")], "%Y-%m-%d").date())
+            except ValueError:
+                pass
+    return sorted(days)
+
+
+def _archived_ids(path):
+    archive = np.load(path)
+    try:
+        return set(archive["id"].tolist())
+    finally:
+        archive.close()
+
+
+def read_day(directory, table, day):
+    path = day_path(directory, table, day)
+    if not os.path.isfile(path):
+        return []
+    archive = np.load(path)
+    try:
+        return _to_rows(dict((name, archive[name]) for name in archive.files))
+    finally:
+        archive.close()
+
+
+class SampleLoader(object):
+    # Loads the samples of a time range from the store and, if an archive is configured, from the archived days.
+    def __init__(self, session, directory=None):
+        self.session = session
+        self.directory = directory
+
+    def samples(self, model, start, end=None):
+        query = self.session.query(model).filter(model.sampled > start)
+        if end is not None:
+            query = query.filter(model.sampled <= end)
+        samples = query.all()
+        if self.directory is None:
+            return samples
+
+        # Numeric columns are archived as floats
+        decimals = [c.name for c in model.__table__.columns
+                    if isinstance(c.type, Numeric) and not isinstance(c.type, Float)]
+
+        # Archived rows are only deleted from the store after verification, so they can be in both
+        stored = set(x.id for x in samples)
+        day = start.date()
+        last = (end if end is not None else dt.now()).date()
+        while day <= last:
+            for row in read_day(self.directory, model.__tablename__, day):
+                if row["id"] not in stored and row["sampled"] > start and (end is None or row["sampled"] <= end):
+                    for name in decimals:
+                        if row[name] is not None:
+                            row[name] = Decimal(repr(row[name]))
+                    samples.append(ArchivedSample(**row))
+            day += timedelta(days=1)
+        return samples
+
+
+class Archiver(object):
+    # Exports the samples of closed days older than keep_days to the archive; delete removes them from the store once
+    # the written file is verified. Days are archived in order and a file only replaces the previous one of its day once
+    # it is verified, so a run resumes at the newest archived day, skips days whose file contains all their rows and
+    # stops at the first day that fails.
+    def __init__(self, directory, keep_days=7, delete=False):
+        self.directory = directory
+        self.keep_days = keep_days
+        self.delete = delete
+        self.last_run = None
+
+    def run(self, until=None):
+        # until is the first day that is not archived
+        if until is None:
+            until = date.today() - timedelta(days=self.keep_days)
+        session = store.get_session()
+        try:
+            for model in ARCHIVED_MODELS:
+                first = session.query(func.min(model.sampled)).scalar()
+                if first is None:
+                    continue
+                day = first.date()
+                archived = archived_days(self.directory, model.__tablename__)
+                if len(archived) > 0 and not self.delete:
+                    # The newest archived day is checked again, it may have been archived before it was closed. When
+                    # deleting, the store only keeps the rows of archived days that still have to be deleted.
+                    day = max(day, archived[-1])
+                while day < until:
+                    if not self._archive_day(session, model, day):
+                        break
+                    day += timedelta(days=1)
+        finally:
+            session.close()
+        self.last_run = dt.now()
+
+    def _archive_day(self, session, model, day):
+        # Returns whether the samples of the day are archived
+        start = dt.combine(day, dt.min.time())
+        end = start + timedelta(days=1)
+        table = model.__tablename__
+        path = day_path(self.directory, table, day)
+        ids = set(row[0] for row in session.query(model.id).filter(model.sampled >= start, model.sampled < end))
+        if len(ids) == 0:
+            return True
+        if os.path.isfile(path) and ids <= _archived_ids(path):
+            self._delete(session, model, ids, day)
+            return True
+
+        # Keep rows of earlier runs that were deleted from the store since
+        rows = _load_rows(session, model, start, end)
+        ids = set(row["id"] for row in rows)
+        rows += filter(lambda row: row["id"] not in ids, read_day(self.directory, table, day))
+        rows.sort(key=lambda row: (row["sampled"], row["id"]))
+        columns = _to_columns(rows)
+
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        temporary = path[:-len(".npz")] + ".tmp.npz"
+        np.savez_compressed(temporary, **columns)
+        if not self._verify(temporary, columns, ids):
+            os.remove(temporary)
+            logging.error("Verification of {} failed, the samples are kept in the store.".format(path))
+            return False
+        os.rename(temporary, path)
+        print "Archived {} {} rows of {:%Y-%m-%d} to {}.".format(len(rows), table, day, path)
+
+        self._delete(session, model, ids, day)
+        return True
+
+    def _delete(self, session, model, ids, day):
+        if not self.delete:
+            return
+        ids = list(ids)
+        for i in range(0, len(ids), IN_CLAUSE_SIZE):
+            session.query(model).filter(model.id.in_(ids[i:i + IN_CLAUSE_SIZE])).delete(synchronize_session=False)
+        session.commit()
+        print "Deleted {} archived {} rows of {:%Y-%m-%d} from the store.".format(len(ids), model.__tablename__, day)
+
+    @staticmethod
+    def _verify(path, columns, ids):
+        archive = np.load(path)
+        try:
+            if set(archive.files) != set(columns.keys()):
+                return False
+            for name, values in columns.iteritems():
+                stored = archive[name]
+                if stored.dtype != values.dtype or stored.tobytes() != values.tobytes():
+                    return False
+            return ids <= set(archive["id"].tolist())
+        finally:
+            archive.close()
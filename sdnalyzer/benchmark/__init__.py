@@ -0,0 +1,129 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Saarland University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# Contributor(s): Andreas Schmidt (Saarland University)
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# 
+# This license applies to all parts of SDNalytics that are not externally
+# maintained libraries.
+
+import argparse
+import sys
+import time
+
+
+def _add_fabric_arguments(parser):
+    parser.add_argument("--switches", type=int, default=10, help="Number of switches in the fabric.")
+    parser.add_argument("--ports", type=int, default=8, help="Number of ports per switch.")
+    parser.add_argument("--hosts", type=int, default=20, help="Number of hosts attached to the fabric.")
+    parser.add_argument("--flows", type=int, default=50, help="Number of flows per switch.")
+    parser.add_argument("--idle-ratio", dest="idle_ratio", type=float, default=0.7, help="Share of idle flows.")
+    parser.add_argument("--churn", type=float, default=0.05, help="Share of flows replaced per poll.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the fabric generator.")
+
+
+def _create_fabric(args):
+    from floodlight import Fabric
+    return Fabric(args.switches, args.ports, args.hosts, args.flows, args.idle_ratio, args.churn, args.seed)
+
+
+def configure_cmdline():
+    parser = argparse.ArgumentParser(prog="sdn-benchmark")
+    suites = parser.add_subparsers(dest="suite")
+
+    observer = suites.add_parser("observer", help="Run poll cycles of the observer against a Floodlight stand-in.")
+    observer.add_argument("--db", default="sqlite:////tmp/sdnalytics-benchmark.db",
+                          help="Connection string of the benchmark store. The store is reset before running.")
+    observer.add_argument("--cycles", type=int, default=10, help="Number of poll cycles.")
+    observer.add_argument("--postprocessing", action="store_true", default=False,
+                          help="Run the post processes (requires graph_tool).")
+    observer.add_argument("--output", default=None, help="Write the results as JSON to this file.")
+    observer.add_argument("--dedup", action="store_true", default=False,
+                          help="Do not store unchanged counters and descriptors.")
+    _add_fabric_arguments(observer)
+
+    history = suites.add_parser("history", help="Fill a store with generated sample history for the analyzer.")
+    history.add_argument("--db", default="sqlite:////tmp/sdnalytics-benchmark.db",
+                         help="Connection string of the benchmark store. The store is reset before generating.")
+    history.add_argument("--links", type=int, default=100, help="Number of links between switches.")
+    history.add_argument("--hosts", type=int, default=50, help="Number of hosts attached to the switches.")
+    history.add_argument("--flows", type=int, default=10, help="Number of flows per switch.")
+    history.add_argument("--days", type=float, default=1, help="Days of sample history.")
+    history.add_argument("--interval", type=int, default=30, help="Seconds between samples.")
+    history.add_argument("--flow-hours", dest="flow_hours", type=float, default=1,
+                         help="Hours of flow samples before now; the service tasks only look at the last hour.")
+    history.add_argument("--seed", type=int, default=0, help="Seed of the history generator.")
+
+    analyzer = suites.add_parser("analyzer", help="Time the analyzer tasks on an existing store.")
+    analyzer.add_argument("--db", default="sqlite:////tmp/sdnalytics-benchmark.db",
+                          help="Connection string of the benchmark store.")
+    analyzer.add_argument("--task", dest="tasks", action="append", default=None,
+                          help="Task to benchmark, may be given multiple times. Defaults to all tasks.")
+    analyzer.add_argument("--baseline", default=None, help="JSON file with baseline results to compare against.")
+    analyzer.add_argument("--save-baseline", dest="save_baseline", action="store_true", default=False,
+                          help="Store the results in the baseline file.")
+    analyzer.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slow down.")
+
+    startup = suites.add_parser("startup", help="Time the imports of the entry points in fresh interpreters.")
+    startup.add_argument("--repetitions", type=int, default=5, help="Interpreter starts per scenario.")
+    startup.add_argument("--task", dest="tasks", action="append", default=None,
+                         help="Also time loading this analyzer task, may be given multiple times.")
+    startup.add_argument("--output", default=None, help="Write the results as JSON to this file.")
+
+    floodlight = suites.add_parser("floodlight", help="Serve a Floodlight stand-in for manual experiments.")
+    floodlight.add_argument("--port", type=int, default=8080, help="Port of the stand-in.")
+    floodlight.add_argument("--interval", type=int, default=30, help="Seconds between counter updates.")
+    _add_fabric_arguments(floodlight)
+
+    return parser.parse_args()
+
+
+def main():
+    args = configure_cmdline()
+
+    if args.suite == "observer":
+        import ingestion
+        ingestion.run(args.db, args.cycles, _create_fabric(args), args.postprocessing, args.output,
+                      args.dedup)
+    elif args.suite == "history":
+        import history
+        generator = history.HistoryGenerator(args.links, args.hosts, args.flows, args.days, args.interval,
+                                             args.flow_hours, args.seed)
+        history.generate(args.db, generator)
+    elif args.suite == "analyzer":
+        import analysis
+        results, regressions = analysis.run(args.db, args.tasks, args.baseline, args.save_baseline, args.tolerance)
+        if len(regressions) > 0:
+            sys.exit(1)
+    elif args.suite == "startup":
+        import startup
+        startup.run(args.repetitions, args.tasks, args.output)
+    elif args.suite == "floodlight":
+        from floodlight import FloodlightStandIn
+        fabric = _create_fabric(args)
+        server = FloodlightStandIn(fabric, "0.0.0.0", args.port).start()
+        print "Serving Floodlight stand-in on port {}.".format(server.port)
+        try:
+            while True:
+                time.sleep(args.interval)
+                fabric.advance()
+        except KeyboardInterrupt:
+            server.stop()
@@ -0,0 +1,127 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Saarland University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# Contributor(s): Andreas Schmidt (Saarland University)
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# 
+# This license applies to all parts of SDNalytics that are not externally
+# maintained libraries.
+
+import json
+import os
+import resource
+import time
+from multiprocessing import Process, Queue
+import sdnalyzer.store as store
+from sdnalyzer.profiling import StatementTimer
+
+MEASURES = ["analyze", "write_report", "statements", "peak_rss"]
+# Absolute changes below these are considered noise
+MINIMAL_CHANGE = {"analyze": 0.01, "write_report": 0.01, "statements": 0, "peak_rss": 2 ** 20}
+
+
+def _measure(connection_string, name, queue):
+    from sdnalyzer.analyzer import Analyzer
+
+    store.start(connection_string)
+    task = Analyzer().tasks[name]()
+    timer = StatementTimer()
+    timer.start()
+    try:
+        session = store.get_session()
+        start = time.time()
+        task._analyze(session)
+        analyzed = time.time()
+        session.rollback()
+        report = task._create_report(session)
+        report_start = time.time()
+        task._write_report(report)
+        written = time.time()
+    finally:
+        timer.stop()
+
+    queue.put({
+        "analyze": analyzed - start,
+        "write_report": written - report_start,
+        "statements": timer.count,
+        "statement_time": timer.total,
+        "report_size": len(report.content or ""),
+        "peak_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # kilobytes on Linux
+    })
+
+
+def _run_isolated(connection_string, name):
+    # Every task runs in its own process, so the peak RSS is not shared between tasks.
+    queue = Queue()
+    process = Process(target=_measure, args=(connection_string, name, queue))
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        return None
+    return queue.get()
+
+
+def _compare(name, result, baseline, tolerance):
+    regressions = []
+    if name not in baseline:
+        return regressions
+    for measure in MEASURES:
+        before = baseline[name].get(measure)
+        if before is None or result[measure] - before <= MINIMAL_CHANGE[measure]:
+            continue
+        if before > 0 and result[measure] > before * (1 + tolerance):
+            regressions.append("{} {}: {:.3f} -> {:.3f} (+{:.0%})".format(
+                name, measure, before, result[measure], result[measure] / float(before) - 1))
+    return regressions
+
+
+def run(connection_string, tasks=None, baseline_path=None, save_baseline=False, tolerance=0.2):
+    from sdnalyzer.analyzer import Analyzer
+
+    names = tasks if tasks else sorted(Analyzer().tasks.keys())
+    baseline = {}
+    if baseline_path is not None and os.path.isfile(baseline_path):
+        with open(baseline_path) as f:
+            baseline = json.loads(f.read())
+
+    results = {}
+    regressions = []
+    print "{:<26} {:>9} {:>12} {:>10} {:>9}".format("task", "analyze", "write_report", "statements", "rss [MB]")
+    for name in names:
+        result = _run_isolated(connection_string, name)
+        if result is None:
+            print "{:<26} failed".format(name)
+            continue
+        results[name] = result
+        print "{:<26} {:>9.3f} {:>12.3f} {:>10} {:>9.1f}".format(name, result["analyze"], result["write_report"],
+                                                                result["statements"], result["peak_rss"] / 2.0 ** 20)
+        regressions.extend(_compare(name, result, baseline, tolerance))
+
+    for regression in regressions:
+        print "Regression: " + regression
+
+    if save_baseline and baseline_path is not None:
+        baseline.update(results)
+        with open(baseline_path, "w") as f:
+            f.write(json.dumps(baseline, sort_keys=True, indent=4))
+        print "Stored baseline in {}.".format(baseline_path)
+
+    return results, regressions
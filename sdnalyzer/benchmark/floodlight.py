@@ -0,0 +1,203 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Saarland University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# Contributor(s): Andreas Schmidt (Saarland University)
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# 
+# This license applies to all parts of SDNalytics that are not externally
+# maintained libraries.
+
+import json
+import random
+import time
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from threading import Thread
+
+
+class Fabric(object):
+    def __init__(self, switches=10, ports=8, hosts=20, flows=50, idle_ratio=0.7, churn=0.05, seed=0):
+        self.switch_count = switches
+        self.port_count = ports
+        self.host_count = hosts
+        self.flow_count = flows
+        self.idle_ratio = idle_ratio
+        self.churn = churn
+        self.tick = 0
+        self.connected_since = int(time.time() * 1000)
+
+        self._random = random.Random(seed)
+        self.switches = ["00:00:00:00:00:{:02x}:{:02x}:{:02x}".format((i >> 16) & 0xff, (i >> 8) & 0xff, i & 0xff)
+                         for i in range(1, switches + 1)]
+        self.port_rates = {(sw, p): self._random.randint(10 ** 3, 10 ** 7)
+                           for sw in self.switches for p in range(1, ports + 1)}
+
+        # Ring of switches using the first port and the second port; remaining ports are used for hosts
+        self.links = []
+        if switches > 1:
+            for i in range(switches if switches > 2 else 1):
+                self.links.append((self.switches[i], 2, self.switches[(i + 1) % switches], 1))
+
+        self.hosts = []
+        host_ports = [(sw, p) for p in range(3, ports + 1) for sw in self.switches]
+        for i in range(min(hosts, len(host_ports))):
+            mac = "0a:00:00:{:02x}:{:02x}:{:02x}".format((i >> 16) & 0xff, (i >> 8) & 0xff, i & 0xff)
+            ip = "10.{}.{}.{}".format((i >> 16) & 0xff, (i >> 8) & 0xff, i & 0xff)
+            self.hosts.append((mac, ip, host_ports[i][0], host_ports[i][1]))
+
+        self._flow_generation = {sw: [0] * flows for sw in self.switches}
+        self._flow_idle = {sw: [self._random.random() < idle_ratio for _ in range(flows)] for sw in self.switches}
+
+    def parameters(self):
+        return {
+            "switches": self.switch_count,
+            "ports": self.port_count,
+            "hosts": self.host_count,
+            "flows": self.flow_count,
+            "idle_ratio": self.idle_ratio,
+            "churn": self.churn
+        }
+
+    def advance(self):
+        self.tick += 1
+        for sw in self.switches:
+            generations = self._flow_generation[sw]
+            for i in range(len(generations)):
+                if self._random.random() < self.churn:
+                    generations[i] = self.tick
+                    self._flow_idle[sw][i] = self._random.random() < self.idle_ratio
+
+    def switch_list(self):
+        return [{"switchDPID": sw, "connectedSince": self.connected_since} for sw in self.switches]
+
+    def features(self):
+        result = {}
+        for sw in self.switches:
+            ports = [{"portNumber": "local", "hardwareAddress": "00:00:00:00:00:00", "name": "br0"}]
+            for p in range(1, self.port_count + 1):
+                ports.append({"portNumber": str(p), "hardwareAddress": sw[6:-2] + "{:02x}".format(p),
+                              "name": "eth{}".format(p)})
+            result[sw] = {"portDesc": ports}
+        return result
+
+    def port_stats(self):
+        result = {}
+        for sw in self.switches:
+            ports = []
+            for p in range(1, self.port_count + 1):
+                octets = self.port_rates[(sw, p)] * self.tick
+                packets = octets // 1000
+                ports.append({"portNumber": str(p),
+                              "receivePackets": str(packets), "transmitPackets": str(packets + self.tick % 3),
+                              "receiveBytes": str(octets), "transmitBytes": str(octets),
+                              "receiveDropped": "0", "transmitDropped": "0",
+                              "receiveErrors": "0", "transmitErrors": "0",
+                              "receiveFrameErrors": "0", "receiveOverrunErrors": "0", "receiveCRCErrors": "0",
+                              "collisions": "0"})
+            result[sw] = {"port": ports}
+        return result
+
+    def flow_stats(self):
+        result = {}
+        host_count = max(1, len(self.hosts))
+        for n, sw in enumerate(self.switches):
+            flows = []
+            for i in range(self.flow_count):
+                generation = self._flow_generation[sw][i]
+                src = self.hosts[(n + i) % host_count] if self.hosts else ("0a:00:00:00:00:00", "10.0.0.0")
+                dst = self.hosts[(n + i + 1) % host_count] if self.hosts else ("0a:00:00:00:00:01", "10.0.0.1")
+                age = self.tick - generation
+                active_age = 1 if self._flow_idle[sw][i] else age
+                flows.append({"cookie": str(generation * self.flow_count + i),
+                              "priority": "1", "idleTimeoutSec": "5", "hardTimeoutSec": "0",
+                              "durationSeconds": str(age * 30),
+                              "packetCount": str(active_age * 100), "byteCount": str(active_age * 150000),
+                              "match": {"eth_type": "2048", "eth_src": src[0], "eth_dst": dst[0],
+                                        "ipv4_src": src[1], "ipv4_dst": dst[1], "ip_proto": "6",
+                                        "in_port": str(3 + i % max(1, self.port_count - 2)),
+                                        "tcp_src": str(1024 + i), "tcp_dst": str([22, 80, 443][i % 3])}})
+            result[sw] = {"flows": flows}
+        return result
+
+    def devices(self):
+        last_seen = int(time.time() * 1000)
+        return [{"mac": [mac], "ipv4": [ip], "lastSeen": last_seen,
+                 "attachmentPoint": [{"switchDPID": sw, "port": port}]} for (mac, ip, sw, port) in self.hosts]
+
+    def topology_links(self):
+        return [{"src-switch": src, "src-port": src_port, "dst-switch": dst, "dst-port": dst_port,
+                 "type": "internal", "direction": "bidirectional"} for (src, src_port, dst, dst_port) in self.links]
+
+    def delays(self):
+        return [{"srcDpid": src, "srcPort": str(src_port), "dstDpid": dst, "dstPort": str(dst_port),
+                 "fullDelay": 4.0 + self._random.random(), "srcCtrlDelay": 1.0, "dstCtrlDelay": 1.0,
+                 "inconsistency": False} for (src, src_port, dst, dst_port) in self.links]
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class FloodlightStandIn(object):
+    def __init__(self, fabric, host="127.0.0.1", port=0):
+        self.fabric = fabric
+        routes = {
+            "/wm/core/controller/switches/json": fabric.switch_list,
+            "/wm/core/switch/all/features/json": fabric.features,
+            "/wm/core/switch/all/port/json": fabric.port_stats,
+            "/wm/core/switch/all/flow/json": fabric.flow_stats,
+            "/wm/device/": fabric.devices,
+            "/wm/topology/links/json": fabric.topology_links,
+            "/wm/uds/delay/json": fabric.delays
+        }
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = "/" + "/".join(filter(len, self.path.split("/")))
+                if self.path.endswith("/"):
+                    path += "/"
+                if path not in routes:
+                    body = json.dumps({"code": 404})
+                    self.send_response(404)
+                else:
+                    body = json.dumps(routes[path]())
+                    self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = _ThreadingHTTPServer((host, port), Handler)
+        self.host, self.port = self._server.server_address
+        self._thread = None
+
+    def start(self):
+        self._thread = Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
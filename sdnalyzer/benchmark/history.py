@@ -0,0 +1,182 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Saarland University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# Contributor(s): Andreas Schmidt (Saarland University)
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# 
+# This license applies to all parts of SDNalytics that are not externally
+# maintained libraries.
+
+import random
+from datetime import datetime as dt, timedelta
+import sdnalyzer.store as store
+
+BATCH_SIZE = 10000
+
+
+def _address(prefix, i):
+    return "{}:{:02x}:{:02x}:{:02x}".format(prefix, (i >> 16) & 0xff, (i >> 8) & 0xff, i & 0xff)
+
+
+class HistoryGenerator(object):
+    def __init__(self, links=100, hosts=50, flows=10, days=1, interval=30, flow_hours=1, seed=0):
+        self.link_count = links
+        self.host_count = hosts
+        self.flow_count = flows
+        self.days = days
+        self.interval = interval
+        self.flow_hours = flow_hours
+        self._random = random.Random(seed)
+        self._pending = {}
+
+    def _insert(self, session, table, row):
+        rows = self._pending.setdefault(table, [])
+        rows.append(row)
+        if len(rows) >= BATCH_SIZE:
+            self._flush(session, table)
+
+    def _flush(self, session, table=None):
+        tables = [table] if table is not None else [t for t in store.Base.metadata.sorted_tables if t in self._pending]
+        for t in tables:
+            if len(self._pending.get(t, [])) > 0:
+                session.execute(t.insert(), self._pending[t])
+                self._pending[t] = []
+
+    def _ids(self, session, model):
+        return [row[0] for row in session.query(model.id).order_by(model.id).all()]
+
+    def _create_topology(self, session, start):
+        switch_count = max(2, self.link_count // 2)
+        switches = [{"device_id": _address("00:00:00:00:00", i), "created": start, "last_seen": start, "type": "switch",
+                     "connected_since": start} for i in range(1, switch_count + 1)]
+        hosts = [{"device_id": "00:00:" + _address("0a:00:00", i), "created": start, "last_seen": start, "type": "host",
+                  "connected_since": None}
+                 for i in range(1, self.host_count + 1)]
+        session.execute(store.Node.__table__.insert(), switches + hosts)
+        node_ids = self._ids(session, store.Node)
+        switch_ids = node_ids[:switch_count]
+        host_ids = node_ids[switch_count:]
+
+        # Ring of switches with additional random chords until the requested link count is reached
+        pairs = [(i, (i + 1) % switch_count) for i in range(switch_count if switch_count > 2 else 1)]
+        while len(pairs) < self.link_count:
+            pairs.append(tuple(self._random.sample(range(switch_count), 2)))
+        pairs = pairs[:self.link_count]
+
+        next_port = {i: 1 for i in range(switch_count)}
+        ports = []
+        links = []
+        for (a, b) in pairs:
+            src, dst = sorted([a, b])
+            links.append({"created": start, "last_seen": start, "type": "internal", "direction": "bidirectional",
+                          "src_id": switch_ids[src], "src_port": next_port[src],
+                          "dst_id": switch_ids[dst], "dst_port": next_port[dst]})
+            for n in [src, dst]:
+                ports.append({"node_id": switch_ids[n], "port_number": next_port[n], "created": start,
+                              "last_seen": start, "name": "eth{}".format(next_port[n]),
+                              "hardware_address": _address("02:00:00", len(ports))})
+                next_port[n] += 1
+
+        for i, host_id in enumerate(host_ids):
+            sw = i % switch_count
+            # The store orders link endpoints by device id, hosts (00:00:0a:...) sort after switches
+            links.append({"created": start, "last_seen": start, "type": "ethernet", "direction": "bidirectional",
+                          "src_id": switch_ids[sw], "src_port": next_port[sw], "dst_id": host_id, "dst_port": 1})
+            ports.append({"node_id": host_id, "port_number": 1, "created": start, "last_seen": start, "name": "UNK",
+                          "hardware_address": hosts[i]["device_id"][6:]})
+            next_port[sw] += 1
+
+        session.execute(store.Port.__table__.insert(), ports)
+        session.execute(store.Link.__table__.insert(), links)
+        return switch_ids, hosts, self._ids(session, store.Link)
+
+    def _create_flows(self, session, start, switch_ids, hosts):
+        flows = []
+        for sw in switch_ids:
+            for i in range(self.flow_count):
+                src = hosts[self._random.randrange(len(hosts))]["device_id"][6:] if hosts else "0a:00:00:00:00:00"
+                dst = hosts[self._random.randrange(len(hosts))]["device_id"][6:] if hosts else "0a:00:00:00:00:01"
+                consume = self._random.random() < 0.5
+                service = self._random.choice([22, 53, 80, 443])
+                flows.append({"created": start, "cookie": i, "node_id": sw,
+                              "data_layer_source": src, "data_layer_destination": dst, "data_layer_type": 2048,
+                              "data_layer_virtual_lan": -1, "data_layer_virtual_lan_priority_code_point": 0,
+                              "input_port": 1, "network_source": "10.0.0.1", "network_destination": "10.0.0.2",
+                              "network_source_mask_len": 24, "network_destination_mask_len": 0,
+                              "network_protocol": 6, "network_type_of_service": 0, "wildcards": 0,
+                              "transport_source": 40000 + i if consume else service,
+                              "transport_destination": service if consume else 40000 + i})
+        if len(flows) > 0:
+            session.execute(store.Flow.__table__.insert(), flows)
+        return self._ids(session, store.Flow)
+
+    def generate(self, session, now=None):
+        now = now if now is not None else dt.now()
+        count = int(self.days * 86400 // self.interval)
+        start = now - timedelta(seconds=count * self.interval)
+        flow_start = now - timedelta(hours=self.flow_hours)
+
+        switch_ids, hosts, link_ids = self._create_topology(session, start)
+        flow_ids = self._create_flows(session, start, switch_ids, hosts)
+        session.commit()
+
+        link_rates = {l: self._random.randint(10 ** 3, 10 ** 8) for l in link_ids}
+        flow_bytes = {f: 0 for f in flow_ids}
+        for n in range(1, count + 1):
+            sampled = start + timedelta(seconds=n * self.interval)
+            self._insert(session, store.SampleTimestamp.__table__, {"timestamp": sampled, "interval": self.interval})
+
+            for node_id in switch_ids:
+                self._insert(session, store.NodeSample.__table__,
+                             {"node_id": node_id, "sampled": sampled, "degree": 2,
+                              "closeness": self._random.random(), "betweenness": self._random.random()})
+
+            for link_id in link_ids:
+                loss = self._random.random() * 0.05 if self._random.random() < 0.1 else 0.0
+                rate = int(link_rates[link_id] * (0.5 + self._random.random()))
+                self._insert(session, store.LinkSample.__table__,
+                             {"link_id": link_id, "sampled": sampled, "betweenness": self._random.random(),
+                              "src_packet_loss": loss, "dst_packet_loss": 0.0,
+                              "src_transmit_data_rate": rate, "src_receive_data_rate": rate,
+                              "dst_transmit_data_rate": rate, "dst_receive_data_rate": rate,
+                              "src_delay": 1 + self._random.random() * 4, "dst_delay": 1 + self._random.random() * 4})
+
+            if sampled > flow_start:
+                for flow_id in flow_ids:
+                    flow_bytes[flow_id] += self._random.randint(0, 10 ** 6)
+                    self._insert(session, store.FlowSample.__table__,
+                                 {"flow_id": flow_id, "sampled": sampled, "byte_count": flow_bytes[flow_id],
+                                  "packet_count": flow_bytes[flow_id] // 1000, "duration_seconds": n * self.interval,
+                                  "priority": 1, "idle_timeout_sec": 5, "hard_timeout_sec": 0})
+
+        self._flush(session)
+        session.commit()
+        return count
+
+
+def generate(connection_string, generator):
+    store.start(connection_string)
+    store.drop()
+    store.init()
+    session = store.get_session()
+    count = generator.generate(session)
+    print "Generated {} samples of {} links, {} hosts and {} flows per switch.".format(
+        count, generator.link_count, generator.host_count, generator.flow_count)
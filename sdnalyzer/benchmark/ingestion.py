@@ -0,0 +1,108 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Saarland University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# Contributor(s): Andreas Schmidt (Saarland University)
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# 
+# This license applies to all parts of SDNalytics that are not externally
+# maintained libraries.
+
+import json
+import resource
+import time
+from datetime import datetime as dt
+from floodlight import Fabric, FloodlightStandIn
+import sdnalyzer.store as store
+from sdnalyzer.common import RequestException
+
+
+def _count_rows(session):
+    return sum(session.query(table).count() for table in store.Base.metadata.sorted_tables)
+
+
+def _peak_rss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # kilobytes on Linux
+
+
+def run(connection_string, cycles, fabric, postprocessing=False, output=None, dedup=False):
+    from sdnalyzer.observer import Observer
+
+    store.start(connection_string)
+    store.drop()
+    store.init()
+
+    server = FloodlightStandIn(fabric).start()
+    observer = Observer([(server.host, server.port)], dedup=dedup)
+    if not postprocessing:
+        observer._post_processes = []
+
+    results = []
+    rows = _count_rows(store.get_session())
+    try:
+        for cycle in range(cycles):
+            fabric.advance()
+            observer._started = dt.now()
+
+            start = time.time()
+            try:
+                observer._prepare_queries()
+            except RequestException as e:
+                print "Request {} failed in cycle {}.".format(e.query.url, cycle)
+                continue
+            prepared = time.time()
+            observer._execute_queries()
+            executed = time.time()
+            observer._post_processing(observer._started)
+            observer._save_timestamp(observer._started)
+            completed = time.time()
+
+            session = store.get_session()
+            new_rows = _count_rows(session)
+            session.close()
+
+            result = {
+                "cycle": cycle,
+                "prepare": prepared - start,
+                "execute": executed - prepared,
+                "postprocess": completed - executed,
+                "total": completed - start,
+                "rows": new_rows - rows,
+                "rows_per_second": (new_rows - rows) / max(completed - prepared, 1e-9),
+                "peak_rss": _peak_rss()
+            }
+            rows = new_rows
+            results.append(result)
+    finally:
+        server.stop()
+
+    _print_results(results)
+    if output is not None:
+        with open(output, "w") as f:
+            f.write(json.dumps({"fabric": fabric.parameters(), "cycles": results}, sort_keys=True, indent=4))
+    return results
+
+
+def _print_results(results):
+    print "{:>5} {:>9} {:>9} {:>11} {:>9} {:>8} {:>10} {:>9}".format(
+        "cycle", "prepare", "execute", "postprocess", "total", "rows", "rows/s", "rss [MB]")
+    for r in results:
+        print "{cycle:>5} {prepare:>9.3f} {execute:>9.3f} {postprocess:>11.3f} {total:>9.3f} {rows:>8} " \
+              "{rows_per_second:>10.1f} {rss:>9.1f}".format(rss=r["peak_rss"] / 2.0 ** 20, **r)
@@ -0,0 +1,79 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Saarland University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# Contributor(s): Andreas Schmidt (Saarland University)
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# 
+# This license applies to all parts of SDNalytics that are not externally
+# maintained libraries.
+
+import json
+import subprocess
+import sys
+
+# Each scenario runs in a fresh interpreter, as startup time is dominated by imports that are cached in-process.
+SCENARIOS = {
+    "sdn-ctl": "import sdnalyzer.command_line",
+    "store": "import sdnalyzer.store",
+    "analyzer": "import sdnalyzer.analyzer; sdnalyzer.analyzer.Analyzer().tasks.keys()",
+    "observer": "import sdnalyzer.observer",
+    "task": "import sdnalyzer.analyzer; sdnalyzer.analyzer.Analyzer().tasks['{task}']"
+}
+
+# Modules that should only be imported by the tasks and post processes that need them
+HEAVY_MODULES = ["numpy", "pandas", "scipy", "graph_tool", "flask"]
+
+_MEASURE = """
+import json, sys, time
+start = time.time()
+{code}
+duration = time.time() - start
+print json.dumps({{"seconds": duration, "heavy": [m for m in {heavy!r} if m in sys.modules]}})
+"""
+
+
+def _measure(code):
+    output = subprocess.check_output([sys.executable, "-c", _MEASURE.format(code=code, heavy=HEAVY_MODULES)])
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(repetitions=5, tasks=None, output=None):
+    scenarios = dict((name, code) for name, code in SCENARIOS.iteritems() if name != "task")
+    for task in tasks or []:
+        scenarios["task " + task] = SCENARIOS["task"].format(task=task)
+
+    results = {}
+    print "{:<34} {:>10} {:>10}  {}".format("scenario", "median [s]", "max [s]", "heavy imports")
+    for name in sorted(scenarios.keys()):
+        measurements = [_measure(scenarios[name]) for _ in range(repetitions)]
+        seconds = sorted(m["seconds"] for m in measurements)
+        results[name] = {
+            "median": seconds[len(seconds) // 2],
+            "max": seconds[-1],
+            "heavy": measurements[-1]["heavy"]
+        }
+        print "{:<34} {:>10.3f} {:>10.3f}  {}".format(name, results[name]["median"], results[name]["max"],
+                                                     ", ".join(results[name]["heavy"]) or "-")
+
+    if output is not None:
+        with open(output, "w") as f:
+            f.write(json.dumps(results, indent=2))
+    return results
@@ -35,4 +35,8 @@ def observe():
     sdnalyzer.init("observe")
 
 def analyze():
-    sdnalyzer.init("analyze")
\ No newline at end of file
+    sdnalyzer.init("analyze")
+
+def benchmark():
+    import sdnalyzer.benchmark
+    sdnalyzer.benchmark.main()
\ No newline at end of file
@@ -25,6 +25,67 @@
 # This license applies to all parts of SDNalytics that are not externally
 # maintained libraries.
 
+import ctypes
+import resource
+import time
+
+
+class _Timespec(ctypes.Structure):
+    _fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
+
+
+CLOCK_MONOTONIC = 1
+try:
+    _clock_gettime = ctypes.CDLL("librt.so.1", use_errno=True).clock_gettime
+    _clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(_Timespec)]
+except (OSError, AttributeError):
+    _clock_gettime = None
+
+
+def monotonic():
+    # Seconds of a clock that is not affected by changes of the system time (Python 2 lacks time.monotonic).
+    if _clock_gettime is None:
+        return time.time()
+    t = _Timespec()
+    if _clock_gettime(CLOCK_MONOTONIC, ctypes.byref(t)) != 0:
+        raise OSError(ctypes.get_errno(), "clock_gettime failed")
+    return t.tv_sec + t.tv_nsec * 1e-9
+
+
+def _proc_status(field):
+    # Value of a memory field of /proc/self/status in bytes, None where it is not available
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) * 1024
+    except IOError:
+        pass
+    return None
+
+
+def rss():
+    # Current resident set size in bytes
+    current = _proc_status("VmRSS")
+    return current if current is not None else peak_rss()
+
+
+def peak_rss():
+    # Peak resident set size in bytes since the process started or reset_peak_rss was called
+    peak = _proc_status("VmHWM")
+    return peak if peak is not None else resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # kilobytes
+
+
+def reset_peak_rss():
+    # Linux (since 4.0) resets VmHWM to the current RSS; elsewhere the peak stays the one of the whole process
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except (IOError, OSError):
+        return False
+
+
 class RequestException(Exception):
     def __init__(self, query):
         self.query = query
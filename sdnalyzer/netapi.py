@@ -26,16 +26,24 @@
 # maintained libraries.
 
 import flask
-from datetime import datetime as dt
+import os
+from datetime import datetime as dt, timedelta
 from functools import wraps
 from flask import request, Response
 from common import ProgramState
+import monitoring
+import store
+from profiling import to_folded
+from sketches import HyperLogLog
 
 app = flask.Flask(__name__)
 
 program_state = None
 username = "root"
 password = ""
+ring_directory = None
+_rings = {}
+_snapshots = None
 
 
 # Decorator for Basic Auth. SOURCE: http://flask.pocoo.org/snippets/8/
@@ -75,6 +83,12 @@ def status():
     }
     return flask.jsonify(res)
 
+@app.route("/metrics", methods=["GET"])
+@requires_auth
+def metrics():
+    return Response(monitoring.registry.render(), mimetype="text/plain; version=0.0.4")
+
+
 @app.route("/run", methods=["GET"], defaults={ 'task': 'all'})
 @app.route("/run/<path:task>", methods=["GET"])
 @requires_auth
@@ -84,9 +98,13 @@ def run(task):
         return fallback("run")
     else:
         try:
-            program_state.instance.run(task)
+            profile = request.args.get("profile", "0") in ["1", "true"]
+            force = request.args.get("force", "0") in ["1", "true"]
+            program_state.instance.run(task, profile, force)
             res = {
                 "command": "Analyzer run " + task,
+                "profile": profile,
+                "force": force,
                 "success": True
             }
             return flask.jsonify(res)
@@ -94,20 +112,248 @@ def run(task):
             return fallback("run")
 
 
+@app.route("/profiles/<int:report_id>", methods=["GET"], defaults={"fmt": "sql"})
+@app.route("/profiles/<int:report_id>/<fmt>", methods=["GET"])
+@requires_auth
+def profile(report_id, fmt):
+    session = store.get_session()
+    try:
+        p = session.query(store.Profile).filter(store.Profile.report_id == report_id).first()
+        if p is None or fmt not in ["sql", "pstats", "folded"]:
+            return fallback("profiles/{}/{}".format(report_id, fmt))
+
+        if fmt == "pstats":
+            return Response(p.statistics, mimetype="application/octet-stream",
+                            headers={"Content-Disposition": "attachment; filename=report-{}.pstats".format(report_id)})
+        elif fmt == "folded":
+            return Response(to_folded(p.statistics), mimetype="text/plain")
+        else:
+            return Response(p.statements, mimetype="application/json")
+    finally:
+        session.close()
+
+
+@app.route("/hot/<metric>", methods=["GET"])
+@requires_auth
+def hot(metric):
+    # Newest n rows of a ring buffer written by the observer, see observer.hotwindow
+    import numpy as np
+    from ringbuffer import RingBuffer, SlotMap, metric_path, slots_path
+    path = slots_path(ring_directory, metric.split("_")[0]) if ring_directory is not None else None
+    if path is None or not os.path.isfile(metric_path(ring_directory, metric)) or not os.path.isfile(path):
+        return fallback("hot/" + metric)
+    if metric not in _rings:
+        _rings[metric] = RingBuffer(metric_path(ring_directory, metric))
+    timestamps, values = _rings[metric].last(int(request.args.get("n", 10)))
+
+    res = {
+        "metric": metric,
+        "timestamps": [dt.fromtimestamp(t).isoformat() for t in timestamps],
+        "values": dict((i, [None if np.isnan(v) else v for v in values[:, slot].tolist()])
+                       for i, slot in SlotMap.read(path).iteritems() if not np.all(np.isnan(values[:, slot])))
+    }
+    return flask.jsonify(res)
+
+
+@app.route("/heavyhitters", methods=["GET"], defaults={"device_id": None})
+@app.route("/heavyhitters/<device_id>", methods=["GET"])
+@requires_auth
+def heavy_hitters(device_id):
+    # Flows with the most bytes in the last minutes on a switch or in the fabric, see observer.heavyhitters
+    from analyzer.heavyhitters import merged_summaries, describe
+    session = store.get_session()
+    try:
+        node_id = None
+        if device_id is not None:
+            node = session.query(store.Node).filter(store.Node.device_id == device_id).first()
+            if node is None:
+                return fallback("heavyhitters/" + device_id)
+            node_id = node.id
+        start = dt.now() - timedelta(minutes=int(request.args.get("minutes", 60)))
+        merged = merged_summaries(session, start, node_id=node_id)
+        res = {
+            "switch": device_id,
+            "start": start.isoformat(),
+            "flows": describe(session, merged[node_id], int(request.args.get("n", 10))) if node_id in merged else []
+        }
+    finally:
+        session.close()
+    return flask.jsonify(res)
+
+
+@app.route("/sketches/<name>", methods=["GET"])
+@requires_auth
+def sketches(name):
+    # Merges the sketch buckets of the last hours, see observer.cardinality; frequency sketches need a key
+    from analyzer.cardinality import merged_sketches, estimate
+    from sketches import SKETCH_TYPES
+    subject = request.args.get("subject", None)
+    key = request.args.get("key", None)
+    if name not in SKETCH_TYPES or (SKETCH_TYPES[name] is not HyperLogLog and key is None):
+        return fallback("sketches/" + name)
+    session = store.get_session()
+    try:
+        start = dt.now() - timedelta(hours=float(request.args.get("hours", 24)))
+        merged = merged_sketches(session, name, start, subject=subject)
+    finally:
+        session.close()
+    value, error = estimate(merged[subject], key) if subject in merged else (0, 0)
+    res = {
+        "name": name,
+        "subject": subject,
+        "key": key,
+        "start": start.isoformat(),
+        "estimate": value,
+        "error": error
+    }
+    return flask.jsonify(res)
+
+
+def _time_argument(name, default):
+    value = request.args.get(name, None)
+    return default if value is None else _parse_time(value)
+
+
+def _parse_time(value):
+    for fmt in ("%Y-%m-%dT%H:%M:%S.%f", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%dT%H:%M", "%Y-%m-%d"):
+        try:
+            return dt.strptime(value, fmt)
+        except ValueError:
+            pass
+    return None
+
+
+@app.route("/links/<int:link_id>/series", methods=["GET"], defaults={"kind": "links"})
+@app.route("/ports/<int:port_id>/series", methods=["GET"], defaults={"kind": "ports"})
+@requires_auth
+def series(kind, link_id=None, port_id=None):
+    # Samples of a link or rates of a port between from and to (ISO timestamps, default the last day), downsampled to
+    # at most points buckets with min, max and avg per metric, see series
+    from series import link_series, port_series, LINK_METRICS, PORT_METRICS
+    end = _time_argument("to", dt.now())
+    start = _time_argument("from", None if end is None else end - timedelta(days=1))
+    if start is None or end is None or start >= end:
+        return fallback(request.path.lstrip("/"))
+    metrics = request.args.get("metrics", None)
+    metrics = metrics.split(",") if metrics is not None else None
+    points = request.args.get("points", 200, type=int)
+    session = store.get_session()
+    try:
+        if kind == "links":
+            if session.query(store.Link).get(link_id) is None or \
+                    (metrics is not None and not set(metrics) <= set(LINK_METRICS)):
+                return fallback(request.path.lstrip("/"))
+            res = link_series(session, link_id, start, end, points, metrics)
+            res["link"] = link_id
+        else:
+            if session.query(store.Port).get(port_id) is None or \
+                    (metrics is not None and not set(metrics) <= set(PORT_METRICS)):
+                return fallback(request.path.lstrip("/"))
+            res = port_series(session, port_id, start, end, points, metrics)
+            res["port"] = port_id
+    finally:
+        session.close()
+    return flask.jsonify(res)
+
+
+@app.route("/topology", methods=["GET"], defaults={"timestamp": None})
+@app.route("/topology/<timestamp>", methods=["GET"])
+@requires_auth
+def topology(timestamp):
+    # Nodes and links with their centrality at the newest sample timestamp before timestamp, see snapshot
+    global _snapshots
+    from snapshot import TopologySnapshots, FORMATS, sample_timestamp
+    fmt = request.args.get("format", "json")
+    at = _parse_time(timestamp) if timestamp is not None else None
+    if fmt not in FORMATS or (timestamp is not None and at is None):
+        return fallback(request.path.lstrip("/"))
+    if _snapshots is None:
+        _snapshots = TopologySnapshots()
+    session = store.get_session()
+    try:
+        sampled = sample_timestamp(session, at)
+        if sampled is None:
+            return fallback(request.path.lstrip("/"))
+        content = _snapshots.get(session, sampled, fmt)
+    finally:
+        session.close()
+    return Response(content, mimetype=FORMATS[fmt])
+
+
+@app.route("/paths/<src>/<dst>", methods=["GET"])
+@requires_auth
+def paths(src, dst):
+    # k shortest paths between two switches (device ids) weighted by delay and loss, see paths
+    from paths import shared_service, disjoint_paths
+    service = shared_service()
+    session = store.get_session()
+    try:
+        service.refresh(session)
+    finally:
+        session.close()
+    node_ids = dict((device_id, node_id) for node_id, device_id in service.device_ids.items())
+    if src not in node_ids or dst not in node_ids:
+        return fallback(request.path.lstrip("/"))
+    found = service.paths(node_ids[src], node_ids[dst])[:request.args.get("n", service.k, type=int)]
+    disjoint = disjoint_paths(found)
+    res = {
+        "timestamp": service.timestamp.isoformat(),
+        "src": src,
+        "dst": dst,
+        "paths": [{
+            "cost": cost,
+            "switches": [service.device_ids[n] for n in nodes],
+            "links": links,
+            "disjoint": (cost, nodes, links) in disjoint
+        } for cost, nodes, links in found]
+    }
+    return flask.jsonify(res)
+
+
+@app.route("/anomalies", methods=["GET"])
+@requires_auth
+def anomalies():
+    # Link metrics that deviated from their moving average in the last minutes, see observer.anomalies. The observer
+    # serves the anomalies it detected from memory, other processes read them from the store.
+    since = dt.now() - timedelta(minutes=int(request.args.get("minutes", 60)))
+    link_id = request.args.get("link", None, type=int)
+    detector = getattr(program_state.instance, "anomaly_detector", None)
+    if detector is not None:
+        detected = detector.recent(since)
+    else:
+        session = store.get_session()
+        try:
+            rows = session.query(store.LinkAnomaly).filter(store.LinkAnomaly.detected > since) \
+                .order_by(store.LinkAnomaly.detected.desc())
+            if link_id is not None:
+                rows = rows.filter(store.LinkAnomaly.link_id == link_id)
+            detected = [{"link_id": a.link_id, "detected": a.detected, "metric": a.metric, "value": a.value,
+                         "expected": a.expected, "deviation": a.deviation} for a in rows]
+        finally:
+            session.close()
+    res = {
+        "start": since.isoformat(),
+        "anomalies": [dict(a, detected=a["detected"].isoformat()) for a in detected
+                      if link_id is None or a["link_id"] == link_id]
+    }
+    return flask.jsonify(res)
+
+
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def fallback(path):
     res = {
         "error": 404,
-        "message": "The route /{} you provided is not valid. Try one of these: /status".format(path)
+        "message": "The route /{} you provided is not valid. Try one of these: /status, /metrics, /run, /profiles, /hot, /heavyhitters, /sketches, /anomalies, /links/<id>/series, /ports/<id>/series, /topology, /paths".format(path)
     }
     return flask.jsonify(res)
 
 
-def init(cmd, user="root", passwd="password"):
-    global program_state, username, password
+def init(cmd, user="root", passwd="password", rings=None):
+    global program_state, username, password, ring_directory
     username = user
     password = passwd
+    ring_directory = rings
 
     program_state = ProgramState()
     program_state.command = cmd
@@ -25,94 +25,336 @@
 # This license applies to all parts of SDNalytics that are not externally
 # maintained libraries.
 
+import logging
 import time
-import math
 from datetime import datetime as dt, timedelta
 from threading import *
 
 from augmentation import CentralityAugmentation
-from sdnalyzer.common import RequestException
+from sdnalyzer.common import RequestException, monotonic, peak_rss, reset_peak_rss, rss
+import sdnalyzer.monitoring as monitoring
 from sdnalyzer.observer.sensors.floodlightControllerSensor import DevicesQuery, SwitchListQuery, LinksQuery, SwitchStatFlowQuery, \
     SwitchStatPortQuery, SwitchStatFeaturesQuery, DelayQuery
 import sdnalyzer.store as store
 
 
+_phase_duration = monitoring.registry.histogram("sdnalytics_observer_phase_seconds",
+                                                "Duration of the observer phases per poll.", ["phase"])
+_poll_duration = monitoring.registry.histogram("sdnalytics_observer_poll_seconds",
+                                               "Duration of a complete poll.")
+_poll_failures = monitoring.registry.counter("sdnalytics_observer_poll_failures_total",
+                                             "Polls aborted because a controller request failed.")
+_poll_overruns = monitoring.registry.counter("sdnalytics_observer_poll_overruns_total",
+                                             "Polls that took longer than the poll interval of a query.")
+_polls_missed = monitoring.registry.counter("sdnalytics_observer_polls_missed_total",
+                                            "Poll intervals of a query that were skipped due to an overrun.",
+                                            ["query"])
+_rss = monitoring.registry.gauge("sdnalytics_observer_rss_bytes",
+                                 "Resident set size of the observer after the last poll.")
+_poll_peak_rss = monitoring.registry.gauge("sdnalytics_observer_poll_peak_rss_bytes",
+                                           "Peak resident set size of the observer during the last poll.")
+_budget_exceeded = monitoring.registry.counter("sdnalytics_observer_memory_budget_exceeded_total",
+                                               "Polls whose peak resident set size exceeded the memory budget.")
+_chunk_size = monitoring.registry.gauge("sdnalytics_observer_chunk_size",
+                                        "Switches whose statistics are processed between two flushes.")
+_incomplete_runs = monitoring.registry.counter("sdnalytics_observer_incomplete_shard_runs_total",
+                                               "Topology runs not completed because a shard did not write in time.")
+
+# Node and link samples are only complete in runs containing these queries, so only these runs are post processed and
+# recorded as sample timestamps.
+TOPOLOGY_QUERIES = ("SwitchListQuery", "LinksQuery")
+
+# Queries processing their response in chunks of switches (see JsonQuery.chunk_size)
+CHUNKED_QUERIES = ("SwitchStatFeaturesQuery", "SwitchStatPortQuery", "SwitchStatFlowQuery")
+# Chunk size a memory budget starts to shrink from if no chunk size is configured
+DEFAULT_CHUNK_SIZE = 64
+# Seconds between two checks of shard 0 whether the other shards have written their samples of a run
+SHARD_CHECK_INTERVAL = 1
+
+
 class Observer(object):
-    def __init__(self, controller_url, api_port):
+    def __init__(self, controllers, recorder=None, dedup=False, pipeline=None, shard=(0, 1), chunk_size=None,
+                 memory_budget=None, flow_sample_interval=None):
+        # controllers is a list of (host, port) tuples; shard is (index, count) when several observer processes write
+        # into the same store, each polling its own controllers. memory_budget is the peak RSS in bytes a poll may
+        # reach before the chunk size is halved. flow_sample_interval (seconds) enables flow lifecycle tracking.
         self._poll_interval = None
+        self._recorder = recorder
+        self._pipeline = pipeline
+        self._shard_index, self._shard_count = shard
+        self._switches = set()
         self._started = dt.now()
         self._completed = None
-        self._queries = [SwitchListQuery(self._poll_interval, controller_url=controller_url, api_port=api_port),
-                         DevicesQuery(self._poll_interval, controller_url=controller_url, api_port=api_port),
-                         SwitchStatFeaturesQuery(self._poll_interval, controller_url=controller_url, api_port=api_port),
-                         SwitchStatPortQuery(self._poll_interval, controller_url=controller_url, api_port=api_port),
-                         LinksQuery(self._poll_interval, controller_url=controller_url, api_port=api_port),
-                         SwitchStatFlowQuery(self._poll_interval, controller_url=controller_url, api_port=api_port),
-                         DelayQuery(self._poll_interval, controller_url=controller_url, api_port=api_port)]
+        self._queries = [SwitchListQuery(self._poll_interval, controllers=controllers),
+                         DevicesQuery(self._poll_interval, controllers=controllers),
+                         SwitchStatFeaturesQuery(self._poll_interval, controllers=controllers),
+                         SwitchStatPortQuery(self._poll_interval, controllers=controllers),
+                         LinksQuery(self._poll_interval, controllers=controllers),
+                         SwitchStatFlowQuery(self._poll_interval, controllers=controllers),
+                         DelayQuery(self._poll_interval, controllers=controllers)]
+
+        # The centrality covers the whole topology, so it is computed by shard 0 once all shards have written
+        self._post_processes = [CentralityAugmentation()] if self._shard_index == 0 else []
+        self._memory_budget = memory_budget
+        # LinkAnomalyDetector serving recent anomalies to the API, see observer.anomalies
+        self.anomaly_detector = None
+
+        for query in self._queries:
+            query.recorder = recorder
+            query.dedup = dedup
+            query.concurrent_writers = self.sharded
+        if flow_sample_interval is not None:
+            flows = self._query("SwitchStatFlowQuery")
+            flows.lifecycle = True
+            flows.sample_interval = timedelta(seconds=flow_sample_interval)
+        if chunk_size is None and memory_budget is not None:
+            chunk_size = DEFAULT_CHUNK_SIZE
+        self.chunk_size = chunk_size
+
+        self._due = list(self._queries)
+        self._next_due = {}
+
+    @property
+    def queries(self):
+        return self._queries
+
+    def add_listener(self, listener):
+        for query in self._queries:
+            query.listeners.append(listener)
 
-        self._post_processes = [CentralityAugmentation()]
+    def add_post_process(self, process):
+        # process.execute(sample time) runs after the queries of every run with the topology queries
+        self._post_processes.append(process)
+
+    @property
+    def chunk_size(self):
+        return self._query(CHUNKED_QUERIES[0]).chunk_size
+
+    @chunk_size.setter
+    def chunk_size(self, size):
+        for name in CHUNKED_QUERIES:
+            self._query(name).chunk_size = size
+        if size is not None:
+            _chunk_size.set(size)
+
+    @property
+    def sharded(self):
+        return self._shard_count > 1
+
+    def configure(self, poll_interval, poll_intervals=None):
+        self._poll_interval = poll_interval
+        intervals = poll_intervals if poll_intervals is not None else {}
+        for query in self._queries:
+            query.poll_interval = int(intervals.get(query.name, poll_interval))
+
+        for query in self._queries:
+            if query.follows is not None:
+                query.poll_interval = self._query(query.follows).poll_interval
+
+    def _query(self, name):
+        return filter(lambda q: q.name == name, self._queries)[0]
+
+    def _is_topology_run(self):
+        names = set(q.name for q in self._due)
+        return all(name in names for name in TOPOLOGY_QUERIES)
+
+    def _save_timestamp(self, started):
+        intervals = [self._query(name).poll_interval for name in TOPOLOGY_QUERIES]
+        interval = max(intervals) if None not in intervals else self._poll_interval
+        session = store.get_session()
+        session.add(store.SampleTimestamp(timestamp=started, interval=interval))
+        session.commit()
 
-    def _save_timestamp(self):
+    def _record_shard(self, started):
         session = store.get_session()
-        session.add(store.SampleTimestamp(timestamp=self._started, interval=self._poll_interval))
+        session.add(store.ShardRun(timestamp=started, shard=self._shard_index))
         session.commit()
+        session.close()
+
+    def _await_shards(self, started):
+        # Waits up to half a poll interval for the other shards to write their samples of the run
+        deadline = monotonic() + self._poll_interval / 2.0
+        session = store.get_session()
+        try:
+            while True:
+                shards = session.query(store.ShardRun.shard).filter(store.ShardRun.timestamp == started).distinct()
+                if shards.count() >= self._shard_count:
+                    session.query(store.ShardRun).filter(store.ShardRun.timestamp <= started).delete()
+                    session.commit()
+                    return True
+                session.rollback()
+                if monotonic() >= deadline:
+                    return False
+                time.sleep(SHARD_CHECK_INTERVAL)
+        finally:
+            session.close()
+
+    def _complete_run(self, started):
+        # Runs once the samples of a topology run are written
+        if self.sharded:
+            self._record_shard(started)
+            if self._shard_index == 0 and not self._await_shards(started):
+                _incomplete_runs.inc()
+                logging.error("Not all shards wrote their samples of the run at {}, it is not recorded.".format(started))
+                return
+        self._post_processing(started)
+        if self._shard_index == 0:
+            self._save_timestamp(started)
 
     def _prepare_queries(self):
         print "Start preparing at {:%H:%M:%S}.".format(self._started)
 
-        threads = []
-        for query in self._queries:
-            thread = Thread(target=query.prepare)
-            thread.daemon = True
-            threads.append((thread, query))
-            thread.start()
+        with _phase_duration.time(phase="prepare"):
+            threads = []
+            for query in self._due:
+                thread = Thread(target=query.prepare, args=(self._started,))
+                thread.daemon = True
+                threads.append((thread, query))
+                thread.start()
+
+            for (thread, query) in threads:
+                thread.join(10)
+                if thread.is_alive() or not query.success:
+                    raise RequestException(query)
 
-        for (thread, query) in threads:
-            thread.join(10)
-            if thread.is_alive() or not query.success:
-                raise RequestException(query)
+            if self.sharded:
+                self._restrict_to_shard()
 
         print "Completed preparing."
 
+    def _restrict_to_shard(self):
+        # Links and hosts seen by the controllers of several shards are recorded by one of them only
+        switch_list = self._query("SwitchListQuery")
+        if switch_list in self._due:
+            self._switches = set(sw["switchDPID"] for sw in switch_list.result)
+        for query in self._due:
+            query.restrict(self._switches)
+
+    def _aligned_now(self):
+        # Shards poll at the same instants of the poll interval grid and use them as sample time, so their samples
+        # share the timestamps recorded by the first shard.
+        now = time.time()
+        return dt.fromtimestamp(now - now % self._poll_interval)
+
     def _execute_queries(self):
         print "Start executing at {:%H:%M:%S}.".format(dt.now())
-        for query in self._queries:
-            query.execute(self._started)
+        with _phase_duration.time(phase="execute"):
+            for query in self._due:
+                if self._pipeline is None:
+                    query.execute(self._started)
+                else:
+                    source = query.source()
+                    self._pipeline.submit(query, self._started, query.take(), source)
         print "Completed executing at {:%H:%M:%S}.".format(dt.now())
 
-    def _post_processing(self):
+    def _post_processing(self, started):
         print "Start postprocessing at {:%H:%M:%S}.".format(dt.now())
-        for p in self._post_processes:
-            p.execute(self._started)
+        with _phase_duration.time(phase="postprocess"):
+            for p in self._post_processes:
+                p.execute(started)
         self._completed = dt.now()
         print "Completed postprocessing at {:%H:%M:%S}.".format(self._completed)
 
+    def _select_due(self):
+        now = monotonic()
+        leaders = set(q.name for q in self._queries if q.follows is None and self._next_due[q] <= now)
+        return [q for q in self._queries if q.name in leaders or q.follows in leaders]
+
+    def _reschedule(self):
+        now = monotonic()
+        overrun = False
+        for query in self._due:
+            next_due = self._next_due[query] + query.poll_interval
+            if next_due <= now:
+                # Skip the slots that passed during the run instead of drifting or polling twice in a row
+                missed = int((now - next_due) // query.poll_interval) + 1
+                next_due += missed * query.poll_interval
+                _polls_missed.inc(missed, query=query.name)
+                logging.warning("{} overran its interval of {} seconds, skipping {} polls.".format(
+                    query.name, query.poll_interval, missed))
+                overrun = True
+            self._next_due[query] = next_due
+        if overrun:
+            _poll_overruns.inc()
+
     def wait_for_next_run(self):
-        next_iteration = (self._started + timedelta(seconds=self._poll_interval))
-        delta = int(max(0, math.floor((next_iteration - self._completed).total_seconds())))
-        print "Waiting {} seconds till next run.".format(delta)
+        delta = max(0, min(self._next_due.values()) - monotonic())
+        print "Waiting {:.1f} seconds till next run.".format(delta)
         time.sleep(delta)
 
+    def _check_memory(self):
+        # With the pipeline, the peak also covers the writes of earlier polls that were pending during this one
+        peak = peak_rss()
+        _rss.set(rss())
+        _poll_peak_rss.set(peak)
+        print "Peak memory of the poll was {:.1f} MB.".format(peak / 2.0 ** 20)
+        if self._memory_budget is not None and peak > self._memory_budget:
+            _budget_exceeded.inc()
+            if self.chunk_size > 1:
+                self.chunk_size = max(1, self.chunk_size // 2)
+            logging.warning("Poll exceeded the memory budget of {:.1f} MB, processing {} switches at a time.".format(
+                self._memory_budget / 2.0 ** 20, self.chunk_size))
+
     def _execute_run(self, program_state):
-        self._started = dt.now()
+        self._started = self._aligned_now() if self.sharded else dt.now()
+        reset_peak_rss()
         successful_preparation_phase = True
+        if self._recorder is not None:
+            self._recorder.start_poll(self._started, self._poll_interval)
         try:
             self._prepare_queries()
         except RequestException as e:
             print "Some requests failed. In particular: ", e.query.url
             successful_preparation_phase = False
-            self._completed = dt.now()
+            _poll_failures.inc()
+        if self._recorder is not None:
+            self._recorder.end_poll(self._started, successful_preparation_phase)
         program_state.healthy = successful_preparation_phase
         if successful_preparation_phase:
-            self._execute_queries()
-            self._post_processing()
-            self._save_timestamp()
-
-    def observe(self, single, poll_interval, program_state):
-        if single:
-            self._execute_run(program_state)
-        else:
-            self._poll_interval = poll_interval
-            while True:
+            self._ingest()
+            _poll_duration.observe((dt.now() - self._started).total_seconds())
+        self._check_memory()
+        self._completed = dt.now()
+
+    def replay_run(self, started, interval, queries):
+        self._started = started
+        self._poll_interval = interval
+        self._due = queries
+        self._ingest()
+
+    def _ingest(self):
+        self._execute_queries()
+        if self._is_topology_run():
+            if self._pipeline is None:
+                self._complete_run(self._started)
+            else:
+                # Barrier, so it sees all samples of this run
+                self._pipeline.complete(self._started, self._complete_run, self._started)
+
+    def close(self):
+        if self._pipeline is not None:
+            self._pipeline.close()
+
+    def observe(self, single, poll_interval, program_state, poll_intervals=None):
+        self.configure(poll_interval, poll_intervals)
+        if self._pipeline is not None:
+            self._pipeline.start()
+        try:
+            if single:
+                self._due = list(self._queries)
                 self._execute_run(program_state)
-                self.wait_for_next_run()
\ No newline at end of file
+            else:
+                start = monotonic()
+                if self.sharded:
+                    start += self._poll_interval - time.time() % self._poll_interval
+                self._next_due = {query: start for query in self._queries}
+                if self.sharded:
+                    self.wait_for_next_run()
+                while True:
+                    self._due = self._select_due()
+                    self._execute_run(program_state)
+                    self._reschedule()
+                    self.wait_for_next_run()
+        finally:
+            # Writes everything that was polled before exiting
+            self.close()
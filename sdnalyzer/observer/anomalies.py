@@ -0,0 +1,138 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Saarland University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# Contributor(s): Andreas Schmidt (Saarland University)
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# 
+# This license applies to all parts of SDNalytics that are not externally
+# maintained libraries.
+
+import logging
+import math
+from collections import deque
+from threading import Lock
+
+import sdnalyzer.monitoring as monitoring
+import sdnalyzer.store as store
+
+# Smallest standard deviation assumed per kind of metric, so that a link with constant values (e.g. no loss) is not
+# flagged for a negligible change
+MINIMUM_DEVIATION = {
+    "packet_loss": 0.01,
+    "data_rate": 1e6,  # bit/s
+    "delay": 1.0
+}
+METRICS = {
+    "src_packet_loss": "packet_loss",
+    "dst_packet_loss": "packet_loss",
+    "src_transmit_data_rate": "data_rate",
+    "src_receive_data_rate": "data_rate",
+    "dst_transmit_data_rate": "data_rate",
+    "dst_receive_data_rate": "data_rate",
+    "src_delay": "delay",
+    "dst_delay": "delay"
+}
+SOURCES = ("LinksQuery", "DevicesQuery", "DelayQuery")
+
+_anomalies = monitoring.registry.counter("sdnalytics_link_anomalies_total",
+                                         "Link metrics that deviated from their moving average.", ["metric"])
+
+
+class Ewma(object):
+    # Exponentially weighted moving mean and variance of a metric
+    __slots__ = ["mean", "variance", "count"]
+
+    def __init__(self):
+        self.mean = None
+        self.variance = 0.0
+        self.count = 0
+
+    def update(self, value, alpha):
+        if self.mean is None:
+            self.mean = value
+        else:
+            difference = value - self.mean
+            self.mean += alpha * difference
+            self.variance = (1 - alpha) * (self.variance + alpha * difference ** 2)
+        self.count += 1
+
+
+class LinkAnomalyDetector(object):
+    # Query listener collecting the link metrics of a poll and post process comparing them with the moving averages of
+    # their link, so the samples are not read back from the store. A value more than threshold moving standard
+    # deviations away from the moving average is stored as LinkAnomaly once warmup values of the metric were seen.
+    def __init__(self, alpha=0.1, threshold=4.0, warmup=10, recent=1000):
+        self.alpha = alpha
+        self.threshold = threshold
+        self.warmup = warmup
+        self._averages = {}  # (link id, metric) -> Ewma
+        self._pending = {}  # link id -> {metric: value} of the current poll
+        # Read by the API thread while the post process appends to it
+        self._recent = deque(maxlen=recent)
+        self._recent_lock = Lock()
+
+    def __call__(self, query, now, records):
+        if query not in SOURCES:
+            return
+        for link_id, record in records.iteritems():
+            values = self._pending.setdefault(link_id, {})
+            for metric in METRICS:
+                if record.get(metric) is not None:
+                    values[metric] = float(record[metric])
+
+    def execute(self, now):
+        pending = self._pending
+        self._pending = {}
+        anomalies = []
+        for link_id, values in pending.iteritems():
+            for metric, value in values.iteritems():
+                average = self._averages.get((link_id, metric))
+                if average is None:
+                    average = self._averages[(link_id, metric)] = Ewma()
+                if average.count >= self.warmup:
+                    deviation = (value - average.mean) / max(math.sqrt(average.variance),
+                                                             MINIMUM_DEVIATION[METRICS[metric]])
+                    if abs(deviation) > self.threshold:
+                        anomalies.append({"link_id": link_id, "detected": now, "metric": metric, "value": value,
+                                          "expected": average.mean, "deviation": deviation})
+                average.update(value, self.alpha)
+
+        if len(anomalies) == 0:
+            return
+        for anomaly in anomalies:
+            _anomalies.inc(metric=anomaly["metric"])
+        with self._recent_lock:
+            self._recent.extend(anomalies)
+        session = store.get_session()
+        try:
+            session.execute(store.LinkAnomaly.__table__.insert(), anomalies)
+            session.commit()
+        except Exception:
+            session.rollback()
+            logging.exception("Writing {} link anomalies failed.".format(len(anomalies)))
+        finally:
+            session.close()
+
+    def recent(self, since=None):
+        # Anomalies detected by this process, newest first
+        with self._recent_lock:
+            recent = list(self._recent)
+        return [a for a in reversed(recent) if since is None or a["detected"] > since]
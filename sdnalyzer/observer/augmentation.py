@@ -25,7 +25,6 @@
 # This license applies to all parts of SDNalytics that are not externally
 # maintained libraries.
 
-import graph_tool.centrality as gt
 import sdnalyzer.store as store
 from sdnalyzer.topology import NetworkTopology
 
@@ -33,6 +32,9 @@ from sdnalyzer.topology import NetworkTopology
 class CentralityAugmentation(object):
     @staticmethod
     def execute(now):
+        # graph_tool takes seconds to import, so it is only loaded once the first post process runs
+        import graph_tool.centrality as gt
+
         session = store.get_session()
 
         topology = NetworkTopology(session, now)
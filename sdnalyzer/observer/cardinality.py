@@ -0,0 +1,125 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Saarland University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# Contributor(s): Andreas Schmidt (Saarland University)
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# 
+# This license applies to all parts of SDNalytics that are not externally
+# maintained libraries.
+
+import logging
+from datetime import timedelta
+
+import sdnalyzer.store as store
+from sdnalyzer.observer.counters import ByteDeltas
+from sdnalyzer.sketches import HyperLogLog, CountMinSketch
+
+PROTOCOLS = {6: "tcp", 17: "udp"}
+
+
+def service(record):
+    # (service, provider is the destination) of a flow, the provider being the end with the smaller transport port
+    protocol = int(record["network_protocol"] or 0)
+    source = int(record["transport_source"] or 0)
+    destination = int(record["transport_destination"] or 0)
+    if protocol not in PROTOCOLS or source == 0 or destination == 0:
+        return None, None
+    provider_is_destination = destination < source
+    port = destination if provider_is_destination else source
+    return "{}/{}".format(PROTOCOLS[protocol], port), provider_is_destination
+
+
+class CardinalityTracker(object):
+    # Query listener maintaining the sketches of sketches.SKETCH_TYPES from the flows of every poll. As post process,
+    # it writes them to the store once they cover a bucket; listeners run outside the transaction of the query.
+    def __init__(self, bucket=3600, precision=10, width=1024, depth=4):
+        self.bucket = timedelta(seconds=bucket)
+        self.precision = precision
+        self.width = width
+        self.depth = depth
+        self._deltas = ByteDeltas()
+        self._start = None
+        self._last = None
+        self._reset()
+
+    def _reset(self):
+        self._counters = {"peers": {}, "clients": {}, "flows": {}}
+        self._usage = CountMinSketch(self.width, self.depth)
+
+    def _counter(self, name, subject):
+        counters = self._counters[name]
+        if subject not in counters:
+            counters[subject] = HyperLogLog(self.precision)
+        return counters[subject]
+
+    def __call__(self, query, now, records):
+        if query != "SwitchStatFlowQuery":
+            return
+        if self._start is None:
+            self._start = now
+
+        deltas = self._deltas.update(records)
+        for flow_id, record in records.iteritems():
+            self._counter("flows", record["node_id"]).add(flow_id)
+            source = record["data_layer_source"]
+            destination = record["data_layer_destination"]
+            if source != "" and destination != "":
+                self._counter("peers", source).add(destination)
+                self._counter("peers", destination).add(source)
+
+            delta = deltas.get(flow_id, 0)
+            name, provider_is_destination = service(record)
+            if name is None:
+                continue
+            client = record["network_source"] if provider_is_destination else record["network_destination"]
+            self._counter("clients", name).add(client)
+            if delta > 0:
+                consumer, provider = (source, destination) if provider_is_destination else (destination, source)
+                self._usage.add("{} consumes {}".format(consumer, name), delta)
+                self._usage.add("{} provides {}".format(provider, name), delta)
+        self._last = now
+
+    def execute(self, now):
+        if self._last is not None and self._last - self._start >= self.bucket:
+            self._persist()
+            self._start = self._last
+            self._reset()
+
+    def _persist(self):
+        session = store.get_session()
+        try:
+            switches = dict(session.query(store.Node.id, store.Node.device_id).filter(
+                store.Node.id.in_(self._counters["flows"].keys())).all()) if len(self._counters["flows"]) > 0 else {}
+            sketches = [("usage", None, self._usage)]
+            for name, counters in self._counters.iteritems():
+                for subject, sketch in counters.iteritems():
+                    if name == "flows":
+                        subject = switches.get(subject, str(subject))
+                    sketches.append((name, subject, sketch))
+            for name, subject, sketch in sketches:
+                session.add(store.Sketch(name=name, subject=subject, bucket_start=self._start,
+                                         bucket_end=self._last, data=sketch.to_bytes()))
+            session.commit()
+        except Exception:
+            session.rollback()
+            logging.exception("Writing the sketches failed.")
+        finally:
+            session.close()
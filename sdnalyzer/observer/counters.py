@@ -0,0 +1,47 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Saarland University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# Contributor(s): Andreas Schmidt (Saarland University)
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# 
+# This license applies to all parts of SDNalytics that are not externally
+# maintained libraries.
+
+
+class ByteDeltas(object):
+    # Bytes each flow transferred since the previous poll, from the byte counters of consecutive flow polls. The
+    # counters of the first poll cover an unknown time, they are only the baseline and yield no deltas.
+    def __init__(self):
+        self._bytes = None  # byte count per flow id in the last poll
+
+    def update(self, records):
+        deltas = {}
+        byte_counts = {}
+        for flow_id, record in records.iteritems():
+            byte_count = int(record["byte_count"])
+            byte_counts[flow_id] = byte_count
+            if self._bytes is None:
+                continue
+            previous = self._bytes.get(flow_id)
+            # A flow that appeared or was reinstalled since the previous poll transferred all of its bytes since then
+            deltas[flow_id] = byte_count - previous if previous is not None and byte_count >= previous else byte_count
+        self._bytes = byte_counts
+        return deltas
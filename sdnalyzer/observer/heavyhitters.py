@@ -0,0 +1,83 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Saarland University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# Contributor(s): Andreas Schmidt (Saarland University)
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# 
+# This license applies to all parts of SDNalytics that are not externally
+# maintained libraries.
+
+import logging
+from datetime import timedelta
+
+import sdnalyzer.store as store
+from sdnalyzer.observer.counters import ByteDeltas
+from sdnalyzer.sketches import SpaceSaving
+
+
+class HeavyHitterTracker(object):
+    # Query listener summarizing the bytes each flow transferred since the previous poll per switch and for the
+    # fabric. Only the k largest flows are kept per summary. As post process, it writes the summaries to the store
+    # once they cover the interval; listeners run outside the transaction of the query.
+    def __init__(self, k=100, interval=300):
+        self.k = k
+        self.interval = timedelta(seconds=interval)
+        self._deltas = ByteDeltas()
+        self._start = None
+        self._last = None
+        self._switches = {}
+        self._fabric = SpaceSaving(k)
+
+    def __call__(self, query, now, records):
+        if query != "SwitchStatFlowQuery":
+            return
+        if self._start is None:
+            self._start = now
+
+        for flow_id, delta in self._deltas.update(records).iteritems():
+            record = records[flow_id]
+            if record["node_id"] not in self._switches:
+                self._switches[record["node_id"]] = SpaceSaving(self.k)
+            self._switches[record["node_id"]].add(flow_id, delta)
+            self._fabric.add(flow_id, delta)
+        self._last = now
+
+    def execute(self, now):
+        if self._last is not None and self._last - self._start >= self.interval:
+            self._persist()
+            self._start = self._last
+
+    def _persist(self):
+        session = store.get_session()
+        try:
+            summaries = [(node_id, summary) for node_id, summary in self._switches.iteritems()]
+            summaries.append((None, self._fabric))
+            for node_id, summary in summaries:
+                session.add(store.HeavyHitterSummary(interval_start=self._start, interval_end=self._last,
+                                                     node_id=node_id, content=summary.to_json()))
+            session.commit()
+        except Exception:
+            session.rollback()
+            logging.exception("Writing the heavy hitter summaries failed.")
+        finally:
+            session.close()
+        self._switches = {}
+        self._fabric = SpaceSaving(self.k)
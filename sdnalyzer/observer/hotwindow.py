@@ -0,0 +1,117 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Saarland University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# Contributor(s): Andreas Schmidt (Saarland University)
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# 
+# This license applies to all parts of SDNalytics that are not externally
+# maintained libraries.
+
+import logging
+import time
+
+import sdnalyzer.monitoring as monitoring
+from sdnalyzer.ringbuffer import RingBuffer, SlotMap, metric_path, slots_path
+
+PORT_METRICS = ["transmit_bytes", "receive_bytes", "transmit_packets", "receive_packets", "transmit_dropped",
+                "receive_dropped", "transmit_errors", "receive_errors"]
+LINK_METRICS = ["src_transmit_data_rate", "src_receive_data_rate", "dst_transmit_data_rate", "dst_receive_data_rate",
+                "src_packet_loss", "dst_packet_loss"]
+
+# Ring buffers written per query; a metric "port_transmit_bytes" holds the transmit_bytes of every port, in the column
+# assigned to the port id by the slot map "port" (see SlotMap).
+SOURCES = {
+    "SwitchStatPortQuery": ("port_", PORT_METRICS),
+    "LinksQuery": ("link_", LINK_METRICS),
+    "DevicesQuery": ("link_", LINK_METRICS)
+}
+
+_ids_dropped = monitoring.registry.counter("sdnalytics_hot_window_ids_dropped_total",
+                                           "Values not written to a ring buffer because all its columns are taken.",
+                                           ["metric"])
+_ids_retired = monitoring.registry.counter("sdnalytics_hot_window_ids_retired_total",
+                                           "Ports and links whose ring buffer columns were released.", ["kind"])
+
+
+class HotWindowWriter(object):
+    # Query listener writing the port counters and link metrics of every poll to ring buffers. Ports and links get a
+    # column when they are first reported and release it once they were not reported during the whole window of the
+    # ring buffers, e.g. as they were removed from the network.
+    def __init__(self, directory, slots=120, ports=4096, links=4096):
+        self.rings = {}
+        for metric in PORT_METRICS:
+            self.rings["port_" + metric] = RingBuffer(metric_path(directory, "port_" + metric), slots, ports, True)
+        for metric in LINK_METRICS:
+            self.rings["link_" + metric] = RingBuffer(metric_path(directory, "link_" + metric), slots, links, True)
+
+        self.slot_maps = {}
+        self._reported = {}  # prefix -> {id: time it was last reported}
+        started = time.time()
+        for prefix, metrics in dict(SOURCES.values()).iteritems():
+            capacity = self.rings[prefix + metrics[0]].capacity
+            self.slot_maps[prefix] = SlotMap(slots_path(directory, prefix[:-1]), capacity)
+            # Ids assigned before a restart are retired unless they are reported again within the window
+            self._reported[prefix] = dict((i, started) for i in self.slot_maps[prefix].slots)
+
+    def _retire(self, prefix, metrics):
+        # Releases the columns of ids that have no values left in the window
+        timestamps, _ = self.rings[prefix + metrics[0]].last()
+        if len(timestamps) < self.rings[prefix + metrics[0]].slots:
+            return False
+        reported = self._reported[prefix]
+        retired = [i for i, t in reported.iteritems() if t < timestamps[0]]
+        if len(retired) == 0:
+            return False
+        for i in retired:
+            del reported[i]
+        released = self.slot_maps[prefix].release(retired)
+        for metric in metrics:
+            self.rings[prefix + metric].clear(released)
+        _ids_retired.inc(len(retired), kind=prefix[:-1])
+        return True
+
+    def __call__(self, query, now, records):
+        if query not in SOURCES:
+            return
+        prefix, metrics = SOURCES[query]
+        timestamp = time.mktime(now.timetuple()) + now.microsecond / 1e6
+        slot_map = self.slot_maps[prefix]
+        changed = self._retire(prefix, metrics)
+        assigned = len(slot_map.slots)
+        slots, dropped = slot_map.assign(records.keys())
+        changed = changed or len(slot_map.slots) != assigned
+        for i in slots:
+            self._reported[prefix][i] = timestamp
+        if len(dropped) > 0:
+            logging.warning("All {} columns of the {} ring buffers are taken, dropping {} ids.".format(
+                slot_map.capacity, prefix[:-1], len(dropped)))
+        # Saved before the values are written, so readers never attribute the values of a new id to a retired one
+        if changed:
+            slot_map.save()
+
+        for metric in metrics:
+            name = prefix + metric
+            values = dict((slots[i], float(r[metric]) if r[metric] is not None else None)
+                          for i, r in records.iteritems() if i in slots)
+            self.rings[name].update(timestamp, values)
+            if len(dropped) > 0:
+                _ids_dropped.inc(len(dropped), metric=name)
+            self.rings[name].flush()
@@ -0,0 +1,174 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Saarland University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# Contributor(s): Andreas Schmidt (Saarland University)
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# 
+# This license applies to all parts of SDNalytics that are not externally
+# maintained libraries.
+
+import logging
+import time
+from Queue import Queue, Empty
+from threading import Thread
+
+import sdnalyzer.monitoring as monitoring
+import sdnalyzer.store as store
+
+
+_queue_depth = monitoring.registry.gauge("sdnalytics_pipeline_queue_depth",
+                                         "Responses and barriers waiting for the writer.")
+_backpressure = monitoring.registry.counter("sdnalytics_pipeline_backpressure_seconds_total",
+                                            "Time the poller was blocked because the queue was full.")
+_batch_size = monitoring.registry.histogram("sdnalytics_pipeline_batch_size",
+                                            "Responses written per transaction.",
+                                            buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+_write_duration = monitoring.registry.histogram("sdnalytics_pipeline_write_seconds",
+                                                "Duration of a batched write transaction.")
+_write_failures = monitoring.registry.counter("sdnalytics_pipeline_write_failures_total",
+                                              "Batches that were rolled back due to an error.")
+_failed_runs = monitoring.registry.counter("sdnalytics_pipeline_failed_runs_total",
+                                           "Runs whose responses could not be written, even when retried.")
+
+_PROCESS = "process"
+_CALL = "call"
+_STOP = "stop"
+
+
+class IngestionPipeline(object):
+    # Decouples polling from the database: the poller submits parsed responses to a bounded queue, which a writer
+    # thread drains in batched transactions. There is deliberately a single writer, as the queries depend on the rows
+    # of their predecessors (ports need switches, links need ports, ...) and the dedup caches of the queries are not
+    # synchronized. A full queue blocks the poller, so memory stays bounded if the database is down for long.
+    def __init__(self, queue_size=32, batch_size=8):
+        self.batch_size = batch_size
+        self._queue = Queue(maxsize=queue_size)
+        self._writer = None
+        # Poll times of the runs with a batch that failed twice; their completion barriers are skipped
+        self._failed = set()
+
+    def start(self):
+        self._writer = Thread(target=self._drain, name="IngestionWriter")
+        self._writer.daemon = True
+        self._writer.start()
+
+    def submit(self, query, now, data, source):
+        # source is what query.parse needs to rebuild data for a retry
+        self._put((_PROCESS, query, now, data, source))
+
+    def call(self, function, *args):
+        # Runs the function on the writer thread after all previously submitted responses are committed
+        self._put((_CALL, function, args, None))
+
+    def complete(self, now, function, *args):
+        # Like call, but skipped if a response of the run polled at now could not be written
+        self._put((_CALL, function, args, now))
+
+    def close(self, timeout=None):
+        # Flushes all pending items before returning
+        if self._writer is None:
+            return
+        self._put((_STOP,))
+        self._writer.join(timeout)
+        if self._writer.is_alive():
+            logging.warning("Ingestion writer did not finish within {} seconds, {} items pending.".format(
+                timeout, self._queue.qsize()))
+        self._writer = None
+
+    def _put(self, item):
+        if self._queue.full():
+            start = time.time()
+            self._queue.put(item)
+            _backpressure.inc(time.time() - start)
+        else:
+            self._queue.put(item)
+        _queue_depth.set(self._queue.qsize())
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        while batch[-1][0] == _PROCESS and len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except Empty:
+                break
+        _queue_depth.set(self._queue.qsize())
+        return batch
+
+    def _drain(self):
+        running = True
+        while running:
+            batch = self._next_batch()
+            responses = filter(lambda item: item[0] == _PROCESS, batch)
+            if len(responses) > 0:
+                self._write(responses)
+
+            # Barriers and the stop marker can only be the last item of a batch
+            last = batch[-1]
+            if last[0] == _CALL:
+                if last[3] is not None and self._completes_failed_run(last[3]):
+                    logging.warning("Skipping {} of the run at {}, its samples are incomplete.".format(
+                        last[1].__name__, last[3]))
+                    continue
+                try:
+                    last[1](*last[2])
+                except Exception:
+                    logging.exception("Pipeline call {} failed.".format(last[1].__name__))
+            elif last[0] == _STOP:
+                running = False
+
+    def _completes_failed_run(self, now):
+        # Runs complete in order, so failures of earlier runs are no longer needed
+        failed = now in self._failed
+        self._failed = set(run for run in self._failed if run > now)
+        return failed
+
+    def _write(self, responses):
+        if self._write_batch(responses):
+            return
+        # Processing consumed the responses, the retry parses them again from their raw bodies
+        logging.warning("Retrying the batch of {} responses.".format(len(responses)))
+        responses = [(_PROCESS, query, now, query.parse(source), source) for _, query, now, _, source in responses]
+        if not self._write_batch(responses):
+            runs = set(now for _, _, now, _, _ in responses)
+            _failed_runs.inc(len(runs - self._failed))
+            self._failed.update(runs)
+
+    @staticmethod
+    def _write_batch(responses):
+        session = store.get_session()
+        start = time.time()
+        try:
+            processed = [(query, now, query.process(session, now, data)) for _, query, now, data, _ in responses]
+            session.commit()
+            for query, now, records in processed:
+                query.notify(now, records)
+            return True
+        except Exception:
+            session.rollback()
+            for _, query, _, _, _ in responses:
+                query.forget()
+            _write_failures.inc()
+            logging.exception("Writing a batch of {} responses failed.".format(len(responses)))
+            return False
+        finally:
+            session.close()
+            _write_duration.observe(time.time() - start)
+            _batch_size.observe(len(responses))
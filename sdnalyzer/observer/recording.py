@@ -0,0 +1,141 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Saarland University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# Contributor(s): Andreas Schmidt (Saarland University)
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# 
+# This license applies to all parts of SDNalytics that are not externally
+# maintained libraries.
+
+import gzip
+import json
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime as dt
+from threading import Lock
+
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+
+
+class ResponseRecorder(object):
+    # Responses are tagged with the start of the poll that requested them, as a slow request can finish after the next
+    # poll started. end_poll writes a marker line telling replays whether all requests of the poll succeeded.
+    def __init__(self, directory):
+        self.directory = directory
+        self._file = None
+        self._day = None
+        self._intervals = {}  # poll start -> interval of the polls that did not end yet
+        self._lock = Lock()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def _open(self, started):
+        # One log per day, so closed days can be moved away while the observer is running.
+        if self._day != started.date():
+            self.close()
+            self._day = started.date()
+            path = os.path.join(self.directory, "responses-{:%Y%m%d-%H%M%S}.jsonl.gz".format(started))
+            self._file = gzip.open(path, "ab")
+
+    def start_poll(self, started, interval):
+        with self._lock:
+            self._open(started)
+            self._intervals[started] = interval
+
+    def record(self, query, url, body, started):
+        with self._lock:
+            if started not in self._intervals:
+                # The poll already ended, e.g. the request timed out
+                return
+            self._file.write(json.dumps({
+                "started": started.strftime(TIMESTAMP_FORMAT),
+                "interval": self._intervals[started],
+                "query": query,
+                "url": url,
+                "body": body
+            }) + "\n")
+
+    def end_poll(self, started, complete):
+        with self._lock:
+            if self._intervals.pop(started, None) is not None and self._file is not None:
+                self._file.write(json.dumps({
+                    "started": started.strftime(TIMESTAMP_FORMAT),
+                    "complete": complete
+                }) + "\n")
+                self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_polls(paths):
+    # Yields (started, interval, {query name: [responses]}) per complete recorded poll in the order in which the polls
+    # ended; there is one response per controller. Polls with a failed request are dropped. Polls of logs written
+    # before polls were marked as complete are yielded at the end in the order of the logs.
+    polls = OrderedDict()  # started -> (interval, responses)
+    ended = set()
+    for path in paths:
+        with gzip.open(path, "rb") as f:
+            for line in f:
+                record = json.loads(line)
+                started = dt.strptime(record["started"], TIMESTAMP_FORMAT)
+                if "complete" in record:
+                    ended.add(started)
+                    poll = polls.pop(started, None)
+                    if record["complete"] and poll is not None:
+                        yield (started,) + poll
+                elif started not in ended:
+                    if started not in polls:
+                        polls[started] = (record["interval"], {})
+                    polls[started][1].setdefault(record["query"], []).append(record["body"])
+    for started, poll in polls.iteritems():
+        yield (started,) + poll
+
+
+class ReplayDriver(object):
+    def __init__(self, observer):
+        self.observer = observer
+
+    def replay(self, paths):
+        polls = 0
+        skipped = 0
+        size = 0
+        start = time.time()
+        for started, interval, responses in read_polls(paths):
+            queries = [q for q in self.observer.queries if q.name in responses]
+            if len(queries) == 0:
+                skipped += 1
+                continue
+
+            for query in queries:
+                query.load(responses[query.name])
+                size += sum(len(body) for body in responses[query.name])
+
+            self.observer.replay_run(started, interval, queries)
+            polls += 1
+
+        duration = time.time() - start
+        print "Replayed {} polls ({} skipped, {:.1f} MB) in {:.1f} seconds: {:.2f} polls/s, {:.2f} MB/s.".format(
+            polls, skipped, size / 2.0 ** 20, duration, polls / max(duration, 1e-9), size / 2.0 ** 20 / max(duration, 1e-9))
+        return polls
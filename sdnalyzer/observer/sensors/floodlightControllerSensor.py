@@ -25,13 +25,19 @@
 # This license applies to all parts of SDNalytics that are not externally
 # maintained libraries.
 
-from datetime import datetime as dt
+from datetime import datetime as dt, timedelta
 import json
 import logging
+import time
 import requests
+from threading import Thread
+import sdnalyzer.monitoring as monitoring
 import sdnalyzer.store as store
-from sqlalchemy import desc
-from sdnalyzer.store import Node, NodeSample, InternetAddress, Port, Link, LinkSample, PortSample, Flow, FlowSample
+from sqlalchemy import and_, bindparam, desc, event, func, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+from sdnalyzer.store import internet_address_association, Node, NodeSample, InternetAddress, Port, Link, LinkSample, PortSample, Flow, FlowSample, \
+    FlowLifetime
 
 
 def _print_json(obj):
@@ -43,39 +49,314 @@ def _output_json(obj):
         f.write(json.dumps(obj, sort_keys=True, indent=4))
 
 
+_request_duration = monitoring.registry.histogram("sdnalytics_query_request_seconds",
+                                                  "Latency of the controller HTTP request per query.", ["query"])
+_response_size = monitoring.registry.histogram("sdnalytics_query_response_bytes",
+                                               "Size of the controller response per query.", ["query"],
+                                               buckets=monitoring.BYTE_BUCKETS)
+_process_duration = monitoring.registry.histogram("sdnalytics_query_process_seconds",
+                                                  "Time spent in _process per query.", ["query"])
+_rows_inserted = monitoring.registry.counter("sdnalytics_query_rows_inserted_total",
+                                             "Rows inserted into the store per query.", ["query"])
+_rows_updated = monitoring.registry.counter("sdnalytics_query_rows_updated_total",
+                                            "Rows updated in the store per query.", ["query"])
+_samples_skipped = monitoring.registry.counter("sdnalytics_query_samples_skipped_total",
+                                              "Unchanged samples or descriptors that were not written.", ["query"])
+_flows_started = monitoring.registry.counter("sdnalytics_flows_started_total",
+                                             "Flows that appeared in the flow table of a switch.")
+_flows_ended = monitoring.registry.counter("sdnalytics_flows_ended_total",
+                                           "Flows that vanished from the flow table of a switch.")
+
+# Maximum number of values in an IN clause
+IN_CLAUSE_SIZE = 1000
+
+
+def _chunks(values):
+    values = list(values)
+    for i in range(0, len(values), IN_CLAUSE_SIZE):
+        yield values[i:i + IN_CLAUSE_SIZE]
+
+
+class _CarriedSample(object):
+    # Port counters of the newest sample carried forward to a later poll that reported the same values
+    def __init__(self, sample, sampled):
+        self.sampled = sampled
+        self.transmit_bytes = sample.transmit_bytes
+        self.receive_bytes = sample.receive_bytes
+        self.transmit_packets = sample.transmit_packets
+        self.receive_packets = sample.receive_packets
+
+
+class _PortCounters(object):
+    # Counters of the newest stored sample of a port and the last poll that reported them, see SwitchStatPortQuery
+    def __init__(self, counters, record, stored):
+        self.counters = counters
+        self.record = record
+        self.stored = stored
+        self.polled = stored
+
+
+class _ActiveFlow(object):
+    # Flow installed on a switch in the last poll, see SwitchStatFlowQuery.lifecycle
+    def __init__(self, flow_id, values, last_seen, sampled):
+        self.flow_id = flow_id
+        self.values = values
+        self.last_seen = last_seen
+        self.sampled = sampled
+
+
 class JsonQuery(object):
-    def __init__(self, poll_interval, controller_url, api_port):
-        self.base_url = controller_url
-        self.base_port = api_port
+    # Name of the query whose samples this query annotates; it is then always executed together with that query.
+    follows = None
+
+    def __init__(self, poll_interval, controllers):
+        # (host, port) of the REST API of every controller polled by this query; their responses are merged
+        self.controllers = controllers
         self.url = ""
         self.poll_interval = poll_interval
         self._poll_result = {}
+        # Raw response bodies and shard switches the result was parsed from, see source
+        self._bodies = None
+        self._switches = None
         self.success = False
-
-    def _get_url(self):
-        return "http://" + self.base_url + ":" + str(self.base_port) + "/wm/" + self.url
-
-    def prepare(self):
-        self.success = False
-        url = self._get_url()
+        self.recorder = None
+        self.dedup = False
+        # Called with (query name, poll time, {id: {column: value}}) for the samples of a poll, see _process
+        self.listeners = []
+        # Other observer processes write into the same store
+        self.concurrent_writers = False
+        # Switches whose statistics are processed between two flushes; None processes the whole response at once
+        self.chunk_size = None
+
+    @property
+    def name(self):
+        return type(self).__name__
+
+    def _get_url(self, controller):
+        host, port = controller
+        return "http://" + host + ":" + str(port) + "/wm/" + self.url
+
+    def _fetch(self, controller, responses, bodies, index, started):
+        url = self._get_url(controller)
         try:
+            start = time.time()
             req = requests.get(url)
-            self._poll_result = req.json()
+            _request_duration.observe(time.time() - start, query=self.name)
+            _response_size.observe(len(req.content), query=self.name)
+            responses[index] = req.json()
+            bodies[index] = req.content
         except requests.ConnectionError as e:
             logging.warning("Requesting failed.")
             logging.warning(e)
             return
 
+        if self.recorder is not None:
+            self.recorder.record(self.name, url, req.text, started)
+
+    def prepare(self, started=None):
+        # started identifies the poll in the recording
+        self.success = False
+        responses = [None] * len(self.controllers)
+        bodies = [None] * len(self.controllers)
+        if len(self.controllers) == 1:
+            self._fetch(self.controllers[0], responses, bodies, 0, started)
+        else:
+            threads = []
+            for i in range(len(self.controllers)):
+                thread = Thread(target=self._fetch, args=(self.controllers[i], responses, bodies, i, started))
+                thread.daemon = True
+                threads.append(thread)
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        if None in responses:
+            return
+        self._poll_result = self.merge(responses)
+        self._bodies = bodies
+        self._switches = None
         self.success = True
 
+    def load(self, bodies):
+        self._poll_result = self.merge([json.loads(body) for body in bodies])
+        self._bodies = bodies
+        self._switches = None
+        self.success = True
+
+    def merge(self, responses):
+        # Combines the responses of several controllers into the response of a single one
+        if len(responses) == 1:
+            return responses[0]
+        if isinstance(responses[0], dict):
+            merged = {}
+            for response in reversed(responses):
+                merged.update(response)
+            return merged
+        return [entry for response in responses for entry in response]
+
+    @staticmethod
+    def _unique(entries, key):
+        # Keeps the first entry per key
+        seen = set()
+        unique = []
+        for entry in entries:
+            k = key(entry)
+            if k not in seen:
+                seen.add(k)
+                unique.append(entry)
+        return unique
+
+    def restrict(self, switches):
+        # Drops the parts of the result that another observer process records (see Observer.shard)
+        self._poll_result = self._restrict(self._poll_result, switches)
+        self._switches = switches
+
+    def _restrict(self, result, switches):
+        return result
+
+    @property
+    def result(self):
+        return self._poll_result
+
+    def take(self):
+        # Hands over the result, so the query does not keep the response alive until its next poll
+        result = self._poll_result
+        self._poll_result = None
+        self._bodies = None
+        return result
+
+    def source(self):
+        # What parse needs to rebuild the result of the last poll; call before take
+        return self._bodies, self._switches
+
+    def parse(self, source):
+        # Rebuilds a result from its source without touching the current poll, as processing consumes the result
+        bodies, switches = source
+        result = self.merge([json.loads(body) for body in bodies])
+        return result if switches is None else self._restrict(result, switches)
+
     def execute(self, now):
         session = store.get_session()
-        self._process(session, now, self._poll_result)
+        records = self.process(session, now, self.take())
         session.commit()
+        self.notify(now, records)
+
+    def process(self, session, now, data):
+        # Writes the samples of a response into the session and flushes them without committing, so that several
+        # responses can share one transaction. Returns the records to notify the listeners of once it is committed.
+        changes = {"inserted": 0, "updated": 0}
+
+        def after_flush(s, flush_context):
+            changes["inserted"] += len(s.new)
+            changes["updated"] += len(filter(lambda o: s.is_modified(o), s.dirty))
+
+        event.listen(session, "after_flush", after_flush)
+        try:
+            with _process_duration.time(query=self.name):
+                records = self._process(session, now, data)
+                session.flush()
+        finally:
+            event.remove(session, "after_flush", after_flush)
+        _rows_inserted.inc(changes["inserted"], query=self.name)
+        _rows_updated.inc(changes["updated"], query=self.name)
+        return records
+
+    def notify(self, now, records):
+        # Listeners keep state across polls (byte count baselines, moving averages, ring buffer rows), so they only
+        # see the samples of committed transactions
+        if records is None:
+            return
+        for listener in self.listeners:
+            try:
+                listener(self.name, now, records)
+            except Exception:
+                logging.exception("Listener of {} failed.".format(self.name))
+
+    def forget(self):
+        # Drops state that describes rows of a transaction that was rolled back
+        pass
 
     def _process(self, session, now, data):
+        # Queries producing port or link samples return their values by port or link id for the listeners
         raise NotImplementedError("Cannot call this on abstract super class.")
 
+    def _switch_chunks(self, session, data):
+        # Yields the (device id, statistics) of a response keyed by switch, chunk_size switches at a time. Consumed
+        # entries are removed from the response and the samples of a chunk are flushed and expunged before the next
+        # one, so neither the response nor the session grows with the number of switches.
+        device_ids = list(data.keys())
+        size = self.chunk_size or max(len(device_ids), 1)
+        for i in range(0, len(device_ids), size):
+            yield [(device_id, data.pop(device_id)) for device_id in device_ids[i:i + size]]
+            session.flush()
+            for sample in filter(lambda o: isinstance(o, (PortSample, FlowSample, FlowLifetime)), list(session)):
+                session.expunge(sample)
+
+    @staticmethod
+    def _resolve_ids(session, model, column, keys):
+        # Maps each key to the id of the first row with that value
+        ids = {}
+        for chunk in _chunks(keys):
+            for key, row_id in session.query(column, model.id).filter(column.in_(chunk)).order_by(desc(model.id)):
+                ids[key] = row_id
+        return ids
+
+    @staticmethod
+    def _get_or_create(session, model, column, keys, make_row, concurrent=False):
+        ids = JsonQuery._resolve_ids(session, model, column, keys)
+        missing = set(keys) - set(ids.keys())
+        if len(missing) > 0:
+            if concurrent:
+                JsonQuery._insert_ignoring_conflicts(session, model.__table__, [make_row(key) for key in missing])
+            else:
+                session.execute(model.__table__.insert(), [make_row(key) for key in missing])
+            ids.update(JsonQuery._resolve_ids(session, model, column, missing))
+        return ids
+
+    @staticmethod
+    def _insert_ignoring_conflicts(session, table, rows):
+        # Rows inserted by another observer process in the meantime are skipped
+        if session.bind.dialect.name == "sqlite":
+            # pysqlite breaks savepoints, but SQLite can skip conflicting rows itself
+            session.execute(table.insert().prefix_with("OR IGNORE"), rows)
+            return
+        savepoint = session.begin_nested()
+        try:
+            session.execute(table.insert(), rows)
+            savepoint.commit()
+        except IntegrityError:
+            savepoint.rollback()
+            for row in rows:
+                savepoint = session.begin_nested()
+                try:
+                    session.execute(table.insert(), [row])
+                    savepoint.commit()
+                except IntegrityError:
+                    savepoint.rollback()
+
+    @staticmethod
+    def _update(session, model, rows):
+        # rows are dictionaries of column values including the id
+        if len(rows) > 0:
+            table = model.__table__
+            values = dict((key, bindparam("new_" + key)) for key in rows[0] if key != "id")
+            statement = table.update().where(table.c.id == bindparam("row_id")).values(values)
+            session.execute(statement, [dict([("row_id", row["id"])] + [("new_" + k, v) for k, v in row.iteritems()
+                                                                         if k != "id"]) for row in rows])
+
+    @staticmethod
+    def _link_record(link_sample):
+        return dict((k, getattr(link_sample, k)) for k in ["src_transmit_data_rate", "src_receive_data_rate",
+                                                           "dst_transmit_data_rate", "dst_receive_data_rate",
+                                                           "src_packet_loss", "dst_packet_loss"])
+
+    @staticmethod
+    def _mark_sampled(session, model, ids, now):
+        ids = list(ids)
+        for i in range(0, len(ids), IN_CLAUSE_SIZE):
+            session.query(model).filter(model.id.in_(ids[i:i + IN_CLAUSE_SIZE])).update(
+                {model.last_sampled: now}, synchronize_session=False)
+
     @staticmethod
     def _parse_time(unix_timestamp):
         unix_timestamp = str(unix_timestamp)
@@ -115,38 +396,74 @@ class JsonQuery(object):
         data_rate = delta_bytes / delta_time.total_seconds()
         return int(data_rate)
 
+    @staticmethod
+    def _latest_port_samples(session, port):
+        samples = session.query(PortSample).filter(PortSample.port_id == port.id).order_by(
+            desc(PortSample.sampled)).limit(2).all()
+        if len(samples) > 0 and port.last_sampled is not None and port.last_sampled > samples[0].sampled:
+            # the counters did not change since the newest sample
+            return [_CarriedSample(samples[0], port.last_sampled), samples[0]]
+        return samples
+
+    @staticmethod
+    def _latest_port_samples_bulk(session, port_ids):
+        # Same as _latest_port_samples for many ports, with one query per chunk of ports
+        latest = {}
+        window_functions = store._window_functions(session.bind.dialect)
+        for chunk in _chunks(port_ids):
+            if window_functions:
+                rank = func.row_number().over(partition_by=PortSample.port_id,
+                                              order_by=desc(PortSample.sampled)).label("rank")
+                ranked = session.query(PortSample.id, rank).filter(PortSample.port_id.in_(chunk)).subquery()
+                samples = session.query(PortSample).join(ranked, PortSample.id == ranked.c.id) \
+                    .filter(ranked.c.rank <= 2)
+            else:
+                # Older SQLite: the samples at the newest time of their port and at the newest time before that
+                newest = select([PortSample.port_id, func.max(PortSample.sampled).label("sampled")]) \
+                    .where(PortSample.port_id.in_(chunk)).group_by(PortSample.port_id).alias()
+                previous = select([PortSample.port_id, func.max(PortSample.sampled).label("sampled")]) \
+                    .where(and_(PortSample.port_id == newest.c.port_id, PortSample.sampled < newest.c.sampled)) \
+                    .group_by(PortSample.port_id)
+                times = select([newest.c.port_id, newest.c.sampled]).union_all(previous).alias()
+                samples = session.query(PortSample).join(times, and_(PortSample.port_id == times.c.port_id,
+                                                                     PortSample.sampled == times.c.sampled))
+            for sample in samples.order_by(PortSample.port_id, desc(PortSample.sampled)):
+                latest.setdefault(sample.port_id, []).append(sample)
+
+            for port_id, last_sampled in session.query(Port.id, Port.last_sampled).filter(Port.id.in_(chunk)):
+                samples = latest.get(port_id, [])
+                if len(samples) > 0 and last_sampled is not None and last_sampled > samples[0].sampled:
+                    latest[port_id] = [_CarriedSample(samples[0], last_sampled), samples[0]]
+        return latest
+
     @staticmethod
     def _calculate_link_metrics(link, link_sample, session):
         src_port = filter(lambda p: p.port_number == link.src_port, link.src.ports)
         dst_port = filter(lambda p: p.port_number == link.dst_port, link.dst.ports)
 
+        src_samples = JsonQuery._latest_port_samples(session, src_port[0]) if len(src_port) > 0 else []
+        dst_samples = JsonQuery._latest_port_samples(session, dst_port[0]) if len(dst_port) > 0 else []
+        JsonQuery._apply_link_metrics(link_sample, src_samples, dst_samples)
+
+    @staticmethod
+    def _apply_link_metrics(link_sample, src_samples, dst_samples):
         now_src = None
         now_dst = None
         before_src = None
         before_dst = None
 
-        if len(src_port) > 0:
-            src_samples = session.query(PortSample).filter(
-                PortSample.port_id == src_port[0].id).order_by(
-                desc(PortSample.sampled)).limit(2).all()
+        if len(src_samples) == 2:
+            now_src = src_samples[0]
+            before_src = src_samples[1]
 
-            if len(src_samples) == 2:
-                now_src = src_samples[0]
-                before_src = src_samples[1]
+            link_sample.src_transmit_data_rate = JsonQuery._calculate_data_rate(before_src, now_src, "tx")
+            link_sample.src_receive_data_rate = JsonQuery._calculate_data_rate(before_src, now_src, "rx")
 
-                link_sample.src_transmit_data_rate = JsonQuery._calculate_data_rate(before_src, now_src, "tx")
-                link_sample.src_receive_data_rate = JsonQuery._calculate_data_rate(before_src, now_src, "rx")
-
-        if len(dst_port) > 0:
-            dst_samples = session.query(PortSample).filter(
-                PortSample.port_id == dst_port[0].id).order_by(
-                desc(PortSample.sampled)).limit(2).all()
-
-            if len(dst_samples) == 2:
-                now_dst = dst_samples[0]
-                before_dst = dst_samples[1]
-                link_sample.dst_transmit_data_rate = JsonQuery._calculate_data_rate(before_dst, now_dst, "tx")
-                link_sample.dst_receive_data_rate = JsonQuery._calculate_data_rate(before_dst, now_dst, "rx")
+        if len(dst_samples) == 2:
+            now_dst = dst_samples[0]
+            before_dst = dst_samples[1]
+            link_sample.dst_transmit_data_rate = JsonQuery._calculate_data_rate(before_dst, now_dst, "tx")
+            link_sample.dst_receive_data_rate = JsonQuery._calculate_data_rate(before_dst, now_dst, "rx")
 
         if before_dst is not None and before_src is not None and now_src is not None and now_dst is not None:
             link_sample.src_packet_loss = JsonQuery._calculate_packet_loss_rate(before_dst, before_src, now_dst,
@@ -175,7 +492,7 @@ class JsonQuery(object):
         JsonQuery._calculate_link_metrics(link, link_sample, session)
 
         session.add(link_sample)
-        return link
+        return link_sample
 
 
 class SwitchListQuery(JsonQuery):
@@ -183,19 +500,20 @@ class SwitchListQuery(JsonQuery):
         JsonQuery.__init__(self, poll_interval, **kwargs)
         self.url = "core/controller/switches/json"
 
-    def _process(self, session, now, data):
-        for sw in data:
-            switch = session.query(Node).filter(Node.device_id == sw["switchDPID"]).first()
-            if switch is None:
-                switch = Node(device_id=sw["switchDPID"], created=now, type="switch")
-                session.add(switch)
-                session.commit()
+    def merge(self, responses):
+        # A switch connected to several controllers is reported by each of them
+        return self._unique(JsonQuery.merge(self, responses), lambda sw: sw["switchDPID"])
 
-            switch.last_seen = now
-            switch.connected_since = self._parse_time(sw["connectedSince"])
-
-            switch_sample = NodeSample(node_id=switch.id, sampled=now)
-            session.add(switch_sample)
+    def _process(self, session, now, data):
+        # Every shard reports all switches of its controllers, so they may insert the same switch concurrently
+        switches = dict((sw["switchDPID"], sw) for sw in data)
+        ids = self._get_or_create(session, Node, Node.device_id, switches.keys(),
+                                  lambda device_id: {"device_id": device_id, "created": now, "type": "switch"},
+                                  self.concurrent_writers)
+        self._update(session, Node, [{"id": ids[device_id], "last_seen": now,
+                                      "connected_since": self._parse_time(sw["connectedSince"])}
+                                     for device_id, sw in switches.iteritems()])
+        session.add_all([NodeSample(node_id=ids[device_id], sampled=now) for device_id in switches])
 
 
 class SwitchStatQuery(JsonQuery):
@@ -210,71 +528,201 @@ class SwitchStatQuery(JsonQuery):
 class SwitchStatFeaturesQuery(SwitchStatQuery):
     def __init__(self, poll_interval, **kwargs):
         SwitchStatQuery.__init__(self, poll_interval, "features", **kwargs)
+        # In dedup mode, unchanged descriptors are only written to refresh last_seen after this time
+        self.descriptor_refresh = timedelta(minutes=5)
+        self._descriptors = {}
 
-    def _process(self, session, now, data):
-        for device_id in data:
-            if "portDesc" in data[device_id]:
-                ports = data[device_id]["portDesc"]
-                switch = session.query(Node).filter(Node.device_id == device_id).first()
-                if switch is None:
-                    logging.warning("Could not find Switch [%s]. This should only happen occasionally." % device_id)
-                    continue
+    def forget(self):
+        self._descriptors = {}
 
-                if ports is not None:
-                    for p in ports:
-                        if p["portNumber"] == "local":
-                            continue
+    def _is_unchanged(self, now, key, descriptor):
+        if not self.dedup or key not in self._descriptors:
+            return False
+        (known, written) = self._descriptors[key]
+        return known == descriptor and now - written < self.descriptor_refresh
 
-                        JsonQuery._create_update_port(session, now, switch, p["portNumber"], p["hardwareAddress"],
-                                                      p["name"])
+    def _process(self, session, now, data):
+        for chunk in self._switch_chunks(session, data):
+            for device_id, statistics in chunk:
+                if "portDesc" in statistics:
+                    ports = statistics["portDesc"]
+                    switch = session.query(Node).filter(Node.device_id == device_id).first()
+                    if switch is None:
+                        logging.warning("Could not find Switch [%s]. This should only happen occasionally." % device_id)
+                        continue
+
+                    if ports is not None:
+                        for p in ports:
+                            if p["portNumber"] == "local":
+                                continue
+
+                            key = (device_id, p["portNumber"])
+                            descriptor = (p["hardwareAddress"], p["name"])
+                            if self._is_unchanged(now, key, descriptor):
+                                _samples_skipped.inc(query=self.name)
+                                continue
+
+                            JsonQuery._create_update_port(session, now, switch, p["portNumber"],
+                                                          p["hardwareAddress"], p["name"])
+                            self._descriptors[key] = (descriptor, now)
 
 
 class SwitchStatPortQuery(SwitchStatQuery):
+    counter_keys = ["receivePackets", "transmitPackets", "receiveBytes", "transmitBytes", "receiveDropped",
+                    "transmitDropped", "receiveErrors", "transmitErrors", "receiveFrameErrors",
+                    "receiveOverrunErrors", "receiveCRCErrors", "collisions"]
+
     def __init__(self, poll_interval, **kwargs):
         SwitchStatQuery.__init__(self, poll_interval, "port", **kwargs)
+        self._counters = {}
+
+    def forget(self):
+        self._counters = {}
 
     def _process(self, session, now, data):
-        for device_id in data:
-            if "port" in data[device_id]:
-                ports = data[device_id]["port"]
-                switch = session.query(Node).filter(Node.device_id == device_id).first()
-                if switch is None:
-                    logging.warning("Could not find Switch [%s]. This should only happen occasionally." % device_id)
-                    continue
-
-                if ports is not None:
-                    for p in ports:
-                        if p["portNumber"] == "local":
-                            continue
-
-                        port = session.query(Port).filter(Port.node_id == switch.id,
-                                                          Port.port_number == p["portNumber"]).first()
-                        if port is None:
-                            msg = "Could not find Switch [%s]'s Port [%s]. This should only happen occasionally."
-                            logging.warning(msg % (device_id, p["portNumber"]))
-                            continue
-
-                        sample = PortSample(port_id=port.id,
-                                            sampled=now,
-                                            receive_packets=p["receivePackets"],
-                                            transmit_packets=p["transmitPackets"],
-                                            receive_bytes=p["receiveBytes"],
-                                            transmit_bytes=p["transmitBytes"],
-                                            receive_dropped=p["receiveDropped"],
-                                            transmit_dropped=p["transmitDropped"],
-                                            receive_errors=p["receiveErrors"],
-                                            transmit_errors=p["transmitErrors"],
-                                            receive_frame_errors=p["receiveFrameErrors"],
-                                            receive_overrun_errors=p["receiveOverrunErrors"],
-                                            receive_crc_errors=p["receiveCRCErrors"],
-                                            collisions=p["collisions"])
-
-                        session.add(sample)
+        sampled_ports = []
+        records = {}
+        for chunk in self._switch_chunks(session, data):
+            for device_id, statistics in chunk:
+                if "port" in statistics:
+                    ports = statistics["port"]
+                    switch = session.query(Node).filter(Node.device_id == device_id).first()
+                    if switch is None:
+                        logging.warning("Could not find Switch [%s]. This should only happen occasionally." % device_id)
+                        continue
+
+                    if ports is not None:
+                        for p in ports:
+                            if p["portNumber"] == "local":
+                                continue
+
+                            port = session.query(Port).filter(Port.node_id == switch.id,
+                                                              Port.port_number == p["portNumber"]).first()
+                            if port is None:
+                                msg = "Could not find Switch [%s]'s Port [%s]. This should only happen occasionally."
+                                logging.warning(msg % (device_id, p["portNumber"]))
+                                continue
+
+                            records[port.id] = {"receive_packets": p["receivePackets"],
+                                                "transmit_packets": p["transmitPackets"],
+                                                "receive_bytes": p["receiveBytes"],
+                                                "transmit_bytes": p["transmitBytes"],
+                                                "receive_dropped": p["receiveDropped"],
+                                                "transmit_dropped": p["transmitDropped"],
+                                                "receive_errors": p["receiveErrors"],
+                                                "transmit_errors": p["transmitErrors"],
+                                                "receive_frame_errors": p["receiveFrameErrors"],
+                                                "receive_overrun_errors": p["receiveOverrunErrors"],
+                                                "receive_crc_errors": p["receiveCRCErrors"],
+                                                "collisions": p["collisions"]}
+
+                            if self.dedup:
+                                sampled_ports.append(port.id)
+                                counters = tuple(p[k] for k in self.counter_keys)
+                                previous = self._counters.get(port.id)
+                                if previous is not None and previous.counters == counters:
+                                    previous.polled = now
+                                    _samples_skipped.inc(query=self.name)
+                                    continue
+                                if previous is not None and previous.polled > previous.stored:
+                                    # Close the unchanged run at the previous poll, so the next rate is measured
+                                    # over one poll interval instead of the whole run
+                                    session.add(PortSample(port_id=port.id, sampled=previous.polled,
+                                                           **previous.record))
+                                self._counters[port.id] = _PortCounters(counters, records[port.id], now)
+
+                            sample = PortSample(port_id=port.id, sampled=now, **records[port.id])
+                            session.add(sample)
+
+        if self.dedup:
+            JsonQuery._mark_sampled(session, Port, sampled_ports, now)
+        return records
 
 
 class SwitchStatFlowQuery(SwitchStatQuery):
+    sample_columns = ["packet_count", "byte_count", "duration_seconds", "priority", "idle_timeout_sec",
+                      "hard_timeout_sec"]
+
     def __init__(self, poll_interval, **kwargs):
         SwitchStatQuery.__init__(self, poll_interval, "flow", **kwargs)
+        self._counters = {}
+        # In lifecycle mode, the flow table of each switch is compared with the previous poll: appearing and vanishing
+        # flows are recorded as FlowLifetime and only sampled when they appear, every sample_interval while they are
+        # installed and with the counters of their last poll when they vanish.
+        self.lifecycle = False
+        self.sample_interval = timedelta(minutes=5)
+        self._active = None
+        self._lifecycle_switches = set()  # node ids whose flow table this query compared
+
+    def forget(self):
+        self._counters = {}
+        self._active = None
+
+    def _load_active(self, session):
+        # Restores the flows that were active when the observer stopped from their open lifetimes and newest samples
+        self._active = {}
+        newest = session.query(FlowSample.flow_id, func.max(FlowSample.sampled).label("sampled")) \
+            .join(FlowLifetime, FlowLifetime.flow_id == FlowSample.flow_id) \
+            .filter(FlowLifetime.ended == None).group_by(FlowSample.flow_id).subquery()
+        rows = session.query(FlowSample, Flow.node_id, Flow.last_sampled) \
+            .join(newest, (FlowSample.flow_id == newest.c.flow_id) & (FlowSample.sampled == newest.c.sampled)) \
+            .join(Flow, FlowSample.flow_id == Flow.id)
+        for sample, node_id, last_sampled in rows:
+            values = dict((k, getattr(sample, k)) for k in self.sample_columns)
+            self._active.setdefault(node_id, {})[sample.flow_id] = _ActiveFlow(
+                sample.flow_id, values, last_sampled or sample.sampled, sample.sampled)
+
+    def _track_lifecycle(self, session, now, switch, reported):
+        # reported holds the (flow, sample values) of the switch in this poll
+        if self._active is None:
+            self._load_active(session)
+        if any(fl.id is None for fl, _ in reported):
+            session.flush()
+
+        previous = self._active.get(switch.id, {})
+        current = {}
+        for fl, values in reported:
+            active = previous.pop(fl.id, None) or current.get(fl.id)
+            if active is None:
+                active = _ActiveFlow(fl.id, values, now, None)
+                session.add(FlowLifetime(flow_id=fl.id, started=now, last_seen=now, **values))
+                _flows_started.inc()
+            active.values = values
+            active.last_seen = now
+            if active.sampled is None or now - active.sampled >= self.sample_interval:
+                session.add(FlowSample(flow_id=fl.id, sampled=now, **values))
+                active.sampled = now
+            else:
+                _samples_skipped.inc(query=self.name)
+            current[fl.id] = active
+        self._active[switch.id] = current
+        self._lifecycle_switches.add(switch.id)
+        self._end_flows(session, now, previous.values())
+        return current.keys()
+
+    def _end_missing_switches(self, session, now, present):
+        # Switches missing from the response were disconnected or removed, so their flows ended. The open lifetimes
+        # loaded on start include the switches of other observer processes, which are only closed when not sharded.
+        if self._active is None:
+            self._load_active(session)
+        for node_id in self._active.keys():
+            if node_id not in present and (not self.concurrent_writers or node_id in self._lifecycle_switches):
+                self._end_flows(session, now, self._active.pop(node_id).values())
+
+    def _end_flows(self, session, now, flows):
+        ended = []
+        for active in flows:
+            if active.sampled < active.last_seen:
+                session.add(FlowSample(flow_id=active.flow_id, sampled=active.last_seen, **active.values))
+            row = dict(("new_" + k, v) for k, v in active.values.iteritems())
+            row.update({"b_flow_id": active.flow_id, "new_ended": now, "new_last_seen": active.last_seen})
+            ended.append(row)
+        if len(ended) > 0:
+            table = FlowLifetime.__table__
+            values = dict((k, bindparam("new_" + k)) for k in self.sample_columns + ["ended", "last_seen"])
+            session.execute(table.update().where((table.c.flow_id == bindparam("b_flow_id")) &
+                                                 (table.c.ended == None)).values(values), ended)
+            _flows_ended.inc(len(ended))
 
     @staticmethod
     def _parse_match(match):
@@ -319,63 +767,122 @@ class SwitchStatFlowQuery(SwitchStatQuery):
         }
 
     def _process(self, session, now, data):
-        for dpid in data:
-            switch = session.query(Node).filter(Node.device_id == dpid).first()
-
-            if switch is not None:
-                if "flows" in data[dpid]:
-                    for flow in data[dpid]["flows"]:
-                        match = self._parse_match(flow["match"])
-
-                        fl = session.query(Flow).filter(Flow.cookie == flow["cookie"],
-                                                        Flow.data_layer_destination == match["dataLayerDestination"],
-                                                        Flow.data_layer_source == match["dataLayerSource"],
-                                                        Flow.data_layer_type == match["dataLayerType"],
-                                                        Flow.data_layer_virtual_lan == match["dataLayerVirtualLan"],
-                                                        Flow.data_layer_virtual_lan_priority_code_point == match[
-                                                            "dataLayerVirtualLanPriorityCodePoint"],
-                                                        Flow.input_port == match["inputPort"],
-                                                        Flow.network_destination == match["networkDestination"],
-                                                        Flow.network_destination_mask_len == match[
-                                                            "networkDestinationMaskLen"],
-                                                        Flow.network_protocol == match["networkProtocol"],
-                                                        Flow.network_source == match["networkSource"],
-                                                        Flow.network_source_mask_len == match["networkSourceMaskLen"],
-                                                        Flow.network_type_of_service == match["networkTypeOfService"],
-                                                        Flow.transport_destination == match["transportDestination"],
-                                                        Flow.transport_source == match["transportSource"],
-                                                        Flow.wildcards == match["wildcards"],
-                                                        Flow.node_id == switch.id).first()
-                        if fl is None:
-                            fl = Flow(created=now,
-                                      cookie=flow["cookie"],
-                                      data_layer_destination=match["dataLayerDestination"],
-                                      data_layer_source=match["dataLayerSource"],
-                                      data_layer_type=match["dataLayerType"],
-                                      data_layer_virtual_lan=match["dataLayerVirtualLan"],
-                                      data_layer_virtual_lan_priority_code_point=match[
-                                          "dataLayerVirtualLanPriorityCodePoint"],
-                                      input_port=match["inputPort"],
-                                      network_destination=match["networkDestination"],
-                                      network_destination_mask_len=match["networkDestinationMaskLen"],
-                                      network_protocol=match["networkProtocol"],
-                                      network_source=match["networkSource"],
-                                      network_source_mask_len=match["networkSourceMaskLen"],
-                                      network_type_of_service=match["networkTypeOfService"],
-                                      transport_destination=match["transportDestination"],
-                                      transport_source=match["transportSource"],
-                                      wildcards=match["wildcards"],
-                                      node=switch)
-                            session.add(fl)
-
-                        fs = FlowSample(sampled=now, flow=fl)
-                        fs.packet_count = flow["packetCount"]
-                        fs.byte_count = flow["byteCount"]
-                        fs.duration_seconds = flow["durationSeconds"]
-                        fs.priority = flow["priority"]
-                        fs.idle_timeout_sec = flow["idleTimeoutSec"]
-                        fs.hard_timeout_sec = flow["hardTimeoutSec"]
-                        session.add(fs)
+        sampled_flows = []
+        records = {}
+        present = set()  # node ids of the switches in the response
+        for chunk in self._switch_chunks(session, data):
+            chunk_records = []  # (flow, record) for the listeners
+            new_flows = []  # (flow, counters) of flows that appeared in dedup mode
+            for dpid, statistics in chunk:
+                switch = session.query(Node).filter(Node.device_id == dpid).first()
+
+                if switch is not None:
+                    present.add(switch.id)
+                    if "flows" in statistics:
+                        reported = []
+                        for flow in statistics["flows"]:
+                            match = self._parse_match(flow["match"])
+
+                            fl = session.query(Flow).filter(Flow.cookie == flow["cookie"],
+                                                            Flow.data_layer_destination == match[
+                                                                "dataLayerDestination"],
+                                                            Flow.data_layer_source == match["dataLayerSource"],
+                                                            Flow.data_layer_type == match["dataLayerType"],
+                                                            Flow.data_layer_virtual_lan == match["dataLayerVirtualLan"],
+                                                            Flow.data_layer_virtual_lan_priority_code_point == match[
+                                                                "dataLayerVirtualLanPriorityCodePoint"],
+                                                            Flow.input_port == match["inputPort"],
+                                                            Flow.network_destination == match["networkDestination"],
+                                                            Flow.network_destination_mask_len == match[
+                                                                "networkDestinationMaskLen"],
+                                                            Flow.network_protocol == match["networkProtocol"],
+                                                            Flow.network_source == match["networkSource"],
+                                                            Flow.network_source_mask_len == match[
+                                                                "networkSourceMaskLen"],
+                                                            Flow.network_type_of_service == match[
+                                                                "networkTypeOfService"],
+                                                            Flow.transport_destination == match["transportDestination"],
+                                                            Flow.transport_source == match["transportSource"],
+                                                            Flow.wildcards == match["wildcards"],
+                                                            Flow.node_id == switch.id).first()
+                            if fl is None:
+                                fl = Flow(created=now,
+                                          cookie=flow["cookie"],
+                                          data_layer_destination=match["dataLayerDestination"],
+                                          data_layer_source=match["dataLayerSource"],
+                                          data_layer_type=match["dataLayerType"],
+                                          data_layer_virtual_lan=match["dataLayerVirtualLan"],
+                                          data_layer_virtual_lan_priority_code_point=match[
+                                              "dataLayerVirtualLanPriorityCodePoint"],
+                                          input_port=match["inputPort"],
+                                          network_destination=match["networkDestination"],
+                                          network_destination_mask_len=match["networkDestinationMaskLen"],
+                                          network_protocol=match["networkProtocol"],
+                                          network_source=match["networkSource"],
+                                          network_source_mask_len=match["networkSourceMaskLen"],
+                                          network_type_of_service=match["networkTypeOfService"],
+                                          transport_destination=match["transportDestination"],
+                                          transport_source=match["transportSource"],
+                                          wildcards=match["wildcards"],
+                                          node=switch)
+                                session.add(fl)
+                            if len(self.listeners) > 0:
+                                chunk_records.append((fl, {"node_id": switch.id,
+                                                           "byte_count": flow["byteCount"],
+                                                           "packet_count": flow["packetCount"],
+                                                           "data_layer_source": match["dataLayerSource"],
+                                                           "data_layer_destination": match["dataLayerDestination"],
+                                                           "network_source": match["networkSource"],
+                                                           "network_destination": match["networkDestination"],
+                                                           "network_protocol": match["networkProtocol"],
+                                                           "transport_source": match["transportSource"],
+                                                           "transport_destination": match["transportDestination"]}))
+
+                            if self.lifecycle:
+                                reported.append((fl, {"packet_count": flow["packetCount"],
+                                                      "byte_count": flow["byteCount"],
+                                                      "duration_seconds": flow["durationSeconds"],
+                                                      "priority": flow["priority"],
+                                                      "idle_timeout_sec": flow["idleTimeoutSec"],
+                                                      "hard_timeout_sec": flow["hardTimeoutSec"]}))
+                                continue
+
+                            if self.dedup:
+                                counters = (flow["packetCount"], flow["byteCount"])
+                                if fl.id is None:
+                                    fl.last_sampled = now
+                                    new_flows.append((fl, counters))
+                                else:
+                                    sampled_flows.append(fl.id)
+                                    if self._counters.get(fl.id) == counters:
+                                        _samples_skipped.inc(query=self.name)
+                                        continue
+                                    self._counters[fl.id] = counters
+
+                            fs = FlowSample(sampled=now, flow=fl)
+                            fs.packet_count = flow["packetCount"]
+                            fs.byte_count = flow["byteCount"]
+                            fs.duration_seconds = flow["durationSeconds"]
+                            fs.priority = flow["priority"]
+                            fs.idle_timeout_sec = flow["idleTimeoutSec"]
+                            fs.hard_timeout_sec = flow["hardTimeoutSec"]
+                            session.add(fs)
+
+                        if self.lifecycle:
+                            sampled_flows.extend(self._track_lifecycle(session, now, switch, reported))
+
+            if len(chunk_records) > 0 or len(new_flows) > 0:
+                # Flows that appeared in this chunk get their ids; only the ids are kept, so the flows of earlier
+                # chunks can leave the session
+                session.flush()
+                records.update((fl.id, record) for fl, record in chunk_records)
+                self._counters.update((fl.id, counters) for fl, counters in new_flows)
+
+        if self.lifecycle:
+            self._end_missing_switches(session, now, present)
+        if self.dedup or self.lifecycle:
+            JsonQuery._mark_sampled(session, Flow, sampled_flows, now)
+        return records if len(self.listeners) > 0 else None
 
 
 class DevicesQuery(JsonQuery):
@@ -383,51 +890,159 @@ class DevicesQuery(JsonQuery):
         JsonQuery.__init__(self, poll_interval, **kwargs)
         self.url = "device/"
 
+    def merge(self, responses):
+        # Every controller learns the hosts whose traffic reaches its switches; keep the most recent report per MAC
+        devices = {}
+        anonymous = []
+        for client in JsonQuery.merge(self, responses):
+            if len(client["mac"]) == 0:
+                anonymous.append(client)
+            elif client["mac"][0] not in devices or devices[client["mac"][0]]["lastSeen"] < client["lastSeen"]:
+                devices[client["mac"][0]] = client
+        return devices.values() + anonymous
+
+    def _restrict(self, result, switches):
+        # Hosts belong to the observers that poll their attachment points
+        restricted = []
+        for client in result:
+            attachment_points = filter(lambda ap: ap["switchDPID"] in switches, client["attachmentPoint"])
+            if len(attachment_points) > 0:
+                client = dict(client)
+                client["attachmentPoint"] = attachment_points
+                restricted.append(client)
+        return restricted
+
     @staticmethod
-    def _create_update_address(ip, now, session):
-        address = session.query(InternetAddress).filter(InternetAddress.address == ip).first()
-        if address is None:
-            address = InternetAddress(created=now, address=ip)
-            session.add(address)
-            session.commit()
-        return address
+    def _associate_addresses(session, clients, nodes, addresses):
+        wanted = set((nodes[device_id], addresses[ip]) for device_id, client in clients.iteritems()
+                     for ip in client["ipv4"])
+        existing = set()
+        table = internet_address_association
+        for chunk in _chunks(set(nodes.values())):
+            existing.update(tuple(row) for row in session.execute(
+                select([table.c.node_id, table.c.address_id]).where(table.c.node_id.in_(chunk))))
+        missing = wanted - existing
+        if len(missing) > 0:
+            session.execute(table.insert(), [{"node_id": n, "address_id": a} for n, a in missing])
 
     @staticmethod
-    def _create_update_node(ip_addresses, mac, now, session):
-        cl = session.query(Node).filter(Node.device_id == "00:00:" + mac).first()
-        if cl is None:
-            cl = Node(created=now, device_id="00:00:" + mac, type="host")
-            session.add(cl)
-            session.commit()
+    def _add_node_samples(session, now, clients, nodes, last_seen):
+        candidates = [nodes[device_id] for device_id, client in clients.iteritems()
+                      if len(client["attachmentPoint"]) > 0]
+        existing = set()
+        for chunk in _chunks(candidates):
+            existing.update(session.query(NodeSample.node_id, NodeSample.sampled).filter(
+                NodeSample.node_id.in_(chunk), NodeSample.sampled.in_(set(last_seen[n] for n in chunk))))
+        samples = [{"node_id": n, "sampled": now} for n in candidates if (n, last_seen[n]) not in existing]
+        if len(samples) > 0:
+            session.execute(NodeSample.__table__.insert(), samples)
 
-        for ip in ip_addresses:
-            address = DevicesQuery._create_update_address(ip, now, session)
-            if address is not None and address not in cl.addresses:
-                cl.addresses.append(address)
+    @staticmethod
+    def _switch_ports(session, switch_ids):
+        ports = {}
+        for chunk in _chunks(switch_ids):
+            for port_id, node_id, number in session.query(Port.id, Port.node_id, Port.port_number).filter(
+                    Port.node_id.in_(chunk)).order_by(desc(Port.id)):
+                ports[(node_id, number)] = port_id
+        return ports
 
-        return cl
+    @staticmethod
+    def _create_update_host_ports(session, now, hosts):
+        # hosts maps node ids to MACs; every host has a single port with the number 1
+        ports = {}
+        for chunk in _chunks(hosts.keys()):
+            for port_id, node_id in session.query(Port.id, Port.node_id).filter(
+                    Port.node_id.in_(chunk), Port.port_number == 1).order_by(desc(Port.id)):
+                ports[node_id] = port_id
+
+        DevicesQuery._update(session, Port, [{"id": ports[n], "last_seen": now, "hardware_address": hosts[n],
+                                              "name": "UNK"} for n in hosts if n in ports])
+        missing = [n for n in hosts if n not in ports]
+        if len(missing) > 0:
+            session.execute(Port.__table__.insert(), [{"node_id": n, "port_number": 1, "created": now,
+                                                       "last_seen": now, "hardware_address": hosts[n],
+                                                       "name": "UNK"} for n in missing])
+            for chunk in _chunks(missing):
+                for port_id, node_id in session.query(Port.id, Port.node_id).filter(
+                        Port.node_id.in_(chunk), Port.port_number == 1).order_by(desc(Port.id)):
+                    ports[node_id] = port_id
+        return ports
+
+    @staticmethod
+    def _resolve_links(session, node_ids):
+        links = {}
+        for chunk in _chunks(node_ids):
+            for row in session.query(Link.id, Link.src_id, Link.src_port, Link.dst_id, Link.dst_port).filter(
+                    or_(Link.src_id.in_(chunk), Link.dst_id.in_(chunk))).order_by(desc(Link.id)):
+                links[tuple(row[1:])] = row[0]
+        return links
 
     def _process(self, session, now, data):
+        clients = {}
         for client in data:
             if len(client["mac"]) > 0:
-                mac = client["mac"][0]
-
-                cl = DevicesQuery._create_update_node(client["ipv4"], mac, now, session)
-                cl.last_seen = JsonQuery._parse_time(client["lastSeen"])
-                client_sample = session.query(NodeSample).filter(NodeSample.node_id == cl.id,
-                                                                 NodeSample.sampled == cl.last_seen).first()
-                if client_sample is None and len(client["attachmentPoint"]) > 0:
-                    client_sample = NodeSample(node_id=cl.id, sampled=now)
-                    session.add(client_sample)
-                    session.commit()
-
-                for ap in client["attachmentPoint"]:
-                    switch = session.query(Node).filter(Node.device_id == ap["switchDPID"]).first()
-                    if switch is not None:
-                        local_port = 1
-                        JsonQuery._create_update_port(session, now, cl, local_port, mac, "UNK")
-                        JsonQuery._create_update_link(session, now, cl, local_port, switch, ap["port"],
-                                                      "ethernet", "bidirectional", now)
+                clients["00:00:" + client["mac"][0]] = client
+        if len(clients) == 0:
+            return
+
+        nodes = self._get_or_create(session, Node, Node.device_id, clients.keys(),
+                                    lambda device_id: {"device_id": device_id, "created": now, "type": "host"},
+                                    self.concurrent_writers)
+        addresses = self._get_or_create(session, InternetAddress, InternetAddress.address,
+                                        set(ip for client in clients.itervalues() for ip in client["ipv4"]),
+                                        lambda ip: {"address": ip, "created": now})
+        self._associate_addresses(session, clients, nodes, addresses)
+
+        last_seen = dict((nodes[device_id], JsonQuery._parse_time(client["lastSeen"]))
+                         for device_id, client in clients.iteritems())
+        self._update(session, Node, [{"id": n, "last_seen": t} for n, t in last_seen.iteritems()])
+        self._add_node_samples(session, now, clients, nodes, last_seen)
+
+        switches = self._resolve_ids(session, Node, Node.device_id,
+                                     set(ap["switchDPID"] for client in clients.itervalues()
+                                         for ap in client["attachmentPoint"]))
+        attachments = [(device_id, ap) for device_id, client in clients.iteritems()
+                       for ap in client["attachmentPoint"] if ap["switchDPID"] in switches]
+        if len(attachments) == 0:
+            return
+
+        host_ports = self._create_update_host_ports(
+            session, now, dict((nodes[device_id], device_id[len("00:00:"):]) for device_id, _ in attachments))
+        switch_ports = self._switch_ports(session, set(switches.values()))
+
+        # Links are stored with the end of the smaller device id as source, see _create_update_link
+        ends = []
+        for device_id, ap in attachments:
+            host = (device_id, nodes[device_id], 1, host_ports[nodes[device_id]])
+            switch = (ap["switchDPID"], switches[ap["switchDPID"]], ap["port"],
+                      switch_ports.get((switches[ap["switchDPID"]], ap["port"])))
+            ends.append((switch, host) if host[0] > switch[0] else (host, switch))
+
+        hosts = set(nodes[device_id] for device_id, _ in attachments)
+        links = self._resolve_links(session, hosts)
+        keys = [(src[1], src[2], dst[1], dst[2]) for src, dst in ends]
+        self._update(session, Link, [{"id": links[key], "type": "ethernet", "direction": "bidirectional",
+                                      "last_seen": now} for key in set(keys) if key in links])
+        missing = set(key for key in keys if key not in links)
+        if len(missing) > 0:
+            session.execute(Link.__table__.insert(), [{"src_id": s, "src_port": sp, "dst_id": d, "dst_port": dp,
+                                                       "created": now, "type": "ethernet",
+                                                       "direction": "bidirectional", "last_seen": now}
+                                                      for s, sp, d, dp in missing])
+            links = self._resolve_links(session, hosts)
+
+        port_samples = self._latest_port_samples_bulk(session, set(end[3] for pair in ends for end in pair
+                                                                   if end[3] is not None))
+        link_samples = []
+        records = {}
+        for (src, dst), key in zip(ends, keys):
+            link_sample = LinkSample(link_id=links[key], sampled=now)
+            self._apply_link_metrics(link_sample, port_samples.get(src[3], []), port_samples.get(dst[3], []))
+            link_samples.append(dict((c.name, getattr(link_sample, c.key)) for c in LinkSample.__table__.columns
+                                     if c.name != "id"))
+            records[links[key]] = self._link_record(link_sample)
+        session.execute(LinkSample.__table__.insert(), link_samples)
+        return records
 
 
 class LinksQuery(JsonQuery):
@@ -435,7 +1050,22 @@ class LinksQuery(JsonQuery):
         JsonQuery.__init__(self, poll_interval, **kwargs)
         self.url = "topology/links/json"
 
+    @staticmethod
+    def _key(ln):
+        # Same for both directions, as links are stored with the smaller device id as source
+        ends = sorted([(ln["src-switch"], ln["src-port"]), (ln["dst-switch"], ln["dst-port"])])
+        return tuple(ends)
+
+    def merge(self, responses):
+        # Controllers on both ends report inter-domain links
+        return self._unique(JsonQuery.merge(self, responses), self._key)
+
+    def _restrict(self, result, switches):
+        # Links belong to the observer that polls the switch with the smaller device id
+        return filter(lambda ln: self._key(ln)[0][0] in switches, result)
+
     def _process(self, session, now, data):
+        link_samples = []
         for ln in data:
             src = session.query(Node).filter(Node.device_id == ln["src-switch"]).first()
             dst = session.query(Node).filter(Node.device_id == ln["dst-switch"]).first()
@@ -445,32 +1075,72 @@ class LinksQuery(JsonQuery):
                     ln["src-switch"], ln["dst-switch"]))
                 continue
 
-            JsonQuery._create_update_link(session, now, src, ln["src-port"], dst, ln["dst-port"], ln["type"],
-                                          ln["direction"], now)
+            link_samples.append(JsonQuery._create_update_link(session, now, src, ln["src-port"], dst, ln["dst-port"],
+                                                              ln["type"], ln["direction"], now))
+
+        session.flush()
+        return dict((ls.link_id, self._link_record(ls)) for ls in link_samples)
 
 
 class DelayQuery(JsonQuery):
+    follows = "LinksQuery"
+
     def __init__(self, poll_interval, **kwargs):
         JsonQuery.__init__(self, poll_interval, **kwargs)
         self.url = "uds/delay/json"
 
-    def _process(self, session, now, data):
-        links = session.query(LinkSample).filter(LinkSample.sampled == now).all()
+    def merge(self, responses):
+        # Controllers without the delay module answer with a 404 document
+        measured = filter(lambda r: not ("code" in r and r["code"] == 404), responses)
+        if len(measured) == 0:
+            return responses[0]
+        return [sample for response in measured for sample in response]
+
+    @staticmethod
+    def _index_link_samples(session, now):
+        # Link samples of this poll by (dpid, port) of either end, resolved in one query instead of lazy loads per link
+        src = aliased(Node)
+        dst = aliased(Node)
+        samples = session.query(LinkSample.id, Link.id, src.device_id, Link.src_port, dst.device_id, Link.dst_port) \
+            .join(Link, LinkSample.link_id == Link.id) \
+            .join(src, Link.src_id == src.id) \
+            .join(dst, Link.dst_id == dst.id) \
+            .filter(LinkSample.sampled == now)
+
+        by_src = {}
+        by_dst = {}
+        for sample_id, link_id, src_dpid, src_port, dst_dpid, dst_port in samples:
+            by_src.setdefault((src_dpid, src_port), []).append((sample_id, link_id))
+            by_dst.setdefault((dst_dpid, dst_port), []).append((sample_id, link_id))
+        return by_src, by_dst
 
+    def _process(self, session, now, data):
         if "code" in data and data["code"] == 404:
             return
 
+        by_src, by_dst = self._index_link_samples(session, now)
+
+        src_delays = {}
+        dst_delays = {}
+        records = {}
         for delaySample in data:
             if not delaySample["inconsistency"] and delaySample["srcCtrlDelay"] is not None and delaySample["dstCtrlDelay"] is not None:
                 delay = delaySample["fullDelay"] - 0.5 * (delaySample["srcCtrlDelay"] + delaySample["dstCtrlDelay"])
 
-                src_port = int(delaySample["srcPort"])
-                src_links = filter(lambda x: x.link.src.device_id == delaySample["srcDpid"] and x.link.src_port == src_port, links)
-                for l in src_links:
-                    l.src_delay = delay
+                for sample_id, link_id in by_src.get((delaySample["srcDpid"], int(delaySample["srcPort"])), []):
+                    src_delays[sample_id] = delay
+                    records.setdefault(link_id, {})["src_delay"] = delay
+
+                for sample_id, link_id in by_dst.get((delaySample["dstDpid"], int(delaySample["dstPort"])), []):
+                    dst_delays[sample_id] = delay
+                    records.setdefault(link_id, {})["dst_delay"] = delay
+
+        table = LinkSample.__table__
+        for column, delays in [("src_delay", src_delays), ("dst_delay", dst_delays)]:
+            if len(delays) > 0:
+                statement = table.update().where(table.c.id == bindparam("sample_id")).values(
+                    {column: bindparam("delay")})
+                session.execute(statement, [{"sample_id": i, "delay": d} for i, d in delays.iteritems()])
 
-                dst_port = int(delaySample["dstPort"])
-                dst_links = filter(lambda x: x.link.dst.device_id == delaySample["dstDpid"] and x.link.dst_port == dst_port, links)
-                for l in dst_links:
-                    l.dst_delay = delay
+        return records
 
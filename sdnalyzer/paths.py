@@ -0,0 +1,273 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Saarland University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# Contributor(s): Andreas Schmidt (Saarland University)
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# 
+# This license applies to all parts of SDNalytics that are not externally
+# maintained libraries.
+
+from collections import Counter, deque
+import heapq
+import itertools
+from threading import Lock
+
+from sqlalchemy.orm import aliased
+
+import sdnalyzer.monitoring as monitoring
+from sdnalyzer.store import Node, Link, LinkSample
+from sdnalyzer.snapshot import sample_timestamp
+
+# k shortest loopless paths (Yen) between switches over the links of the newest sample timestamp, weighted by their
+# delay and loss. Results are cached per switch pair. When the links of a new timestamp are loaded, only the cached
+# paths the changes can affect are dropped: those over removed or more expensive links, and, for new or cheaper links,
+# those whose k-th path costs more than the link alone.
+# Whether link-disjoint paths leave a switch through two given links towards a destination is decided by a unit
+# capacity max flow. It depends only on which links exist, so these results are kept until links are added or removed.
+
+MINIMAL_DELAY = 1.0  # ms
+MINIMAL_LOSS = 10 ** -3
+MAXIMAL_LOSS = 0.99
+# Relative weight change below which a link keeps its weight, so that jitter does not invalidate the cache every poll
+WEIGHT_TOLERANCE = 0.1
+
+_lookups = monitoring.registry.counter("sdnalytics_path_lookups_total",
+                                       "Path requests by whether the paths were cached.", ["result"])
+_invalidations = monitoring.registry.counter("sdnalytics_path_invalidations_total",
+                                             "Cached switch pairs dropped due to link changes.")
+
+
+def link_weight(sample):
+    # Expected delay of a packet including retransmissions of lost packets
+    delays = [d for d in (sample.src_delay, sample.dst_delay) if d is not None]
+    losses = [l for l in (sample.src_packet_loss, sample.dst_packet_loss) if l is not None]
+    delay = max(MINIMAL_DELAY, sum(delays) / len(delays)) if len(delays) > 0 else MINIMAL_DELAY
+    loss = min(MAXIMAL_LOSS, max([MINIMAL_LOSS] + losses))
+    return delay / (1 - loss)
+
+
+def _shortest_path(adjacency, src, dst, removed_links, removed_nodes):
+    # Dijkstra; returns (cost, nodes, links) or None
+    queue = [(0.0, src, [src], [])]
+    done = set()
+    while len(queue) > 0:
+        cost, node, nodes, links = heapq.heappop(queue)
+        if node == dst:
+            return cost, nodes, links
+        if node in done:
+            continue
+        done.add(node)
+        for neighbor, link_id, weight in adjacency.get(node, ()):
+            if neighbor not in done and neighbor not in removed_nodes and link_id not in removed_links:
+                heapq.heappush(queue, (cost + weight, neighbor, nodes + [neighbor], links + [link_id]))
+    return None
+
+
+def k_shortest_paths(adjacency, src, dst, k):
+    # adjacency maps nodes to lists of (neighbor, link id, weight); paths are (cost, nodes, links) by cost
+    first = _shortest_path(adjacency, src, dst, set(), set())
+    if first is None:
+        return []
+    weights = dict((link_id, weight) for edges in adjacency.itervalues() for _, link_id, weight in edges)
+    paths = [first]
+    candidates = []
+    seen = set([tuple(first[2])])
+    while len(paths) < k:
+        previous = paths[-1]
+        for i in range(len(previous[1]) - 1):
+            spur_node = previous[1][i]
+            root_nodes, root_links = previous[1][:i + 1], previous[2][:i]
+            removed_links = set(p[2][i] for p in paths if p[2][:i] == root_links and len(p[2]) > i)
+            spur = _shortest_path(adjacency, spur_node, dst, removed_links, set(root_nodes[:-1]))
+            if spur is None:
+                continue
+            links = root_links + spur[2]
+            if tuple(links) not in seen:
+                seen.add(tuple(links))
+                heapq.heappush(candidates, (sum(weights[l] for l in links), root_nodes[:-1] + spur[1], links))
+        if len(candidates) == 0:
+            break
+        paths.append(heapq.heappop(candidates))
+    return paths
+
+
+def disjoint_paths(paths):
+    # Greedy selection of link-disjoint paths, cheapest first
+    selected = []
+    used = set()
+    for path in paths:
+        if used.isdisjoint(path[2]):
+            selected.append(path)
+            used.update(path[2])
+    return selected
+
+
+def _augment(adjacency, residual, sources, dst, excluded):
+    # Breadth-first search for a path with remaining capacity from one of the sources to dst; pushes one unit along it
+    parents = dict((source, None) for source, capacity in sources.iteritems() if capacity > 0)
+    queue = deque(parents)
+    while len(queue) > 0:
+        node = queue.popleft()
+        if node == dst:
+            while parents[node] is not None:
+                previous, link_id = parents[node]
+                residual[(link_id, previous)] = residual.get((link_id, previous), 1) - 1
+                residual[(link_id, node)] = residual.get((link_id, node), 1) + 1
+                node = previous
+            sources[node] -= 1
+            return True
+        for neighbor, link_id, _ in adjacency.get(node, ()):
+            if neighbor not in parents and neighbor not in excluded and residual.get((link_id, node), 1) > 0:
+                parents[neighbor] = (node, link_id)
+                queue.append(neighbor)
+    return False
+
+
+def link_disjoint(adjacency, starts, dst, excluded):
+    # Whether link-disjoint paths from each of the start nodes (repetitions allowed) reach dst without passing the
+    # excluded nodes; every link carries one unit in either direction
+    residual = {}  # (link id, node) -> remaining capacity leaving the node over the link
+    sources = Counter(starts)
+    return all(_augment(adjacency, residual, sources, dst, excluded) for _ in starts)
+
+
+class PathService(object):
+    def __init__(self, k=4):
+        self.k = k
+        self.timestamp = None
+        self.device_ids = {}  # node id -> device id of the switches
+        self._links = {}  # link id -> (src node id, dst node id, weight)
+        self._adjacency = {}
+        self._cache = {}  # (src, dst) -> paths
+        self._by_link = {}  # link id -> cached pairs with a path over the link
+        self._disjoint = {}  # (src, left link id, right link id) -> destinations
+        self._lock = Lock()
+
+    def refresh(self, session, timestamp=None):
+        # Loads the links of the newest sample timestamp (at or before timestamp) if it changed
+        sampled = sample_timestamp(session, timestamp)
+        if sampled is None or sampled == self.timestamp:
+            return
+        src = aliased(Node)
+        dst = aliased(Node)
+        rows = session.query(LinkSample, Link.src_id, Link.dst_id, src.device_id, dst.device_id) \
+            .join(Link, LinkSample.link_id == Link.id) \
+            .join(src, Link.src_id == src.id) \
+            .join(dst, Link.dst_id == dst.id) \
+            .filter(LinkSample.sampled == sampled, src.type != "host", dst.type != "host").all()
+        links = {}
+        device_ids = {}
+        for sample, src_id, dst_id, src_device_id, dst_device_id in rows:
+            links[sample.link_id] = (src_id, dst_id, link_weight(sample))
+            device_ids[src_id] = src_device_id
+            device_ids[dst_id] = dst_device_id
+        with self._lock:
+            self.device_ids = device_ids
+            self.update(links)
+            self.timestamp = sampled
+
+    def update(self, links):
+        # links maps link ids to (src node id, dst node id, weight); invalidates the affected cached pairs
+        invalid = set()
+        cheapest_addition = None
+        current_links = {}
+        for link_id, (src, dst, weight) in links.iteritems():
+            current = self._links.get(link_id)
+            if current is not None and abs(weight - current[2]) <= WEIGHT_TOLERANCE * current[2]:
+                current_links[link_id] = current
+                continue
+            current_links[link_id] = (src, dst, weight)
+            if current is not None:
+                invalid.update(self._by_link.get(link_id, ()))
+            if current is None or weight < current[2]:
+                cheapest_addition = weight if cheapest_addition is None else min(cheapest_addition, weight)
+        for link_id in set(self._links) - set(links):
+            invalid.update(self._by_link.get(link_id, ()))
+        if set(self._links) != set(links):
+            self._disjoint = {}
+
+        if cheapest_addition is not None:
+            # A new path over an added or cheaper link costs at least the weight of that link
+            for pair, paths in self._cache.iteritems():
+                if len(paths) < self.k or paths[-1][0] > cheapest_addition:
+                    invalid.add(pair)
+
+        for pair in invalid:
+            self._drop(pair)
+        _invalidations.inc(len(invalid))
+
+        self._links = current_links
+        self._adjacency = {}
+        for link_id, (src, dst, weight) in current_links.iteritems():
+            self._adjacency.setdefault(src, []).append((dst, link_id, weight))
+            self._adjacency.setdefault(dst, []).append((src, link_id, weight))
+
+    def _drop(self, pair):
+        for path in self._cache.pop(pair, ()):
+            for link_id in path[2]:
+                pairs = self._by_link.get(link_id)
+                if pairs is not None:
+                    pairs.discard(pair)
+
+    def paths(self, src, dst):
+        # k shortest paths between two switches (node ids) as (cost, node ids, link ids)
+        with self._lock:
+            pair = (src, dst)
+            if pair in self._cache:
+                _lookups.inc(result="hit")
+                return self._cache[pair]
+            _lookups.inc(result="miss")
+            paths = k_shortest_paths(self._adjacency, src, dst, self.k) if src != dst else []
+            self._cache[pair] = paths
+            for link_id in set(itertools.chain.from_iterable(p[2] for p in paths)):
+                self._by_link.setdefault(link_id, set()).add(pair)
+            return paths
+
+    def disjoint_destinations(self, src, left, right):
+        # Switches (node ids) reached by link-disjoint paths from src that leave through the left and the right link
+        with self._lock:
+            key = (src, left, right)
+            if key not in self._disjoint:
+                starts = []
+                for link_id in (left, right):
+                    if link_id not in self._links:
+                        self._disjoint[key] = []
+                        return []
+                    link_src, link_dst, _ = self._links[link_id]
+                    starts.append(link_dst if link_src == src else link_src)
+                # Loopless paths do not return to src, so src is excluded and neither path can use the other link
+                self._disjoint[key] = [dst for dst in sorted(self._adjacency) if dst != src and
+                                       link_disjoint(self._adjacency, starts, dst, set([src]))]
+            return self._disjoint[key]
+
+    def switches(self):
+        return sorted(self._adjacency.keys())
+
+
+_shared = None
+
+
+def shared_service():
+    # Path service of the process, shared by the API and the analyzer tasks
+    global _shared
+    if _shared is None:
+        _shared = PathService()
+    return _shared
@@ -0,0 +1,140 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Saarland University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# Contributor(s): Andreas Schmidt (Saarland University)
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# 
+# This license applies to all parts of SDNalytics that are not externally
+# maintained libraries.
+
+import cProfile
+import json
+import marshal
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class StatementTimer(object):
+    def __init__(self):
+        self.statements = {}
+        self._thread = None
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if threading.current_thread() is self._thread:
+            conn.info.setdefault("statement_start", []).append(time.time())
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if threading.current_thread() is not self._thread or not conn.info.get("statement_start"):
+            return
+        duration = time.time() - conn.info["statement_start"].pop()
+        entry = self.statements.setdefault(statement, {"statement": statement, "count": 0, "total": 0.0, "max": 0.0})
+        entry["count"] += 1
+        entry["total"] += duration
+        entry["max"] = max(entry["max"], duration)
+
+    @property
+    def count(self):
+        return sum(s["count"] for s in self.statements.itervalues())
+
+    @property
+    def total(self):
+        return sum(s["total"] for s in self.statements.itervalues())
+
+    def start(self):
+        self._thread = threading.current_thread()
+        event.listen(Engine, "before_cursor_execute", self._before_execute)
+        event.listen(Engine, "after_cursor_execute", self._after_execute)
+
+    def stop(self):
+        event.remove(Engine, "before_cursor_execute", self._before_execute)
+        event.remove(Engine, "after_cursor_execute", self._after_execute)
+
+    def to_json(self):
+        return json.dumps(sorted(self.statements.values(), key=lambda s: s["total"], reverse=True))
+
+
+class TaskProfiler(object):
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._profile = cProfile.Profile()
+        self.statements = StatementTimer()
+
+    def __enter__(self):
+        if self.enabled:
+            self.statements.start()
+            self._profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.enabled:
+            self._profile.disable()
+            self.statements.stop()
+        return False
+
+    def dump_stats(self):
+        # Same layout as pstats.Stats.dump_stats, so the result can be loaded with pstats or snakeviz.
+        self._profile.create_stats()
+        return marshal.dumps(self._profile.stats)
+
+
+def _label(func):
+    filename, line, name = func
+    return "{} ({}:{})".format(name, filename, line).replace(";", ",")
+
+
+# Converts marshalled pstats data to the collapsed stack format of flamegraph.pl. cProfile only records caller/callee
+# pairs, so the time of functions with several callers is split in proportion to the time each caller spent in them.
+# Paths below the resolution (a fraction of the total time) are cut off to keep the number of visited paths bounded.
+def to_folded(statistics, max_depth=64, resolution=1e-4):
+    stats = marshal.loads(statistics)
+    children = {}
+    roots = []
+    for func, (cc, nc, tt, ct, callers) in stats.iteritems():
+        if len(callers) == 0:
+            roots.append(func)
+        for caller, edge in callers.iteritems():
+            children.setdefault(caller, []).append((func, edge[3]))
+
+    threshold = resolution * sum(stats[func][3] for func in roots)
+    lines = {}
+
+    def visit(func, stack, budget):
+        cumulative = stats[func][3]
+        if cumulative <= 0 or budget <= threshold:
+            return
+        share = min(1.0, budget / cumulative)
+        stack = stack + [func]
+        own = stats[func][2] * share
+        if own > 0:
+            key = ";".join(map(_label, stack))
+            lines[key] = lines.get(key, 0) + own
+        if len(stack) >= max_depth:
+            return
+        for child, edge_time in children.get(func, []):
+            if child not in stack:
+                visit(child, stack, edge_time * share)
+
+    for func in roots:
+        visit(func, [], stats[func][3])
+
+    return "\n".join("{} {}".format(k, int(round(v * 1e6))) for k, v in sorted(lines.iteritems()) if v >= 1e-6)
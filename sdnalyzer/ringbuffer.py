@@ -0,0 +1,194 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Saarland University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# Contributor(s): Andreas Schmidt (Saarland University)
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# 
+# This license applies to all parts of SDNalytics that are not externally
+# maintained libraries.
+
+import json
+import os
+import time
+
+import numpy as np
+
+# Fixed-size rings of the most recent values of a metric per id (e.g. the transmitted bytes of every port), kept in
+# memory-mapped files so that other processes read them without copying and they survive restarts.
+#
+# File layout: a header of HEADER_SIZE int64 (magic, slots, capacity, head), followed by the timestamps (float64, unix
+# time) and the values (float64, one column per id, NaN if an id was not reported). Every row is written twice, at
+# slot and slot + slots, so the newest n rows are always one contiguous slice. Columns are assigned to ids by a SlotMap.
+
+MAGIC = 0x52494e47  # RING
+HEADER_SIZE = 4
+_MAGIC, _SLOTS, _CAPACITY, _HEAD = range(HEADER_SIZE)
+
+
+def metric_path(directory, metric):
+    return os.path.join(directory, metric + ".ring")
+
+
+def slots_path(directory, kind):
+    return os.path.join(directory, kind + ".slots")
+
+
+class SlotMap(object):
+    # Assigns the sparse ids of the columns of ring buffers (e.g. the database ids of ports) to dense column slots. The
+    # assignment is kept as JSON next to the ring buffers, so readers map the columns back to ids and it survives
+    # restarts. Released slots are reused by the next new id.
+    def __init__(self, path, capacity):
+        self.path = path
+        self.capacity = capacity
+        self.slots = self.read(path) if os.path.isfile(path) else {}
+        used = set(self.slots.values())
+        # Lowest free slot last
+        self._free = [slot for slot in range(capacity - 1, -1, -1) if slot not in used]
+
+    @staticmethod
+    def read(path):
+        # id -> slot
+        with open(path) as f:
+            return dict((int(i), slot) for i, slot in json.load(f).iteritems())
+
+    def assign(self, ids):
+        # Returns the slots of the ids and the ids that did not get a slot as all are taken
+        dropped = []
+        for i in ids:
+            if i not in self.slots:
+                if len(self._free) == 0:
+                    dropped.append(i)
+                    continue
+                self.slots[i] = self._free.pop()
+        return dict((i, self.slots[i]) for i in ids if i in self.slots), dropped
+
+    def release(self, ids):
+        # Returns the released slots
+        released = [self.slots.pop(i) for i in ids if i in self.slots]
+        self._free.extend(released)
+        self._free.sort(reverse=True)
+        return released
+
+    def save(self):
+        temporary = self.path + ".tmp"
+        with open(temporary, "w") as f:
+            json.dump(dict((str(i), slot) for i, slot in self.slots.iteritems()), f)
+        os.rename(temporary, self.path)
+
+
+class RingBuffer(object):
+    def __init__(self, path, slots=None, capacity=None, writable=False):
+        # The file is created with the given dimensions if it does not exist; otherwise its dimensions are used.
+        if not os.path.isfile(path):
+            if not writable or slots is None or capacity is None:
+                raise IOError("Ring buffer {} does not exist.".format(path))
+            self._create(path, slots, capacity)
+
+        self.path = path
+        self.writable = writable
+        mode = "r+" if writable else "r"
+        self._header = np.memmap(path, dtype=np.int64, mode=mode, shape=(HEADER_SIZE,))
+        if self._header[_MAGIC] != MAGIC:
+            raise IOError("{} is not a ring buffer.".format(path))
+        self.slots = int(self._header[_SLOTS])
+        self.capacity = int(self._header[_CAPACITY])
+
+        offset = HEADER_SIZE * 8
+        self._timestamps = np.memmap(path, dtype=np.float64, mode=mode, offset=offset, shape=(2 * self.slots,))
+        offset += 2 * self.slots * 8
+        self._values = np.memmap(path, dtype=np.float64, mode=mode, offset=offset,
+                                 shape=(2 * self.slots, self.capacity))
+
+    @staticmethod
+    def _create(path, slots, capacity):
+        directory = os.path.dirname(path)
+        if directory != "" and not os.path.isdir(directory):
+            os.makedirs(directory)
+        temporary = path + ".tmp"
+        header = np.memmap(temporary, dtype=np.int64, mode="w+",
+                           shape=(HEADER_SIZE + 2 * slots + 2 * slots * capacity,))
+        header[:HEADER_SIZE] = [MAGIC, slots, capacity, 0]
+        header[HEADER_SIZE:] = np.float64(np.nan).view(np.int64)
+        header.flush()
+        del header
+        os.rename(temporary, path)
+
+    @property
+    def head(self):
+        # Number of rows written since the file was created
+        return int(self._header[_HEAD])
+
+    def __len__(self):
+        return min(self.head, self.slots)
+
+    def append(self, timestamp, values):
+        # values maps ids to values; ids beyond the capacity are dropped and returned
+        row = np.full(self.capacity, np.nan)
+        dropped = self._fill(row, values)
+        self._write(self.head, timestamp, row)
+        self._header[_HEAD] = self.head + 1
+        return dropped
+
+    def update(self, timestamp, values):
+        # Adds values to the newest row if it has the same timestamp, e.g. from a second query of the same poll
+        if self.head == 0 or self._timestamps[(self.head - 1) % self.slots] != timestamp:
+            return self.append(timestamp, values)
+        row = np.array(self._values[(self.head - 1) % self.slots])
+        dropped = self._fill(row, values)
+        self._write(self.head - 1, timestamp, row)
+        return dropped
+
+    def _fill(self, row, values):
+        dropped = []
+        for i, value in values.iteritems():
+            if not 0 <= i < self.capacity:
+                dropped.append(i)
+            elif value is not None:
+                row[i] = value
+        return dropped
+
+    def _write(self, position, timestamp, row):
+        slot = position % self.slots
+        for index in (slot, slot + self.slots):
+            self._values[index] = row
+            self._timestamps[index] = timestamp
+
+    def clear(self, columns):
+        # Forgets all values of the columns, e.g. before they are reused for other ids
+        if len(columns) > 0:
+            self._values[:, list(columns)] = np.nan
+
+    def flush(self):
+        self._values.flush()
+        self._timestamps.flush()
+        self._header.flush()
+
+    def last(self, n=None):
+        # Views (timestamps, values[rows, ids]) of the newest n rows, oldest first; no data is copied
+        head = self.head
+        n = len(self) if n is None else max(0, min(n, len(self)))
+        end = (head - 1) % self.slots + self.slots + 1 if head > 0 else 0
+        return self._timestamps[end - n:end], self._values[end - n:end]
+
+    def since(self, seconds):
+        timestamps, values = self.last()
+        start = np.searchsorted(timestamps, time.time() - seconds, side="right")
+        return timestamps[start:], values[start:]
@@ -0,0 +1,101 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Saarland University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# Contributor(s): Andreas Schmidt (Saarland University)
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# 
+# This license applies to all parts of SDNalytics that are not externally
+# maintained libraries.
+
+import time
+from datetime import datetime as dt
+
+import numpy as np
+
+import sdnalyzer.store as store
+
+# Downsampled time series of a single link or port for graphs. The samples of the range are read with the
+# (id, sampled) index of their table and aggregated into at most points buckets of equal width, each with the minimum,
+# maximum and mean of every metric, so a response is bounded by the requested resolution and spikes stay visible.
+
+LINK_METRICS = ["src_packet_loss", "dst_packet_loss", "src_transmit_data_rate", "src_receive_data_rate",
+                "dst_transmit_data_rate", "dst_receive_data_rate", "src_delay", "dst_delay", "betweenness"]
+PORT_METRICS = ["transmit_bps", "receive_bps", "transmit_pps", "receive_pps", "transmit_dropped", "receive_dropped",
+                "transmit_errors", "receive_errors"]
+
+MAX_POINTS = 2000
+
+
+def _seconds(timestamp):
+    return time.mktime(timestamp.timetuple()) + timestamp.microsecond / 1e6
+
+
+def downsample(timestamps, columns, start, end, points):
+    # timestamps are datetimes, columns map metric names to value lists of the same length (None if missing). Empty
+    # buckets are omitted.
+    points = max(1, min(int(points), MAX_POINTS))
+    width = max(_seconds(end) - _seconds(start), 1e-6) / points
+    offsets = np.array([_seconds(t) for t in timestamps], dtype=np.float64) - _seconds(start)
+    buckets = np.minimum((offsets // width).astype(np.int64), points - 1) if len(timestamps) > 0 \
+        else np.zeros(0, dtype=np.int64)
+    used = np.unique(buckets)
+
+    res = {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "bucket_seconds": width,
+        "samples": len(timestamps),
+        "timestamps": [dt.fromtimestamp(_seconds(start) + b * width).isoformat() for b in used.tolist()],
+        "metrics": {}
+    }
+    for name, values in columns.iteritems():
+        values = np.array([float(v) if v is not None else np.nan for v in values], dtype=np.float64)
+        present = ~np.isnan(values)
+        count = np.bincount(buckets[present], minlength=points)
+        total = np.bincount(buckets[present], weights=values[present], minlength=points)
+        minimum = np.full(points, np.inf)
+        maximum = np.full(points, -np.inf)
+        np.minimum.at(minimum, buckets[present], values[present])
+        np.maximum.at(maximum, buckets[present], values[present])
+        empty = count[used] == 0
+        res["metrics"][name] = {
+            "min": [None if e else v for e, v in zip(empty, minimum[used].tolist())],
+            "max": [None if e else v for e, v in zip(empty, maximum[used].tolist())],
+            "avg": [None if e else v for e, v in zip(empty, (total[used] / np.maximum(count[used], 1)).tolist())]
+        }
+    return res
+
+
+def link_series(session, link_id, start, end, points, metrics=None):
+    metrics = LINK_METRICS if metrics is None else metrics
+    rows = session.query(store.LinkSample.sampled, *[getattr(store.LinkSample, m) for m in metrics]) \
+        .filter(store.LinkSample.link_id == link_id, store.LinkSample.sampled > start,
+                store.LinkSample.sampled <= end) \
+        .order_by(store.LinkSample.sampled).all()
+    return downsample([r[0] for r in rows], dict((m, [r[i + 1] for r in rows]) for i, m in enumerate(metrics)),
+                      start, end, points)
+
+
+def port_series(session, port_id, start, end, points, metrics=None):
+    metrics = PORT_METRICS if metrics is None else metrics
+    rows = store.port_rates(session, port_id, start, end)
+    return downsample([r.sampled for r in rows], dict((m, [getattr(r, m) for r in rows]) for m in metrics),
+                      start, end, points)
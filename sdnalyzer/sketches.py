@@ -0,0 +1,222 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Saarland University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# Contributor(s): Andreas Schmidt (Saarland University)
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# 
+# This license applies to all parts of SDNalytics that are not externally
+# maintained libraries.
+
+import hashlib
+import heapq
+import json
+import math
+import struct
+import zlib
+from array import array
+
+# Bounded-memory summaries of streams that can be merged across switches and intervals.
+
+
+def _digest(value):
+    # Hash that is stable across processes, unlike hash()
+    return hashlib.sha1(value if isinstance(value, str) else unicode(value).encode("utf-8")).digest()
+
+
+class SpaceSaving(object):
+    # Top-k summary (Metwally et al.): at most k keys are counted. A new key replaces the key with the smallest count
+    # and inherits it as overestimation error, so every count is at most the true weight plus its error and every key
+    # with a weight above total / k is kept. The smallest count is found with a heap of (count, key) entries that is
+    # pushed on every change; entries whose count is outdated are skipped when they reach the top.
+    def __init__(self, k=100):
+        self.k = k
+        self.total = 0
+        self._counts = {}  # key -> [count, error]
+        self._heap = []
+
+    def __len__(self):
+        return len(self._counts)
+
+    def _rebuild(self):
+        self._heap = [(c[0], key) for key, c in self._counts.iteritems()]
+        heapq.heapify(self._heap)
+
+    def _push(self, key):
+        heapq.heappush(self._heap, (self._counts[key][0], key))
+        if len(self._heap) > 4 * max(self.k, 16):
+            # Drops the outdated entries, at most once per 3 k changes
+            self._rebuild()
+
+    def _smallest(self):
+        while True:
+            count, key = self._heap[0]
+            if key in self._counts and self._counts[key][0] == count:
+                return key
+            heapq.heappop(self._heap)
+
+    def _minimum(self):
+        return self._counts[self._smallest()][0] if len(self._counts) == self.k else 0
+
+    def add(self, key, weight=1):
+        if weight <= 0:
+            return
+        self.total += weight
+        if key in self._counts:
+            self._counts[key][0] += weight
+        elif len(self._counts) < self.k:
+            self._counts[key] = [weight, 0]
+        else:
+            count = self._counts.pop(self._smallest())[0]
+            self._counts[key] = [count + weight, count]
+        self._push(key)
+
+    def top(self, n=None):
+        # [(key, count, error)] by descending count
+        ranked = sorted(((key, c[0], c[1]) for key, c in self._counts.iteritems()), key=lambda x: (-x[1], x[0]))
+        return ranked if n is None else ranked[:n]
+
+    def merge(self, other):
+        # Summary of both streams (Agarwal et al.); keys missing in a full summary may have had up to its minimum
+        merged = SpaceSaving(max(self.k, other.k))
+        merged.total = self.total + other.total
+        own_minimum = self._minimum()
+        other_minimum = other._minimum()
+        for key in set(self._counts) | set(other._counts):
+            count, error = self._counts.get(key, [own_minimum, own_minimum])
+            other_count, other_error = other._counts.get(key, [other_minimum, other_minimum])
+            merged._counts[key] = [count + other_count, error + other_error]
+        for key, _, _ in merged.top()[merged.k:]:
+            del merged._counts[key]
+        merged._rebuild()
+        return merged
+
+    def to_json(self):
+        return json.dumps({"k": self.k, "total": self.total, "counts": self.top()})
+
+    @staticmethod
+    def from_json(content):
+        data = json.loads(content)
+        summary = SpaceSaving(data["k"])
+        summary.total = data["total"]
+        for key, count, error in data["counts"]:
+            summary._counts[key] = [count, error]
+        summary._rebuild()
+        return summary
+
+
+class HyperLogLog(object):
+    # Distinct count estimate (Flajolet et al.) from 2 ** precision registers of one byte; the relative standard error
+    # is 1.04 / sqrt(2 ** precision), i.e. 3.25% for the default precision of 10 (1 KB).
+    def __init__(self, precision=10):
+        self.precision = precision
+        self.size = 1 << precision
+        self._registers = bytearray(self.size)
+
+    def add(self, value):
+        hashed = struct.unpack(">Q", _digest(value)[:8])[0]
+        index = hashed >> (64 - self.precision)
+        rest = hashed & ((1 << (64 - self.precision)) - 1)
+        rank = 64 - self.precision - rest.bit_length() + 1
+        if rank > self._registers[index]:
+            self._registers[index] = rank
+
+    def count(self):
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        estimate = alpha * self.size ** 2 / sum(2.0 ** -r for r in self._registers)
+        zeros = self._registers.count("\x00")
+        if estimate <= 2.5 * self.size and zeros > 0:
+            # Linear counting is more accurate for small cardinalities
+            return self.size * math.log(float(self.size) / zeros)
+        return estimate
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches of different precision.")
+        merged = HyperLogLog(self.precision)
+        merged._registers = bytearray(max(a, b) for a, b in zip(self._registers, other._registers))
+        return merged
+
+    def to_bytes(self):
+        return struct.pack(">B", self.precision) + zlib.compress(str(self._registers))
+
+    @staticmethod
+    def from_bytes(data):
+        sketch = HyperLogLog(struct.unpack(">B", data[:1])[0])
+        sketch._registers = bytearray(zlib.decompress(data[1:]))
+        return sketch
+
+
+class CountMinSketch(object):
+    # Frequency estimate (Cormode and Muthukrishnan) that never underestimates; with probability 1 - e ** -depth it
+    # overestimates by at most e / width of the total weight.
+    def __init__(self, width=1024, depth=4):
+        if depth > 5:
+            raise ValueError("A sha1 digest provides at most 5 rows.")
+        self.width = width
+        self.depth = depth
+        self.total = 0
+        self._counts = array("d", [0.0] * (width * depth))
+
+    def _cells(self, key):
+        digest = _digest(key)
+        for row in range(self.depth):
+            yield row * self.width + struct.unpack(">I", digest[4 * row:4 * row + 4])[0] % self.width
+
+    def add(self, key, weight=1):
+        self.total += weight
+        for cell in self._cells(key):
+            self._counts[cell] += weight
+
+    def estimate(self, key):
+        return min(self._counts[cell] for cell in self._cells(key))
+
+    def merge(self, other):
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError("Cannot merge count-min sketches of different dimensions.")
+        merged = CountMinSketch(self.width, self.depth)
+        merged.total = self.total + other.total
+        merged._counts = array("d", [a + b for a, b in zip(self._counts, other._counts)])
+        return merged
+
+    def to_bytes(self):
+        return struct.pack(">IId", self.width, self.depth, self.total) + zlib.compress(self._counts.tostring())
+
+    @staticmethod
+    def from_bytes(data):
+        width, depth, total = struct.unpack(">IId", data[:16])
+        sketch = CountMinSketch(width, depth)
+        sketch.total = total
+        sketch._counts = array("d")
+        sketch._counts.fromstring(zlib.decompress(data[16:]))
+        return sketch
+
+
+# Sketches the observer keeps per time bucket (see observer.cardinality):
+# peers: distinct MAC addresses a host (subject: its MAC) exchanged flows with
+# clients: distinct IP addresses using a service (subject: e.g. tcp/80)
+# flows: distinct flows installed on a switch (subject: its device id)
+# usage: bytes per "<MAC> consumes|provides <service>" in the fabric (subject: NULL)
+SKETCH_TYPES = {
+    "peers": HyperLogLog,
+    "clients": HyperLogLog,
+    "flows": HyperLogLog,
+    "usage": CountMinSketch
+}
@@ -0,0 +1,131 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Saarland University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# Contributor(s): Andreas Schmidt (Saarland University)
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# 
+# This license applies to all parts of SDNalytics that are not externally
+# maintained libraries.
+
+import io
+import json
+from collections import OrderedDict
+from threading import Lock
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import aliased
+
+import sdnalyzer.monitoring as monitoring
+from sdnalyzer.store import SampleTimestamp, Node, NodeSample, Link, LinkSample
+
+# Topology at a sample timestamp for network maps: the switches with their centrality and the links between them with
+# their latest metrics. Nodes are listed once and links refer to them by position. A snapshot is built with two
+# queries and serialized at most once per format; snapshots of past timestamps never change, so they are cached.
+
+FORMATS = {
+    "json": "application/json",
+    "npz": "application/octet-stream"  # numpy arrays of the columns, see numpy.load
+}
+
+NODE_COLUMNS = ["id", "device_id", "degree", "betweenness", "closeness"]
+LINK_COLUMNS = ["id", "src", "dst", "src_port", "dst_port", "betweenness", "src_packet_loss", "dst_packet_loss",
+                "src_transmit_data_rate", "dst_transmit_data_rate", "src_delay", "dst_delay"]
+
+_lookups = monitoring.registry.counter("sdnalytics_topology_snapshot_lookups_total",
+                                       "Topology snapshot requests by whether the serialized snapshot was cached.",
+                                       ["result"])
+
+
+def sample_timestamp(session, timestamp=None):
+    # Newest sample timestamp at or before timestamp (or at all); only recorded once the post processing completed
+    query = session.query(func.max(SampleTimestamp.timestamp))
+    if timestamp is not None:
+        query = query.filter(SampleTimestamp.timestamp <= timestamp)
+    return query.scalar()
+
+
+def build(session, timestamp):
+    nodes = session.query(Node.id, Node.device_id, NodeSample.degree, NodeSample.betweenness, NodeSample.closeness) \
+        .join(NodeSample, NodeSample.node_id == Node.id).filter(NodeSample.sampled == timestamp) \
+        .order_by(Node.device_id).all()
+    position = dict((node[0], i) for i, node in enumerate(nodes))
+
+    src = aliased(Node)
+    dst = aliased(Node)
+    links = session.query(Link.id, src.id, dst.id, Link.src_port, Link.dst_port, LinkSample.betweenness,
+                          LinkSample.src_packet_loss, LinkSample.dst_packet_loss, LinkSample.src_transmit_data_rate,
+                          LinkSample.dst_transmit_data_rate, LinkSample.src_delay, LinkSample.dst_delay) \
+        .join(LinkSample, LinkSample.link_id == Link.id) \
+        .join(src, Link.src_id == src.id) \
+        .join(dst, Link.dst_id == dst.id) \
+        .filter(LinkSample.sampled == timestamp).order_by(Link.id).all()
+
+    return {
+        "timestamp": timestamp.isoformat(),
+        "nodes": [dict(zip(NODE_COLUMNS, node)) for node in nodes],
+        "links": [dict(zip(LINK_COLUMNS, (link[0], position[link[1]], position[link[2]]) + tuple(link[3:])))
+                  for link in links if link[1] in position and link[2] in position]
+    }
+
+
+def serialize(document, fmt):
+    if fmt == "json":
+        return json.dumps(document, separators=(",", ":"))
+
+    arrays = {"timestamp": np.array(document["timestamp"])}
+    tables = [("node_", NODE_COLUMNS, document["nodes"]), ("link_", LINK_COLUMNS, document["links"])]
+    for prefix, columns, rows in tables:
+        for column in columns:
+            values = [row[column] for row in rows]
+            if column == "device_id":
+                arrays[prefix + column] = np.array(values, dtype=str)
+            elif column in ("id", "src", "dst"):
+                arrays[prefix + column] = np.array(values, dtype=np.int64)
+            else:
+                arrays[prefix + column] = np.array([float(v) if v is not None else np.nan for v in values],
+                                                   dtype=np.float64)
+    buf = io.BytesIO()
+    np.savez_compressed(buf, **arrays)
+    return buf.getvalue()
+
+
+class TopologySnapshots(object):
+    # Least recently used cache of serialized snapshots by sample timestamp
+    def __init__(self, capacity=32):
+        self.capacity = capacity
+        self._entries = OrderedDict()  # timestamp -> (document, {format: serialized})
+        self._lock = Lock()
+
+    def get(self, session, timestamp, fmt="json"):
+        with self._lock:
+            entry = self._entries.pop(timestamp, None)
+            if entry is None:
+                entry = (build(session, timestamp), {})
+            if fmt in entry[1]:
+                _lookups.inc(result="hit")
+            else:
+                _lookups.inc(result="miss")
+                entry[1][fmt] = serialize(entry[0], fmt)
+            self._entries[timestamp] = entry
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+            return entry[1][fmt]
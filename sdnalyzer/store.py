@@ -26,7 +26,8 @@
 # maintained libraries.
 
 import logging
-from sqlalchemy import Table, Column, Integer, String, DateTime, ForeignKey, Float, Numeric, Text
+from sqlalchemy import Table, Column, Integer, String, DateTime, ForeignKey, Float, Numeric, Text, LargeBinary, \
+    Boolean, Index, MetaData, bindparam, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, relationship
@@ -38,10 +39,18 @@ Base = declarative_base()
 class SampleTimestamp(Base):
     __tablename__ = "sample_timestamp"
     id = Column(Integer, primary_key=True)  # auto increment identifier
-    timestamp = Column(DateTime(timezone=False))
+    timestamp = Column(DateTime(timezone=False), index=True)
     interval = Column(Numeric)
 
 
+class ShardRun(Base):
+    # Topology run of an observer shard whose samples are written; shard 0 completes the run once all shards did
+    __tablename__ = "shard_run"
+    id = Column(Integer, primary_key=True)  # auto increment identifier
+    timestamp = Column(DateTime(timezone=False), index=True)
+    shard = Column(Integer)
+
+
 internet_address_association = Table("internet_address_association", Base.metadata,
                                    Column("node_id", Integer, ForeignKey("node.id")),
                                    Column("address_id", Integer, ForeignKey("internet_address.id")))
@@ -135,6 +144,9 @@ class Flow(Base):
     node_id = Column(Integer, ForeignKey("node.id"))
     node = relationship(Node)
 
+    # last poll that reported the flow; later than the newest sample if its counters did not change since
+    last_sampled = Column(DateTime(timezone=False))
+
     samples = relationship("FlowSample", backref="flow")
 
 
@@ -154,6 +166,27 @@ class FlowSample(Base):
     flow_id = Column(Integer, ForeignKey("flow.id"))
 
 
+class FlowLifetime(Base):
+    # Period in which a flow was installed on its switch, written by the observer in flow lifecycle mode
+    __tablename__ = "flow_lifetime"
+    id = Column(Integer, primary_key=True)  # auto increment identifier
+
+    started = Column(DateTime(timezone=False))  # first poll that reported the flow
+    last_seen = Column(DateTime(timezone=False))  # last poll that reported the flow
+    ended = Column(DateTime(timezone=False))  # first poll of the switch without the flow, NULL while active
+
+    # counters when the flow appeared, replaced by the counters of the last poll once it ended
+    packet_count = Column(Integer)
+    byte_count = Column(Integer)
+    duration_seconds = Column(Integer)
+    priority = Column(Numeric)
+    idle_timeout_sec = Column(Numeric)
+    hard_timeout_sec = Column(Numeric)
+
+    flow_id = Column(Integer, ForeignKey("flow.id"), index=True)
+    flow = relationship(Flow, backref="lifetimes")
+
+
 class Link(Base):
     __tablename__ = "link"
     id = Column(Integer, primary_key=True)  # auto increment identifier
@@ -200,6 +233,24 @@ class LinkSample(Base):
     link_id = Column(Integer, ForeignKey("link.id"))
     link = relationship(Link)
 
+    __table_args__ = (Index("ix_link_sample_link_id_sampled", "link_id", "sampled"),)
+
+
+class LinkAnomaly(Base):
+    # Link metric that deviated from its moving average when it was sampled, see observer.anomalies
+    __tablename__ = "link_anomaly"
+    id = Column(Integer, primary_key=True)  # auto increment identifier
+
+    detected = Column(DateTime(timezone=False), index=True)  # time of the sample
+
+    metric = Column(String(50))  # column of the link sample
+    value = Column(Float)
+    expected = Column(Float)  # moving average before the sample
+    deviation = Column(Float)  # in moving standard deviations
+
+    link_id = Column(Integer, ForeignKey("link.id"))
+    link = relationship(Link)
+
 
 class Port(Base):
     __tablename__ = "port"
@@ -211,6 +262,8 @@ class Port(Base):
     # datetime information
     created = Column(DateTime(timezone=False))
     last_seen = Column(DateTime(timezone=False))
+    # last poll that reported the counters; later than the newest sample if the counters did not change since
+    last_sampled = Column(DateTime(timezone=False))
 
     samples = relationship("PortSample")
 
@@ -240,6 +293,110 @@ class PortSample(Base):
     port_id = Column(Integer, ForeignKey("port.id"))
     port = relationship(Port)
 
+    __table_args__ = (Index("ix_port_sample_port_id_sampled", "port_id", "sampled"),)
+
+
+# View deriving rates and counter deltas per port and interval between consecutive samples; created by init().
+# Rates are NULL for intervals in which a counter was reset (decreased).
+port_rate = Table("port_rate", MetaData(),
+                  Column("id", Integer, primary_key=True),  # id of the port sample ending the interval
+                  Column("port_id", Integer),
+                  Column("previous_sampled", DateTime(timezone=False)),
+                  Column("sampled", DateTime(timezone=False)),
+                  Column("interval_seconds", Float),
+                  Column("transmit_bps", Float),
+                  Column("receive_bps", Float),
+                  Column("transmit_pps", Float),
+                  Column("receive_pps", Float),
+                  Column("transmit_dropped", Numeric),
+                  Column("receive_dropped", Numeric),
+                  Column("transmit_errors", Numeric),
+                  Column("receive_errors", Numeric),
+                  Column("counter_reset", Boolean))
+
+_PORT_RATE_COUNTERS = ["transmit_bytes", "receive_bytes", "transmit_packets", "receive_packets", "transmit_dropped",
+                       "receive_dropped", "transmit_errors", "receive_errors"]
+
+
+def _window_functions(dialect):
+    # lag() over a named window needs SQLite 3.28
+    return dialect.name != "sqlite" or dialect.dbapi.sqlite_version_info >= (3, 28, 0)
+
+
+def _consecutive_samples(dialect, source):
+    # Port samples of source with the counters of the previous sample of their port
+    if _window_functions(dialect):
+        return """SELECT id, port_id, sampled, {counters},
+             lag(sampled) OVER w AS previous_sampled, {previous}
+      FROM {source} AS port_samples
+      WINDOW w AS (PARTITION BY port_id ORDER BY sampled)""".format(
+            source=source,
+            counters=", ".join(_PORT_RATE_COUNTERS),
+            previous=", ".join("lag({0}) OVER w AS previous_{0}".format(c) for c in _PORT_RATE_COUNTERS))
+    return """SELECT s.id, s.port_id, s.sampled, {counters},
+             p.sampled AS previous_sampled, {previous}
+      FROM {source} AS s JOIN {source} AS p ON p.port_id = s.port_id AND p.sampled = (
+          SELECT max(e.sampled) FROM {source} AS e WHERE e.port_id = s.port_id AND e.sampled < s.sampled)""".format(
+        source=source,
+        counters=", ".join("s." + c for c in _PORT_RATE_COUNTERS),
+        previous=", ".join("p.{0} AS previous_{0}".format(c) for c in _PORT_RATE_COUNTERS))
+
+
+def _port_rate_select(dialect, source="port_sample"):
+    if dialect.name == "postgresql":
+        interval = "EXTRACT(EPOCH FROM (sampled - previous_sampled))"
+    else:
+        interval = "((julianday(sampled) - julianday(previous_sampled)) * 86400.0)"
+    delta = lambda c: "({0} - previous_{0})".format(c)
+    reset = " OR ".join("{} < 0".format(delta(c)) for c in _PORT_RATE_COUNTERS[:4])
+    rate = lambda c, factor: "CASE WHEN {0} OR {1} <= 0 THEN NULL ELSE {2} * {3} / {1} END".format(
+        reset, interval, delta(c), factor)
+    counter = lambda c: "CASE WHEN {0} < 0 THEN NULL ELSE {0} END".format(delta(c))
+    return """SELECT id, port_id, previous_sampled, sampled,
+       {interval} AS interval_seconds,
+       {transmit_bps} AS transmit_bps,
+       {receive_bps} AS receive_bps,
+       {transmit_pps} AS transmit_pps,
+       {receive_pps} AS receive_pps,
+       {transmit_dropped} AS transmit_dropped,
+       {receive_dropped} AS receive_dropped,
+       {transmit_errors} AS transmit_errors,
+       {receive_errors} AS receive_errors,
+       CASE WHEN {reset} THEN 1 ELSE 0 END AS counter_reset
+FROM ({samples}) AS samples
+WHERE previous_sampled IS NOT NULL""".format(
+        interval=interval,
+        transmit_bps=rate("transmit_bytes", 8.0), receive_bps=rate("receive_bytes", 8.0),
+        transmit_pps=rate("transmit_packets", 1.0), receive_pps=rate("receive_packets", 1.0),
+        transmit_dropped=counter("transmit_dropped"), receive_dropped=counter("receive_dropped"),
+        transmit_errors=counter("transmit_errors"), receive_errors=counter("receive_errors"),
+        reset=reset,
+        samples=_consecutive_samples(dialect, source))
+
+
+def _port_rate_view(dialect):
+    return "CREATE VIEW port_rate AS\n" + _port_rate_select(dialect)
+
+
+def port_rates(session, port_id, start=None, end=None):
+    # Rate history of a port. The rates are derived from the samples of the range only, plus the sample before its
+    # start for the first interval, instead of filtering the view over all samples.
+    conditions = ["port_id = :port_id"]
+    parameters = [bindparam("port_id", port_id, type_=Integer)]
+    if start is not None:
+        conditions.append("sampled >= coalesce((SELECT max(sampled) FROM port_sample "
+                          "WHERE port_id = :port_id AND sampled <= :start), :start)")
+        parameters.append(bindparam("start", start, type_=DateTime(timezone=False)))
+    if end is not None:
+        conditions.append("sampled <= :end")
+        parameters.append(bindparam("end", end, type_=DateTime(timezone=False)))
+    source = "(SELECT * FROM port_sample WHERE {})".format(" AND ".join(conditions))
+    statement = _port_rate_select(session.bind.dialect, source)
+    if start is not None:
+        statement += " AND sampled > :start"
+    statement = text(statement + " ORDER BY sampled").bindparams(*parameters).columns(*port_rate.columns)
+    return session.execute(statement).fetchall()
+
 
 class Report(Base):
     __tablename__ = "report"
@@ -255,11 +412,71 @@ class Report(Base):
 
     execution_duration = Column(Numeric)
 
+    # type and hash of the analyzed samples, see AnalysisTask._input_key; a run with the same key reuses the report
+    input_key = Column(String(200), index=True)
+
     content = Column(Text)
 
 
+class Profile(Base):
+    __tablename__ = "profile"
+    id = Column(Integer, primary_key=True)  # auto increment identifier
+
+    created = Column(DateTime(timezone=False))
+
+    statistics = Column(LargeBinary)  # marshalled pstats data
+    statements = Column(Text)  # JSON list of SQL statements with count and timing
+
+    report_id = Column(Integer, ForeignKey("report.id"), unique=True)
+    report = relationship(Report, backref="profile")
+
+
+class HeavyHitterSummary(Base):
+    # Space-Saving summary of the bytes per flow of a switch, or of the fabric if node_id is NULL, in an interval
+    __tablename__ = "heavy_hitter_summary"
+    id = Column(Integer, primary_key=True)  # auto increment identifier
+
+    interval_start = Column(DateTime(timezone=False))
+    interval_end = Column(DateTime(timezone=False))
+
+    node_id = Column(Integer, ForeignKey("node.id"))
+    node = relationship(Node)
+
+    content = Column(Text)  # see sketches.SpaceSaving.to_json
+
+    __table_args__ = (Index("ix_heavy_hitter_summary_node_id_interval_end", "node_id", "interval_end"),)
+
+
+class Sketch(Base):
+    # Serialized cardinality or frequency sketch of a time bucket, see sketches and observer.cardinality
+    __tablename__ = "sketch"
+    id = Column(Integer, primary_key=True)  # auto increment identifier
+
+    name = Column(String(50))  # what is counted, e.g. peers
+    subject = Column(String(100))  # whose values are counted, e.g. the MAC of a host; NULL for the fabric
+
+    bucket_start = Column(DateTime(timezone=False))
+    bucket_end = Column(DateTime(timezone=False))
+
+    data = Column(LargeBinary)
+
+    __table_args__ = (Index("ix_sketch_name_subject_bucket_end", "name", "subject", "bucket_end"),)
+
+
+def link_name(src_device_id, src_port, dst_device_id, dst_port):
+    # Readable identifier of a link that does not depend on the row id
+    return "{}-{}.{}-{}".format(src_device_id, src_port, dst_device_id, dst_port)
+
+
+def _create_engine():
+    if connection_string.startswith("sqlite"):
+        # sessions of the observer threads are garbage collected in other threads
+        return create_engine(connection_string, connect_args={"check_same_thread": False})
+    return create_engine(connection_string)
+
+
 def get_session():
-    engine = create_engine(connection_string)
+    engine = _create_engine()
     Base.metadata.bind = engine
     session = sessionmaker(bind=engine)()
     return session
@@ -270,13 +487,40 @@ def start(conn_string):
     connection_string = conn_string
 
 
+def _add_missing_columns(engine, inspector, table):
+    existing = set(column["name"] for column in inspector.get_columns(table.name))
+    for column in table.columns:
+        if column.name in existing:
+            continue
+        if not column.nullable or column.primary_key or column.foreign_keys:
+            raise Exception("Column {}.{} cannot be added to the existing table; a reset of the store is required "
+                            "(sdnalyzer reset).".format(table.name, column.name))
+        logging.info("Add column {}.{} to the store.".format(table.name, column.name))
+        quote = engine.dialect.identifier_preparer.quote
+        engine.execute("ALTER TABLE {} ADD COLUMN {} {}".format(
+            quote(table.name), quote(column.name), column.type.compile(dialect=engine.dialect)))
+
+
 def init():
     logging.debug("Create store database via ORM.")
-    engine = create_engine(connection_string)
+    engine = _create_engine()
     Base.metadata.create_all(engine)
 
+    # create_all neither adds columns nor indexes to tables of earlier versions
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        _add_missing_columns(engine, inspector, table)
+        existing = set(index["name"] for index in inspector.get_indexes(table.name))
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(engine)
+
+    if "port_rate" not in inspector.get_view_names():
+        engine.execute(_port_rate_view(engine.dialect))
+
 
 def drop():
     logging.debug("Drop store database via ORM.")
-    engine = create_engine(connection_string)
+    engine = _create_engine()
+    engine.execute("DROP VIEW IF EXISTS port_rate")
     Base.metadata.drop_all(engine)
\ No newline at end of file
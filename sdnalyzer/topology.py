@@ -26,11 +26,12 @@
 # maintained libraries.
 
 from store import NodeSample, LinkSample
-import graph_tool as gt
 
 
 class NetworkTopology:
     def __init__(self, session, now):
+        import graph_tool as gt
+
         self.nodes = {}
         self.node_information = {}
 
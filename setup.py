@@ -33,7 +33,7 @@ if hasattr(os, "link"):
 
 setup(name="sdnalyzer",
       version="2015.8.0",
-      packages=find_packages(),
+      packages=find_packages(exclude=["tests", "tests.*"]),
       description="Analytics toolchain for Software Defined Networks.",
       author="Andreas Schmidt",
       author_email="schmidt@nt.uni-saarland.de",
@@ -42,7 +42,8 @@ setup(name="sdnalyzer",
           "console_scripts": [
               "sdn-ctl=sdnalyzer.command_line:main",
               "sdn-analyze=sdnalyzer.command_line:analyze",
-              "sdn-observe=sdnalyzer.command_line:observe"
+              "sdn-observe=sdnalyzer.command_line:observe",
+              "sdn-benchmark=sdnalyzer.command_line:benchmark"
           ]
       },
       install_requires=["flask==0.10.1", "pandas==0.15.2", "psycopg2==2.5.4", "sqlalchemy==0.9.9", "scipy==0.13.3"]
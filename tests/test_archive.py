@@ -0,0 +1,110 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Saarland University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# Contributor(s): Andreas Schmidt (Saarland University)
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# 
+# This license applies to all parts of SDNalytics that are not externally
+# maintained libraries.
+
+import os
+from datetime import datetime as dt, timedelta
+
+from sdnalyzer.analyzer.reliability import LinkImprovementAnalysis, LinkReliabilityStatistics
+from sdnalyzer.archive import Archiver, archived_days, day_path
+from sdnalyzer.store import Link, LinkSample, Node, NodeSample, SampleTimestamp
+from tests.helpers import StoreTestCase
+
+
+class ArchiverTest(StoreTestCase):
+    def setUp(self):
+        StoreTestCase.setUp(self)
+        self.archive = os.path.join(self.directory, "archive")
+        self.first = dt(2015, 8, 1).date()
+        node = Node(device_id="00:00:00:00:00:00:00:01", type="switch")
+        self.session.add(node)
+        self.session.flush()
+        self.node_id = node.id
+        for day in range(3):
+            self._sample(day)
+
+    def _sample(self, day, hour=12):
+        self.session.add(NodeSample(node_id=self.node_id, degree=day,
+                                    sampled=dt.combine(self.first + timedelta(days=day), dt.min.time()) +
+                                    timedelta(hours=hour)))
+        self.session.commit()
+
+    def _modified(self, day):
+        return os.path.getmtime(day_path(self.archive, "node_sample", self.first + timedelta(days=day)))
+
+    def test_run_resumes_at_the_newest_archived_day(self):
+        until = self.first + timedelta(days=3)
+        Archiver(self.archive).run(until)
+        self.assertEqual([self.first + timedelta(days=d) for d in range(3)], archived_days(self.archive, "node_sample"))
+
+        for day in range(3):
+            os.utime(day_path(self.archive, "node_sample", self.first + timedelta(days=day)), (0, 0))
+        self._sample(2, hour=13)
+        Archiver(self.archive).run(until)
+
+        # the first days are not written again, the newest one gets the late sample
+        self.assertEqual([0, 0], [self._modified(d) for d in range(2)])
+        self.assertNotEqual(0, self._modified(2))
+
+    def test_covered_days_are_deleted_without_writing(self):
+        until = self.first + timedelta(days=3)
+        Archiver(self.archive).run(until)
+        os.utime(day_path(self.archive, "node_sample", self.first + timedelta(days=2)), (0, 0))
+        Archiver(self.archive, delete=True).run(until)
+
+        self.assertEqual(0, self._modified(2))
+        self.assertEqual(0, self.session.query(NodeSample).count())
+
+
+class RemovedLinkTest(StoreTestCase):
+    def setUp(self):
+        StoreTestCase.setUp(self)
+        self.archive = os.path.join(self.directory, "archive")
+        switch = Node(device_id="00:00:00:00:00:00:00:01", type="switch")
+        host = Node(device_id="00:00:0a:00:00:00:00:01", type="host")
+        link = Link(src=switch, src_port=1, dst=host, dst_port=0)
+        self.session.add(link)
+        self.session.flush()
+        self.session.add(LinkSample(link_id=link.id, sampled=dt(2015, 8, 2, 6), src_packet_loss=0.25))
+        self.session.add(SampleTimestamp(timestamp=dt(2015, 8, 2, 6), interval=30))
+        self.session.commit()
+        Archiver(self.archive, delete=True).run(dt(2015, 8, 3).date())
+        # the link is removed after its samples were archived
+        self.session.delete(self.session.query(Link).one())
+        self.session.commit()
+
+    def _analyze(self, task):
+        task.archive_directory = self.archive
+        task.window_end = dt(2015, 8, 2, 12)
+        task._analyze(self.session)
+        return task.result
+
+    def test_removed_links_are_named_from_the_archive(self):
+        series = self._analyze(LinkReliabilityStatistics())["linkSeries"]
+        self.assertEqual([("00:00:00:00:00:00:00:01-1.00:00:0a:00:00:00:00:01-0", 0.75, True)],
+                         [(s["link_id"], s["ratio"], s["last_mile"]) for s in series])
+        series = self._analyze(LinkImprovementAnalysis())["series"]
+        self.assertEqual(["00:00:00:00:00:00:00:01-1.00:00:0a:00:00:00:00:01-0"], [s["link_id"] for s in series])
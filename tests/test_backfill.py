@@ -0,0 +1,80 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Saarland University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# Contributor(s): Andreas Schmidt (Saarland University)
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# 
+# This license applies to all parts of SDNalytics that are not externally
+# maintained libraries.
+
+import unittest
+from datetime import datetime as dt, timedelta
+
+from sdnalyzer.analyzer.backfill import parse_step, window_ends
+from sdnalyzer.analyzer.services import SimpleServiceUsage
+from sdnalyzer.store import Flow, FlowSample, Node, SampleTimestamp
+from tests.helpers import StoreTestCase
+
+
+class WindowEndsTest(unittest.TestCase):
+    def test_windows_end_after_the_start_up_to_the_end(self):
+        start = dt(2015, 8, 1)
+        self.assertEqual([start + timedelta(hours=h) for h in (6, 12, 18, 24)],
+                         window_ends(start, start + timedelta(days=1), parse_step("6h")))
+        self.assertEqual([start + timedelta(hours=6)], window_ends(start, start + timedelta(hours=11), parse_step("6h")))
+
+
+class ServiceUsageWindowTest(StoreTestCase):
+    def setUp(self):
+        StoreTestCase.setUp(self)
+        self.end = dt(2015, 8, 1, 12)
+        self.host = "00:00:00:00:00:00:00:0a"
+        switch = Node(device_id="00:00:00:00:00:00:00:01", type="switch")
+        self.session.add_all([switch, Node(device_id=self.host, type="host")])
+        self.session.flush()
+        for minutes in range(-120, 65, 5):
+            self.session.add(SampleTimestamp(timestamp=self.end + timedelta(minutes=minutes), interval=300))
+        self.switch_id = switch.id
+
+    def _flow(self, created, last_sampled):
+        flow = Flow(created=created, last_sampled=last_sampled, node_id=self.switch_id, network_protocol=6,
+                    data_layer_source=self.host[6:], data_layer_destination="00:00:00:00:00:0b",
+                    transport_source=40000, transport_destination=80)
+        self.session.add(flow)
+        self.session.flush()
+        self.session.add(FlowSample(flow_id=flow.id, sampled=created, byte_count=1, packet_count=1))
+
+    def _consumed(self):
+        self.session.commit()
+        task = SimpleServiceUsage()
+        task.window_end = self.end
+        task.run()
+        return task.devices[self.host]["consumes"]["tcp"][80]
+
+    def test_idle_flow_is_counted_up_to_the_window_end(self):
+        # still reported after the window end; 12 sample timestamps in the window, counted in pairs
+        self._flow(self.end - timedelta(hours=3), self.end + timedelta(minutes=30))
+        self.assertEqual(6, self._consumed())
+
+    def test_flows_created_after_the_window_end_are_ignored(self):
+        self._flow(self.end - timedelta(hours=3), self.end + timedelta(minutes=30))
+        self._flow(self.end + timedelta(minutes=10), self.end + timedelta(minutes=30))
+        self.assertEqual(6, self._consumed())
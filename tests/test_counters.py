@@ -0,0 +1,59 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Saarland University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# Contributor(s): Andreas Schmidt (Saarland University)
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# 
+# This license applies to all parts of SDNalytics that are not externally
+# maintained libraries.
+
+import unittest
+
+from sdnalyzer.observer.cardinality import CardinalityTracker
+from sdnalyzer.observer.counters import ByteDeltas
+from sdnalyzer.observer.heavyhitters import HeavyHitterTracker
+
+
+def _flow(byte_count, node_id=1):
+    return {"byte_count": str(byte_count), "node_id": node_id, "data_layer_source": "00:01",
+            "data_layer_destination": "00:02", "network_protocol": 6, "transport_source": 40000,
+            "transport_destination": 80, "network_source": "10.0.0.1", "network_destination": "10.0.0.2"}
+
+
+class ByteDeltasTest(unittest.TestCase):
+    def test_first_poll_is_the_baseline(self):
+        deltas = ByteDeltas()
+        self.assertEqual({}, deltas.update({1: _flow(100)}))
+        self.assertEqual({1: 50}, deltas.update({1: _flow(150)}))
+
+    def test_new_and_reset_flows_count_all_bytes(self):
+        deltas = ByteDeltas()
+        deltas.update({1: _flow(100)})
+        self.assertEqual({1: 30, 2: 70}, deltas.update({1: _flow(30), 2: _flow(70)}))
+
+    def test_trackers_see_the_same_deltas(self):
+        heavy_hitters = HeavyHitterTracker(k=10)
+        cardinality = CardinalityTracker(width=64, depth=2)
+        for byte_count in (100, 250, 400):
+            for tracker in (heavy_hitters, cardinality):
+                tracker("SwitchStatFlowQuery", None, {7: _flow(byte_count)})
+        self.assertEqual([(7, 300, 0)], heavy_hitters._fabric.top())
+        self.assertEqual(300, cardinality._usage.estimate("00:01 consumes tcp/80"))
@@ -0,0 +1,96 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Saarland University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# Contributor(s): Andreas Schmidt (Saarland University)
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# 
+# This license applies to all parts of SDNalytics that are not externally
+# maintained libraries.
+
+from datetime import datetime as dt, timedelta
+
+import sdnalyzer.store as store
+from sdnalyzer.store import Node, Port, PortSample
+from sdnalyzer.observer.sensors.floodlightControllerSensor import JsonQuery, SwitchStatPortQuery
+from tests.helpers import StoreTestCase
+
+
+class DedupRateTest(StoreTestCase):
+    def setUp(self):
+        StoreTestCase.setUp(self)
+        self.start = dt(2015, 8, 1, 12)
+        switch = Node(device_id="00:00:00:00:00:00:00:01", type="switch")
+        self.session.add(switch)
+        self.session.flush()
+        self.port = Port(node_id=switch.id, port_number=1, hardware_address="00:00:00:00:00:01", created=self.start)
+        self.session.add(self.port)
+        self.session.commit()
+        self.query = SwitchStatPortQuery(30, controllers=[("localhost", 8080)])
+        self.query.dedup = True
+
+    def _poll(self, poll, transmit_bytes):
+        counters = dict((key, 0) for key in SwitchStatPortQuery.counter_keys)
+        counters.update(portNumber=1, transmitBytes=transmit_bytes)
+        now = self.start + timedelta(seconds=30 * poll)
+        self.query._process(self.session, now, {"00:00:00:00:00:00:00:01": {"port": [counters]}})
+        self.session.commit()
+        self.session.expire_all()
+        samples = JsonQuery._latest_port_samples(self.session, self.session.query(Port).one())
+        if len(samples) < 2:
+            return None
+        return JsonQuery._calculate_data_rate(samples[1], samples[0], "tx")
+
+    def test_unchanged_counters_are_carried_forward(self):
+        self.assertIsNone(self._poll(0, 1000))
+        self.assertEqual(0, self._poll(1, 1000))
+        self.assertEqual(0, self._poll(2, 1000))
+        self.assertEqual(1, self.session.query(PortSample).count())
+
+    def test_rate_after_idle_polls_covers_one_interval(self):
+        for poll in range(4):
+            self._poll(poll, 1000)
+        # 3000 bytes in the 30 seconds since the previous poll, not in the 120 seconds since the stored sample
+        self.assertEqual(3000 * 8 // 30, self._poll(4, 4000))
+        self.assertEqual([self.start, self.start + timedelta(seconds=90), self.start + timedelta(seconds=120)],
+                         [s.sampled for s in self.session.query(PortSample).order_by(PortSample.sampled)])
+
+    def test_bulk_lookup_matches_single_lookup(self):
+        for poll, transmit_bytes in enumerate([1000, 1000, 1000, 4000, 4000]):
+            self._poll(poll, transmit_bytes)
+        port = self.session.query(Port).one()
+        single = JsonQuery._latest_port_samples(self.session, port)
+        bulk = JsonQuery._latest_port_samples_bulk(self.session, [port.id])[port.id]
+        self.assertEqual([(s.sampled, s.transmit_bytes) for s in single],
+                         [(s.sampled, s.transmit_bytes) for s in bulk])
+
+    def test_bulk_lookup_without_window_functions(self):
+        for poll, transmit_bytes in enumerate([1000, 2000, 2000, 4000]):
+            self._poll(poll, transmit_bytes)
+        port = self.session.query(Port).one()
+        window_functions = store._window_functions
+        store._window_functions = lambda dialect: False
+        try:
+            fallback = JsonQuery._latest_port_samples_bulk(self.session, [port.id])[port.id]
+        finally:
+            store._window_functions = window_functions
+        bulk = JsonQuery._latest_port_samples_bulk(self.session, [port.id])[port.id]
+        self.assertEqual([(s.sampled, s.transmit_bytes) for s in bulk],
+                         [(s.sampled, s.transmit_bytes) for s in fallback])
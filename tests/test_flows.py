@@ -0,0 +1,100 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Saarland University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# Contributor(s): Andreas Schmidt (Saarland University)
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# 
+# This license applies to all parts of SDNalytics that are not externally
+# maintained libraries.
+
+from datetime import datetime as dt, timedelta
+
+from sdnalyzer.observer.sensors.floodlightControllerSensor import SwitchStatFlowQuery
+from sdnalyzer.store import Flow, FlowLifetime, FlowSample, Node
+from tests.helpers import StoreTestCase
+
+SWITCHES = ["00:00:00:00:00:00:00:01", "00:00:00:00:00:00:00:02"]
+
+
+def _flow(cookie, byte_count):
+    return {"cookie": str(cookie), "priority": "1", "idleTimeoutSec": "5", "hardTimeoutSec": "0",
+            "durationSeconds": "30", "packetCount": str(byte_count // 100), "byteCount": str(byte_count),
+            "match": {"eth_type": "2048", "eth_src": "0a:00:00:00:00:01", "eth_dst": "0a:00:00:00:00:02",
+                      "ipv4_src": "10.0.0.1", "ipv4_dst": "10.0.0.2", "ip_proto": "6", "in_port": "1",
+                      "tcp_src": "40000", "tcp_dst": "80"}}
+
+
+class FlowQueryTest(StoreTestCase):
+    def setUp(self):
+        StoreTestCase.setUp(self)
+        self.start = dt(2015, 8, 1, 12)
+        self.session.add_all([Node(device_id=device_id, type="switch") for device_id in SWITCHES])
+        self.session.commit()
+        self.query = SwitchStatFlowQuery(30, controllers=[("localhost", 8080)])
+        self.query.chunk_size = 1
+
+    def _poll(self, poll, flows):
+        # flows maps device ids to (cookie, byte count) pairs
+        now = self.start + timedelta(seconds=30 * poll)
+        data = dict((device_id, {"flows": [_flow(*f) for f in reported]}) for device_id, reported in flows.iteritems())
+        records = self.query.process(self.session, now, data)
+        self.session.commit()
+        return records
+
+    def test_records_are_keyed_by_flow_id_across_chunks(self):
+        self.query.listeners.append(lambda query, now, records: None)
+        records = self._poll(0, {SWITCHES[0]: [(1, 1000)], SWITCHES[1]: [(2, 2000)]})
+        flows = dict((int(fl.cookie), fl.id) for fl in self.session.query(Flow))
+        self.assertEqual({flows[1]: "1000", flows[2]: "2000"},
+                         dict((flow_id, record["byte_count"]) for flow_id, record in records.iteritems()))
+
+    def test_no_records_without_listeners(self):
+        self.assertIsNone(self._poll(0, {SWITCHES[0]: [(1, 1000)]}))
+
+    def test_unchanged_new_flow_is_not_sampled_again(self):
+        self.query.dedup = True
+        for poll in range(3):
+            self._poll(poll, {SWITCHES[0]: [(1, 1000)]})
+        self.assertEqual(1, self.session.query(FlowSample).count())
+        self.assertEqual(self.start + timedelta(seconds=60), self.session.query(Flow).one().last_sampled)
+
+    def _ended(self):
+        return dict((int(cookie), ended) for cookie, ended in self.session.query(Flow.cookie, FlowLifetime.ended)
+                    .join(FlowLifetime, FlowLifetime.flow_id == Flow.id))
+
+    def test_flows_of_missing_switches_end(self):
+        self.query.lifecycle = True
+        self._poll(0, {SWITCHES[0]: [(1, 1000)], SWITCHES[1]: [(2, 2000)]})
+        self._poll(1, {SWITCHES[0]: [(1, 1000)]})
+        self.assertEqual({1: None, 2: self.start + timedelta(seconds=30)}, self._ended())
+
+    def test_shards_keep_the_flows_of_switches_they_do_not_poll(self):
+        self.query.lifecycle = True
+        self._poll(0, {SWITCHES[0]: [(1, 1000)], SWITCHES[1]: [(2, 2000)]})
+        # another shard restarts and only polls the first switch
+        shard = SwitchStatFlowQuery(30, controllers=[("localhost", 8080)])
+        shard.lifecycle = True
+        shard.concurrent_writers = True
+        self.query = shard
+        self._poll(1, {SWITCHES[0]: [(1, 1000)]})
+        self.assertEqual({1: None, 2: None}, self._ended())
+        self._poll(2, {})
+        self.assertEqual({1: self.start + timedelta(seconds=60), 2: None}, self._ended())
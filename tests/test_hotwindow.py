@@ -0,0 +1,76 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Saarland University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# Contributor(s): Andreas Schmidt (Saarland University)
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# 
+# This license applies to all parts of SDNalytics that are not externally
+# maintained libraries.
+
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime as dt, timedelta
+
+import numpy as np
+
+from sdnalyzer.observer.hotwindow import HotWindowWriter, PORT_METRICS
+from sdnalyzer.ringbuffer import RingBuffer, SlotMap, metric_path, slots_path
+
+
+class HotWindowTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.start = dt(2015, 8, 1, 12)
+        self.writer = HotWindowWriter(self.directory, slots=3, ports=2, links=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _poll(self, writer, poll, ids):
+        records = dict((i, dict((m, i) for m in PORT_METRICS)) for i in ids)
+        writer("SwitchStatPortQuery", self.start + timedelta(seconds=30 * poll), records)
+
+    def _columns(self):
+        ring = RingBuffer(metric_path(self.directory, "port_transmit_bytes"))
+        _, values = ring.last()
+        slots = SlotMap.read(slots_path(self.directory, "port"))
+        return dict((i, [v for v in values[:, slot].tolist() if not np.isnan(v)]) for i, slot in slots.iteritems())
+
+    def test_sparse_ids_get_dense_columns(self):
+        self._poll(self.writer, 0, [5000, 70000, 9])
+        # the third port does not fit
+        self.assertEqual({5000: [5000.0], 70000: [70000.0]}, self._columns())
+
+    def test_columns_survive_restarts(self):
+        self._poll(self.writer, 0, [5000, 70000])
+        self._poll(HotWindowWriter(self.directory), 1, [70000, 5000])
+        self.assertEqual({5000: [5000.0, 5000.0], 70000: [70000.0, 70000.0]}, self._columns())
+
+    def test_columns_of_retired_ports_are_reused(self):
+        self._poll(self.writer, 0, [5000, 70000])
+        for poll in range(1, 4):
+            self._poll(self.writer, poll, [70000])
+        # 5000 has no values left in the window of three rows
+        self._poll(self.writer, 4, [70000, 9])
+        self.assertEqual({70000: [70000.0] * 3, 9: [9.0]}, self._columns())
+        self.assertFalse(os.path.isfile(slots_path(self.directory, "port") + ".tmp"))
@@ -0,0 +1,64 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Saarland University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# Contributor(s): Andreas Schmidt (Saarland University)
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# 
+# This license applies to all parts of SDNalytics that are not externally
+# maintained libraries.
+
+import unittest
+
+from sdnalyzer.paths import PathService, link_disjoint
+
+
+class DisjointDestinationsTest(unittest.TestCase):
+    def setUp(self):
+        # Switch 1 leaves through link 10 towards 2 and link 11 towards 3; 4 and 6 are reached from both, 5 only
+        # over the bridge from 4. With k = 1, only the shortest path to each switch is cached.
+        self.service = PathService(k=1)
+        self.service.update({
+            10: (1, 2, 1.0), 11: (1, 3, 1.0),
+            12: (2, 4, 1.0), 13: (3, 4, 5.0), 14: (4, 5, 1.0),
+            15: (2, 6, 1.0), 16: (6, 3, 1.0),
+        })
+
+    def test_paths_beyond_the_shortest_are_found(self):
+        self.assertEqual([2, 3, 4, 6], self.service.disjoint_destinations(1, 10, 11))
+
+    def test_bridges_separate_the_paths(self):
+        self.assertNotIn(5, self.service.disjoint_destinations(1, 10, 11))
+
+    def test_results_are_kept_until_links_change(self):
+        self.service.disjoint_destinations(1, 10, 11)
+        self.service.update(dict((link_id, (src, dst, weight * 1.5)) for link_id, (src, dst, weight)
+                                 in self.service._links.iteritems()))
+        self.assertIn((1, 10, 11), self.service._disjoint)
+        links = dict(self.service._links)
+        links[17] = (5, 3, 1.0)
+        self.service.update(links)
+        self.assertEqual([2, 3, 4, 5, 6], self.service.disjoint_destinations(1, 10, 11))
+
+    def test_parallel_links_need_two_paths(self):
+        adjacency = {1: [(2, 10, 1.0), (2, 11, 1.0)], 2: [(1, 10, 1.0), (1, 11, 1.0), (3, 12, 1.0)],
+                     3: [(2, 12, 1.0)]}
+        self.assertTrue(link_disjoint(adjacency, [2, 2], 2, set([1])))
+        self.assertFalse(link_disjoint(adjacency, [2, 2], 3, set([1])))
@@ -0,0 +1,122 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Saarland University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# Contributor(s): Andreas Schmidt (Saarland University)
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# 
+# This license applies to all parts of SDNalytics that are not externally
+# maintained libraries.
+
+from datetime import datetime as dt, timedelta
+import json
+import unittest
+
+from sdnalyzer.observer.pipeline import IngestionPipeline
+from sdnalyzer.observer.sensors.floodlightControllerSensor import LinksQuery
+from tests.helpers import StoreTestCase
+
+
+class FakeQuery(object):
+    # Records the processed responses and fails the first failures calls
+    def __init__(self, log, failures=0):
+        self.log = log
+        self.failures = failures
+        self.forgotten = 0
+        self.notified = []
+
+    def process(self, session, now, data):
+        value = data.pop("value")
+        if self.failures > 0:
+            self.failures -= 1
+            raise IOError("database unavailable")
+        self.log.append(("process", now))
+        return {1: value}
+
+    def notify(self, now, records):
+        self.notified.append((now, records))
+
+    def forget(self):
+        self.forgotten += 1
+
+    def parse(self, source):
+        return dict(source)
+
+
+class PipelineTest(StoreTestCase):
+    def setUp(self):
+        StoreTestCase.setUp(self)
+        self.log = []
+        self.first = dt(2015, 8, 1, 12)
+        self.second = self.first + timedelta(seconds=30)
+        # started once all items are queued, so the batches are the same in every test run
+        self.pipeline = IngestionPipeline(queue_size=16, batch_size=2)
+
+    def _run(self, query, now):
+        for _ in range(3):
+            self.pipeline.submit(query, now, {"value": 1}, {"value": 1})
+        self.pipeline.call(self.log.append, ("postprocess", now))
+        self.pipeline.complete(now, self.log.append, ("timestamp", now))
+
+    def test_barriers_run_after_the_responses_of_their_run(self):
+        query = FakeQuery(self.log)
+        self._run(query, self.first)
+        self._run(query, self.second)
+        self.pipeline.start()
+        self.pipeline.close()
+        run = [("process", self.first)] * 3 + [("postprocess", self.first), ("timestamp", self.first)]
+        self.assertEqual(run + [(event, self.second) for event, _ in run], self.log)
+
+    def test_failed_batch_is_retried_once(self):
+        query = FakeQuery(self.log, failures=1)
+        self._run(query, self.first)
+        self.pipeline.start()
+        self.pipeline.close()
+        self.assertEqual(2, query.forgotten)
+        # listeners only see the committed retry
+        self.assertEqual([(self.first, {1: 1})] * 3, query.notified)
+        self.assertEqual([("process", self.first)] * 3 + [("postprocess", self.first), ("timestamp", self.first)],
+                         self.log)
+
+    def test_run_with_a_batch_failing_twice_is_not_completed(self):
+        query = FakeQuery(self.log, failures=2)
+        self._run(query, self.first)
+        self._run(query, self.second)
+        self.pipeline.start()
+        self.pipeline.close()
+        # the batch of the first two responses is lost, the third response and the barriers remain
+        self.assertEqual([self.first] + [self.second] * 3, [now for now, _ in query.notified])
+        self.assertEqual([("process", self.first), ("postprocess", self.first)] +
+                         [("process", self.second)] * 3 + [("postprocess", self.second), ("timestamp", self.second)],
+                         self.log)
+
+
+class ParseTest(unittest.TestCase):
+    def test_parsed_source_matches_the_restricted_result(self):
+        links = [{"src-switch": "00:01", "src-port": 1, "dst-switch": "00:02", "dst-port": 1},
+                 {"src-switch": "00:03", "src-port": 2, "dst-switch": "00:02", "dst-port": 2}]
+        query = LinksQuery(30, controllers=[])
+        query.load([json.dumps(links)])
+        query.restrict(set(["00:01"]))
+        source = query.source()
+        result = query.take()
+        self.assertEqual([links[0]], result)
+        result.pop()
+        self.assertEqual([links[0]], query.parse(source))
@@ -0,0 +1,78 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Saarland University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# Contributor(s): Andreas Schmidt (Saarland University)
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# 
+# This license applies to all parts of SDNalytics that are not externally
+# maintained libraries.
+
+import glob
+import shutil
+import tempfile
+import unittest
+from datetime import datetime as dt, timedelta
+
+from sdnalyzer.observer.recording import ResponseRecorder, read_polls
+
+
+class RecordingTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.recorder = ResponseRecorder(self.directory)
+        self.start = dt(2015, 8, 1, 12)
+
+    def tearDown(self):
+        self.recorder.close()
+        shutil.rmtree(self.directory)
+
+    def _polls(self):
+        self.recorder.close()
+        return list(read_polls(sorted(glob.glob(self.directory + "/*"))))
+
+    def test_failed_polls_are_dropped(self):
+        first, second = self.start, self.start + timedelta(seconds=30)
+        self.recorder.start_poll(first, 30)
+        self.recorder.record("SwitchListQuery", "url", "[1]", first)
+        self.recorder.end_poll(first, False)
+        self.recorder.start_poll(second, 30)
+        self.recorder.record("SwitchListQuery", "url", "[2]", second)
+        self.recorder.end_poll(second, True)
+
+        self.assertEqual([(second, 30, {"SwitchListQuery": ["[2]"]})], self._polls())
+
+    def test_late_responses_keep_their_poll(self):
+        first, second = self.start, self.start + timedelta(seconds=30)
+        self.recorder.start_poll(first, 30)
+        self.recorder.start_poll(second, 30)
+        self.recorder.record("LinksQuery", "url", "[2]", second)
+        self.recorder.record("SwitchListQuery", "url", "[1]", first)
+        self.recorder.end_poll(first, True)
+        self.recorder.end_poll(second, True)
+        # A response arriving after its poll ended is not recorded
+        self.recorder.record("DevicesQuery", "url", "[1]", first)
+
+        self.assertEqual([(first, 30, {"SwitchListQuery": ["[1]"]}), (second, 30, {"LinksQuery": ["[2]"]})],
+                         self._polls())
+
+
+if __name__ == "__main__":
+    unittest.main()
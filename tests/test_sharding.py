@@ -0,0 +1,104 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Saarland University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# Contributor(s): Andreas Schmidt (Saarland University)
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# 
+# This license applies to all parts of SDNalytics that are not externally
+# maintained libraries.
+
+from datetime import datetime as dt
+
+import sdnalyzer.observer as observer
+from sdnalyzer.benchmark.floodlight import Fabric, FloodlightStandIn
+from sdnalyzer.observer import Observer
+from sdnalyzer.observer.sensors.floodlightControllerSensor import JsonQuery
+from sdnalyzer.store import Node, SampleTimestamp, ShardRun
+from tests.helpers import StoreTestCase
+
+
+class RecordingPostProcess(object):
+    def __init__(self):
+        self.runs = []
+
+    def execute(self, now):
+        self.runs.append(now)
+
+
+class ShardingTest(StoreTestCase):
+    def setUp(self):
+        StoreTestCase.setUp(self)
+        self.fabric = Fabric(switches=4, ports=4, hosts=4, flows=4, seed=1)
+        self.controller = FloodlightStandIn(self.fabric).start()
+        self.started = dt(2015, 8, 1, 12)
+        self.post_process = RecordingPostProcess()
+        # Both shards poll the same controller, so they report the same switches
+        self.shards = []
+        for index in range(2):
+            shard = Observer([(self.controller.host, self.controller.port)], shard=(index, 2))
+            shard.configure(2)
+            shard._post_processes = [self.post_process] if index == 0 else []
+            self.shards.append(shard)
+        self.check_interval = observer.SHARD_CHECK_INTERVAL
+        observer.SHARD_CHECK_INTERVAL = 0.1
+
+    def tearDown(self):
+        observer.SHARD_CHECK_INTERVAL = self.check_interval
+        self.controller.stop()
+        StoreTestCase.tearDown(self)
+
+    def _poll(self, shard, names=None):
+        shard._due = [q for q in shard.queries if names is None or q.name in names]
+        shard._started = self.started
+        shard._prepare_queries()
+        shard._ingest()
+
+    def test_shards_insert_the_same_switch_once(self):
+        # The port statistics of a switch come from the controllers of one shard only
+        self._poll(self.shards[1], observer.TOPOLOGY_QUERIES)
+
+        # Shard 0 looked the switches up before shard 1 inserted them
+        resolve_ids = JsonQuery._resolve_ids
+        stale = [True]
+
+        def resolve_stale(session, model, column, keys):
+            if model is Node and stale[0]:
+                stale[0] = False
+                return {}
+            return resolve_ids(session, model, column, keys)
+
+        JsonQuery._resolve_ids = staticmethod(resolve_stale)
+        try:
+            self._poll(self.shards[0])
+        finally:
+            JsonQuery._resolve_ids = staticmethod(resolve_ids)
+
+        self.assertFalse(stale[0])
+        self.assertEqual(len(self.fabric.switches), self.session.query(Node).filter(Node.type == "switch").count())
+        self.assertEqual([self.started], self.post_process.runs)
+        self.assertEqual([self.started], [t.timestamp for t in self.session.query(SampleTimestamp)])
+        self.assertEqual(0, self.session.query(ShardRun).count())
+
+    def test_run_is_not_completed_without_all_shards(self):
+        self._poll(self.shards[0])
+
+        self.assertEqual([], self.post_process.runs)
+        self.assertEqual(0, self.session.query(SampleTimestamp).count())
@@ -0,0 +1,66 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Saarland University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# Contributor(s): Andreas Schmidt (Saarland University)
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# 
+# This license applies to all parts of SDNalytics that are not externally
+# maintained libraries.
+
+import random
+import unittest
+
+from sdnalyzer.sketches import SpaceSaving
+
+
+def _reference(k, stream):
+    # Space-Saving with a linear search for the smallest count
+    counts = {}
+    for key, weight in stream:
+        if key in counts:
+            counts[key][0] += weight
+        elif len(counts) < k:
+            counts[key] = [weight, 0]
+        else:
+            smallest = min(counts, key=lambda x: counts[x][0])
+            count = counts.pop(smallest)[0]
+            counts[key] = [count + weight, count]
+    return sorted((key, c[0], c[1]) for key, c in counts.iteritems())
+
+
+class SpaceSavingTest(unittest.TestCase):
+    def test_matches_the_linear_search(self):
+        generator = random.Random(7)
+        for k in (1, 5, 40):
+            # skewed keys with distinct weights, so there are no ties between the smallest counts
+            stream = [(int(generator.paretovariate(1.2)), generator.random()) for _ in range(5000)]
+            summary = SpaceSaving(k)
+            for key, weight in stream:
+                summary.add(key, weight)
+            self.assertEqual(_reference(k, stream), sorted(summary.top()))
+
+    def test_restored_summaries_keep_counting(self):
+        summary = SpaceSaving(2)
+        for key, weight in [("a", 5), ("b", 3)]:
+            summary.add(key, weight)
+        restored = SpaceSaving.from_json(summary.to_json())
+        restored.add("c", 1)
+        self.assertEqual([("a", 5, 0), ("c", 4, 3)], restored.top())
@@ -0,0 +1,114 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Saarland University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# Contributor(s): Andreas Schmidt (Saarland University)
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# 
+# This license applies to all parts of SDNalytics that are not externally
+# maintained libraries.
+
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime as dt, timedelta
+
+from sqlalchemy import Column, MetaData, Table, create_engine, inspect
+
+from sdnalyzer import store
+from tests.helpers import StoreTestCase
+
+
+class MigrationTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.connection_string = "sqlite:///" + os.path.join(self.directory, "store.db")
+        store.start(self.connection_string)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_init_adds_columns_of_later_versions(self):
+        # tables as created before last_sampled and input_key were introduced
+        engine = create_engine(self.connection_string)
+        legacy = MetaData()
+        for table, added in [(store.Port.__table__, "last_sampled"), (store.Report.__table__, "input_key")]:
+            Table(table.name, legacy, *[Column(c.name, c.type, primary_key=c.primary_key, nullable=c.nullable)
+                                        for c in table.columns if c.name != added])
+        legacy.create_all(engine)
+        engine.execute("INSERT INTO port (port_number, hardware_address) VALUES (1, '00:00:00:00:00:01')")
+
+        store.init()
+
+        inspector = inspect(engine)
+        self.assertIn("last_sampled", [c["name"] for c in inspector.get_columns("port")])
+        self.assertIn("input_key", [c["name"] for c in inspector.get_columns("report")])
+        self.assertIn("ix_report_input_key", [i["name"] for i in inspector.get_indexes("report")])
+        self.assertEqual(1, engine.execute("SELECT count(*) FROM port").scalar())
+
+
+class PortRateTest(StoreTestCase):
+    def setUp(self):
+        StoreTestCase.setUp(self)
+        self.start = dt(2015, 8, 1, 12)
+        switch = store.Node(device_id="00:00:00:00:00:00:00:01", type="switch")
+        self.session.add(switch)
+        self.session.flush()
+        for number in (1, 2):
+            port = store.Port(node_id=switch.id, port_number=number, hardware_address="00:00:00:00:00:0" + str(number))
+            self.session.add(port)
+            self.session.flush()
+            # 1000 bytes per second, the counters are reset after the fourth sample
+            for i, transmit_bytes in enumerate([0, 30000, 60000, 90000, 100, 30100]):
+                self.session.add(store.PortSample(port_id=port.id, sampled=self.start + timedelta(seconds=30 * i),
+                                                  transmit_bytes=transmit_bytes * number, receive_bytes=0,
+                                                  transmit_packets=0, receive_packets=0))
+        self.session.commit()
+        self.port_id = port.id
+
+    def _rates(self, start=None, end=None):
+        # julianday() is not exact to the microsecond
+        return [(r.sampled, round(r.transmit_bps, 2) if r.transmit_bps is not None else None, r.counter_reset)
+                for r in store.port_rates(self.session, self.port_id, start, end)]
+
+    def test_rates_of_the_range_include_the_first_interval(self):
+        rates = self._rates(self.start + timedelta(seconds=30), self.start + timedelta(seconds=120))
+        self.assertEqual([(self.start + timedelta(seconds=s), 16000.0, False) for s in (60, 90)] +
+                         [(self.start + timedelta(seconds=120), None, True)], rates)
+
+    def test_rates_match_the_view(self):
+        view = [(r.sampled, round(r.transmit_bps, 2) if r.transmit_bps is not None else None, r.counter_reset) for r in self.session.query(store.port_rate).filter(
+            store.port_rate.c.port_id == self.port_id).order_by(store.port_rate.c.sampled)]
+        self.assertEqual(5, len(view))
+        self.assertEqual(view, self._rates())
+
+    def test_self_join_without_window_functions(self):
+        expected = self._rates(self.start + timedelta(seconds=45))
+        window_functions = store._window_functions
+        store._window_functions = lambda dialect: False
+        try:
+            self.assertEqual(expected, self._rates(self.start + timedelta(seconds=45)))
+            self.session.execute("DROP VIEW port_rate")
+            self.session.execute(store._port_rate_view(self.session.bind.dialect))
+            self.assertEqual(5, self.session.query(store.port_rate).filter(
+                store.port_rate.c.port_id == self.port_id).count())
+        finally:
+            store._window_functions = window_functions
@@ -0,0 +1,97 @@
+# The MIT License (MIT)
+# 
+# Copyright (c) 2015 Saarland University
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+# 
+# Contributor(s): Andreas Schmidt (Saarland University)
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# 
+# This license applies to all parts of SDNalytics that are not externally
+# maintained libraries.
+
+from datetime import datetime as dt, timedelta
+
+from sdnalyzer.analyzer.task import AnalysisTask
+from sdnalyzer.store import Node, Port, PortSample, Report, SampleTimestamp
+from tests.helpers import StoreTestCase
+
+
+class CountingTask(AnalysisTask):
+    def __init__(self):
+        super(CountingTask, self).__init__()
+        self.type = "Counting"
+        self.inputs = [PortSample.sampled, Port.last_sampled]
+        self.runs = 0
+
+    def _analyze(self, session):
+        self.runs += 1
+
+    def _write_report(self, report):
+        report.content = "{}"
+
+
+class InputKeyTest(StoreTestCase):
+    def setUp(self):
+        StoreTestCase.setUp(self)
+        self.now = dt.now().replace(microsecond=0)
+        switch = Node(device_id="00:00:00:00:00:00:00:01", type="switch")
+        self.session.add(switch)
+        self.session.flush()
+        self.session.add(Port(node_id=switch.id, port_number=1, hardware_address="00:00:00:00:00:01"))
+        self.session.add(SampleTimestamp(timestamp=self.now - timedelta(minutes=10), interval=30))
+        self.session.commit()
+        self.task = CountingTask()
+        self.task.run()
+
+    def _add(self, row):
+        self.session.add(row)
+        self.session.commit()
+
+    def test_unchanged_input_reuses_the_report(self):
+        self.task.run()
+        self.assertEqual(1, self.task.runs)
+        self.assertEqual(1, self.session.query(Report).count())
+
+    def test_new_sample_timestamp_invalidates_the_report(self):
+        self._add(SampleTimestamp(timestamp=self.now - timedelta(minutes=5), interval=30))
+        self.task.run()
+        self.assertEqual(2, self.task.runs)
+
+    def test_samples_between_topology_runs_invalidate_the_report(self):
+        port = self.session.query(Port).one()
+        self._add(PortSample(port_id=port.id, sampled=self.now - timedelta(minutes=4), transmit_bytes=1))
+        self.task.run()
+        self.assertEqual(2, self.task.runs)
+
+        port.last_sampled = self.now - timedelta(minutes=3)
+        self.session.commit()
+        self.task.run()
+        self.assertEqual(3, self.task.runs)
+        self.task.run()
+        self.assertEqual(3, self.task.runs)
+
+    def test_samples_outside_the_window_are_ignored(self):
+        port = self.session.query(Port).one()
+        self._add(PortSample(port_id=port.id, sampled=self.now - timedelta(days=2), transmit_bytes=1))
+        self.task.run()
+        self.assertEqual(1, self.task.runs)
+
+    def test_forced_runs_recompute(self):
+        self.task.run(force=True)
+        self.assertEqual(2, self.task.runs)